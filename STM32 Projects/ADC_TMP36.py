@@ -1,127 +1,380 @@
 # This code belongs to the Youtube video "Real-Time Temperature Monitoring with TMP36 and Nucleo32-F303K8  Python Data Logging" at https://youtu.be/LTWqGxTbHmE
+import argparse
 import serial
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from collections import deque
+import numpy as np
 import time
+from serial_ingest import SerialIngest
+from line_parsers import get_parser
+from ring_buffer import RingBuffer
+from rolling_extrema import RollingExtrema
+from pyramid import TimePyramid
+from compression import METHODS, make_compressor
+from acquisition import open_ingest
+from session_log import SessionLog, plot_session
+from metrics import IngestMetrics, ViewMetrics, REGISTRY, start_server
+from log_config import configure, get_logger
+
+logger = get_logger('adc')
 
 # === Serial Configuration ===
 COM_PORT = 'COM4'           # Update as needed
 BAUD_RATE = 9600
-
-try:
-    ser = serial.Serial(COM_PORT, BAUD_RATE, timeout=1)
-    print(f"Connected to {COM_PORT} at {BAUD_RATE} baud")
-except serial.SerialException as e:
-    print(f"Error opening serial port: {e}")
-    exit(1)
+PROTOCOL = 'text'           # 'text' (e.g. "23.4°C") or 'binary' frames, see binary_protocol.py
+USE_ACQUISITION_PROCESS = False     # Read the port in a separate process (see acquisition.py)
 
 # === Data Setup ===
-temp_data = deque()  # No maxlen - keep all data
-time_data = deque()  # No maxlen - keep all data  
-start_time = time.time()  # Record start time
-
-# === Matplotlib Setup ===
-plt.ion()  # Turn on interactive mode
-fig, ax = plt.subplots(figsize=(10, 6))
-line, = ax.plot([], [], 'b-', linewidth=2)  # Start with empty data
-ax.set_ylim(0, 50)  # Adjust temperature range as needed
-ax.set_xlim(0, 60)  # Start with 60 seconds view
-ax.set_title("Real-Time Temperature from STM32", fontsize=14)
-ax.set_xlabel("Time (seconds since start)")
-ax.set_ylabel("Temperature (°C)")
-ax.grid(True, alpha=0.3)
-
-# Add text display for current temperature
-temp_text = ax.text(0.02, 0.95, '', transform=ax.transAxes, 
-                   fontsize=12, verticalalignment='top',
-                   bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
-
-# === Update Function ===
-def update(frame):
-    try:
-        if ser.in_waiting > 0:  # Check if data is available
-            line_bytes = ser.readline()
-            decoded = line_bytes.decode('utf-8').strip()
-            
-            if decoded:  # Make sure we have data
-                print(f"Received: {decoded}")  # Debug output
-                
-                # Try different parsing methods
-                temp_value = None
-                
-                # Method 1: Look for °C
-                if "°C" in decoded:
-                    temp_str = decoded.split("°")[0]
-                    # Extract just the number part
-                    temp_str = ''.join(c for c in temp_str if c.isdigit() or c == '.' or c == '-')
-                    if temp_str:
-                        temp_value = float(temp_str)
-                
-                # Method 2: Look for just a number (if no °C symbol)
-                elif decoded.replace('.', '').replace('-', '').isdigit():
-                    temp_value = float(decoded)
-                
-                # Method 3: Extract first number found
+HISTORY_CAPACITY = 36000        # Samples kept in RAM for the live plot (~1 h at 10 Hz)
+SPILL_FILE = None               # e.g. 'tmp36_history.bin' to keep older samples on disk
+LOG_DIR = None                  # e.g. 'logs' to record the session (see session_log.py)
+COMPRESSION = None              # 'deadband' or 'swinging-door': store only points needed (see compression.py)
+COMPRESSION_TOLERANCE = 0.1     # °C, maximum error of the stored curve
+
+# Y-axis autoscaling: None = whole session, or a number of seconds (e.g. 300)
+AUTOSCALE_WINDOW = None
+FOLLOW_PADDING = 20             # Seconds of empty space ahead of the newest sample while following
+
+# === Diagnostics ===
+METRICS_PORT = None             # e.g. 9108 to serve http://127.0.0.1:9108/metrics
+OVERLAY_INTERVAL_S = 1.0        # refresh of the on-screen metrics overlay
+
+class TemperatureMonitor:
+    def __init__(self, port=COM_PORT, baudrate=BAUD_RATE, protocol=PROTOCOL,
+                 acquisition=USE_ACQUISITION_PROCESS, ingest=None, log_dir=LOG_DIR,
+                 metrics=False, overlay=False, compression=COMPRESSION, tolerance=COMPRESSION_TOLERANCE):
+        self.port = port
+        self.baudrate = baudrate
+        self.protocol = protocol
+        self.acquisition = acquisition
+        self.ser = None
+        self.worker = None
+        self.ingest = ingest    # e.g. MultiPortEngine.ingest(name) instead of opening a port
+
+        # Every sample goes to the session log, which also holds everything
+        # that has scrolled out of the in-memory history
+        self.log = SessionLog(log_dir, 'tmp36', devices=[(str(port), 'temperature')]) if log_dir else None
+
+        # Columns: 0 = time (s since start), 1 = temperature (°C)
+        self.history = RingBuffer(HISTORY_CAPACITY, columns=2,
+                                  spill_path=None if self.log else SPILL_FILE)
+        self.extrema = RollingExtrema(window=AUTOSCALE_WINDOW)
+        # 1 s / 10 s / 1 min / 10 min min/max/mean buckets of the whole session for zooming
+        self.pyramid = TimePyramid()
+        self.follow = True          # x-axis tracks the newest sample until the user zooms or pans
+        self.view_changed = False
+        self.setting_xlim = False
+        self.start_time = time.time()  # Record start time
+        self.last_sample_time = 0.0
+
+        # Optional compression between the parser and history / plot / log
+        self.compressor = make_compressor(compression, tolerance)
+
+        # Per-stage timers and counters (see metrics.py); the overlay needs them too
+        self.metrics = ViewMetrics() if (metrics or overlay) else None
+        self.overlay = overlay
+        self.frame_start = None
+        self.frame_receive_time = None
+        self.overlay_updated = 0.0
+        self.latest = None      # (time, temperature) of the newest sample
+
+        # Initialize serial connection
+        if self.ingest is None:
+            self.init_serial()
+
+        # Setup the plot
+        self.setup_plot()
+
+    def init_serial(self):
+        """Open the port directly, or attach to an acquisition worker process"""
+        parser = get_parser('temperature')
+        try:
+            if self.acquisition:
+                self.worker, self.ingest = open_ingest(self.port, self.baudrate, 'temperature',
+                                                       protocol=self.protocol)
+                logger.info("Attached to acquisition of %s", self.port)
+            else:
+                self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
+                self.ingest = SerialIngest(self.ser, parser=parser, protocol=self.protocol,
+                                           metrics=IngestMetrics() if self.metrics else None)
+                logger.info("Connected to %s at %d baud", self.port, self.baudrate)
+        except (serial.SerialException, RuntimeError) as e:
+            logger.error("Error opening serial port: %s", e)
+            exit(1)
+
+    def setup_plot(self):
+        """Setup the matplotlib plot"""
+        plt.ion()  # Turn on interactive mode
+        self.fig, self.ax = plt.subplots(figsize=(10, 6))
+        self.line, = self.ax.plot([], [], 'b-', linewidth=2)  # Start with empty data
+        self.ax.set_ylim(0, 50)  # Adjust temperature range as needed
+        self.ax.set_xlim(0, 60)  # Start with 60 seconds view
+        self.ax.set_title("Real-Time Temperature from STM32", fontsize=14)
+        self.ax.set_xlabel("Time (seconds since start)")
+        self.ax.set_ylabel("Temperature (°C)")
+        self.ax.grid(True, alpha=0.3)
+
+        # Add text display for current temperature
+        self.temp_text = self.ax.text(0.02, 0.95, '', transform=self.ax.transAxes,
+                                      fontsize=12, verticalalignment='top',
+                                      bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+
+        # Bucket means of the pyramid level on screen (empty while raw samples are shown)
+        self.mean_line, = self.ax.plot([], [], 'k-', linewidth=0.8, alpha=0.7)
+
+        self.fig.canvas.mpl_connect('key_press_event', self.on_key)
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+        # Metrics overlay in the bottom left corner of the figure
+        self.overlay_text = None
+        if self.overlay:
+            self.overlay_text = self.fig.text(0.01, 0.01, '', fontsize=7, family='monospace',
+                                              verticalalignment='bottom', alpha=0.8)
+        if self.metrics:
+            self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+            if self.compressor:
+                REGISTRY.gauge('compression_ratio', 'Samples received per sample stored',
+                               fn=lambda: self.compressor.ratio)
+
+        # Deadband points are a sample-and-hold curve
+        if self.compressor and self.compressor.name == 'deadband':
+            self.line.set_drawstyle('steps-post')
+
+    def on_draw(self, event):
+        """A frame reached the screen: record render time and read -> render latency"""
+        if self.frame_start is None:
+            return
+        self.metrics.render_seconds.observe(time.perf_counter() - self.frame_start)
+        self.metrics.frames_drawn.inc()
+        if self.frame_receive_time is not None:
+            self.metrics.latency.observe(time.time() - self.frame_receive_time)
+        self.frame_start = None
+        self.frame_receive_time = None
+
+    def on_key(self, event):
+        """'e' plots the entire recorded session from the log, 'f' follows the live data again"""
+        if event.key == 'e' and self.log:
+            plot_session(self.log.history(), devices=self.log.devices,
+                         title='TMP36 session', block=False)
+        elif event.key == 'f' and self.pyramid.total:
+            self.follow = True
+            self.set_xlim(self.pyramid.first_time, self.pyramid.last_time + FOLLOW_PADDING)
+            self.view_changed = True
+
+    def on_xlim_changed(self, ax):
+        """Zoom or pan from the toolbar: stop following unless the view still reaches the newest sample"""
+        if self.setting_xlim:
+            return
+        self.follow = self.pyramid.last_time is not None and ax.get_xlim()[1] >= self.pyramid.last_time
+        self.view_changed = True
+
+    def set_xlim(self, left, right):
+        """Move the x-axis without leaving follow mode"""
+        self.setting_xlim = True
+        try:
+            self.ax.set_xlim(left, right)
+        finally:
+            self.setting_xlim = False
+
+    def raw_samples(self, t0, t1):
+        """(times, temperatures) reaching back to t0 if possible: the RAM history, else the session log"""
+        time_view = self.history.column(0)
+        if self.log and (len(time_view) == 0 or time_view[0] > t0):
+            records = self.log.time_range(t0 + self.start_time, t1 + self.start_time)
+            if len(records):
+                return records['host_time'] - self.start_time, records['value']
+        return time_view, self.history.column(1)
+
+    def refresh_line(self):
+        """Redraw the visible x-range from the pyramid level that matches the axis width"""
+        x0, x1 = self.ax.get_xlim()
+        pixels = self.ax.get_window_extent().width
+        raw_times, raw_temps = (None, None)
+        if x1 - x0 <= pixels * self.pyramid.levels[0].resolution:
+            # Close up: raw samples, from the session log if they have left the history
+            raw_times, raw_temps = self.raw_samples(x0, x1)
+        x, y = self.pyramid.view(x0, x1, pixels, raw_times, raw_temps)
+        if self.compressor and self.latest is not None and self.latest[0] > self.pyramid.last_time:
+            # The newest sample is not stored yet (swinging door holds it back, deadband drops it)
+            x, y = np.append(x, self.latest[0]), np.append(y, self.latest[1])
+        self.line.set_data(x, y)
+
+        level = self.pyramid.level
+        if level is None:
+            self.mean_line.set_data([], [])
+        else:
+            starts, _, _, means = self.pyramid.buckets(level, x0, x1)
+            self.mean_line.set_data(starts + self.pyramid.levels[level].resolution / 2.0, means)
+        self.view_changed = False
+
+    def sample_times(self, count):
+        """Times (s since start) for a batch of `count` new samples"""
+        receive_times = self.ingest.last_receive_time
+        if isinstance(receive_times, np.ndarray):
+            # The acquisition process stamps every sample when it is read
+            times = receive_times - self.start_time
+        else:
+            # A batch is spread evenly over the interval since the previous one
+            current_time = time.time() - self.start_time
+            times = np.linspace(self.last_sample_time, current_time, count + 1)[1:]
+        self.last_sample_time = times[-1]
+        return times
+
+    def update(self, frame):
+        """Animation callback: ingest new samples and refresh the plot"""
+        ax = self.ax
+        if self.metrics:
+            self.frame_start = time.perf_counter()
+            self.metrics.queue_depth.set(self.ser.in_waiting if self.ser else self.ingest.backlog)
+        try:
+            # Drain everything the board sent since the last frame
+            samples = self.ingest.poll_timestamped()
+
+            if samples:
+                temps = [value for _, value in samples]
+                times = self.sample_times(len(temps))
+                if self.metrics:
+                    self.frame_receive_time = times[-1] + self.start_time
+                current_time = times[-1]
+                temp_value = temps[-1]
+                self.latest = (current_time, temp_value)
+                for t, value in zip(times, temps):
+                    self.extrema.push(t, value)
+
+                # Update data (only the points the compressor keeps, if enabled)
+                if self.compressor:
+                    self.store(self.compressor.compress(zip(times.tolist(), temps,
+                                                            [timestamp for timestamp, _ in samples])))
                 else:
-                    import re
-                    numbers = re.findall(r'-?\d+\.?\d*', decoded)
-                    if numbers:
-                        temp_value = float(numbers[0])
-                
-                if temp_value is not None:
-                    # Calculate time since start
-                    current_time = time.time() - start_time
-                    
-                    # Update data
-                    temp_data.append(temp_value)
-                    time_data.append(current_time)
-                    
-                    # Update plot
-                    line.set_data(time_data, temp_data)
-                    
+                    self.store_block(times, temps, samples)
+
+                if self.follow:
                     # Auto-scale y-axis if needed
-                    if temp_value < ax.get_ylim()[0] or temp_value > ax.get_ylim()[1]:
-                        ax.set_ylim(min(temp_data) - 2, max(temp_data) + 2)
-                    
-                    # Always show from 0 to current time (with some padding)
-                    if current_time > ax.get_xlim()[1] - 10:  # Add padding
-                        ax.set_xlim(0, current_time + 20)
-                    
-                    # Update temperature display
-                    temp_text.set_text(f'Current Temp: {temp_value:.1f}°C\nTime: {current_time:.1f}s')
-                    
-                    print(f"Time: {current_time:.1f}s, Temperature: {temp_value:.1f}°C")  # Debug output
-                
-    except serial.SerialException as e:
-        print(f"Serial error: {e}")
-        return line,
-    except ValueError as e:
-        print(f"Value error (couldn't parse temperature): {e}")
-        return line,
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return line,
-    
-    return line,
-
-# === Start Animation ===
-print("Starting real-time temperature monitoring...")
-print("Press Ctrl+C to stop")
-
-try:
-    ani = animation.FuncAnimation(fig, update, interval=100, blit=False, cache_frame_data=False)
-    plt.tight_layout()
-    plt.show()
-    
-    # Keep the program running
-    while True:
-        plt.pause(0.01)
-        
-except KeyboardInterrupt:
-    print("\nStopping...")
-finally:
-    if ser.is_open:
-        ser.close()
-        print("Serial port closed")
-    plt.close('all')
+                    y_min, y_max = ax.get_ylim()
+                    target = (self.extrema.min - 2, self.extrema.max + 2)
+                    out_of_range = self.extrema.min < y_min or self.extrema.max > y_max
+                    # In windowed mode also shrink back once old extremes expire
+                    if out_of_range or (AUTOSCALE_WINDOW is not None and (y_min, y_max) != target):
+                        ax.set_ylim(*target)
+
+                    # Show the whole session up to current time (with some padding)
+                    if current_time > ax.get_xlim()[1] - 10 or ax.get_xlim()[0] > self.pyramid.first_time:
+                        self.set_xlim(self.pyramid.first_time, current_time + FOLLOW_PADDING)
+
+                # Only the visible range is touched: O(axis pixels) buckets, or raw samples close up
+                if self.follow or times[0] <= ax.get_xlim()[1]:
+                    self.view_changed = True
+
+                # Update temperature display
+                text = f'Current Temp: {temp_value:.1f}°C\nTime: {current_time:.1f}s'
+                if self.compressor:
+                    text += f'\nStored: 1 in {self.compressor.ratio:.1f} (±{self.compressor.tolerance:g}°C)'
+                self.temp_text.set_text(text)
+
+                logger.debug("Time: %.1fs, Temperature: %.1f°C (%d new)", current_time, temp_value, len(temps))
+
+            if self.view_changed and self.pyramid.total:
+                self.refresh_line()
+
+            if self.overlay_text is not None and time.time() - self.overlay_updated >= OVERLAY_INTERVAL_S:
+                self.overlay_text.set_text(REGISTRY.overlay_text())
+                self.overlay_updated = time.time()
+
+        except serial.SerialException as e:
+            logger.warning("Serial error: %s", e)
+            return self.line,
+        except Exception as e:
+            logger.warning("Unexpected error: %s", e)
+            return self.line,
+
+        return self.line,
+
+    def store_block(self, times, temps, samples):
+        """Append samples to the history, the pyramid and the session log"""
+        if self.log:
+            self.log.append(times + self.start_time, samples)
+        self.history.extend(np.column_stack([times, temps]))
+        self.pyramid.extend(times, temps)
+
+    def store(self, points):
+        """Store compressed (time, temperature, device timestamp) points"""
+        if points:
+            times = np.array([t for t, _, _ in points])
+            self.store_block(times, [value for _, value, _ in points],
+                             [(timestamp, value) for _, value, timestamp in points])
+
+    def start_animation(self):
+        """Run the animation until the window is closed or Ctrl+C"""
+        self.ani = animation.FuncAnimation(self.fig, self.update, interval=100, blit=False,
+                                           cache_frame_data=False)
+        plt.tight_layout()
+        plt.show()
+
+        # Keep the program running
+        while plt.fignum_exists(self.fig.number):
+            plt.pause(0.01)
+
+    def close(self):
+        """Close the serial port / acquisition worker and the history"""
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+            logger.info("Serial port closed")
+        if self.acquisition and self.ingest:
+            self.ingest.close()
+            if self.worker:
+                self.worker.stop()
+                logger.info("Acquisition process stopped")
+        if self.compressor:
+            self.store(self.compressor.flush())
+            logger.info("Compression: %s", self.compressor.summary())
+        self.history.close()
+        if self.log:
+            self.log.close()
+            logger.info("Recorded %d samples to %s", self.log.records, self.log.path)
+        plt.close('all')
+
+def parse_args():
+    """Command line options; the defaults are the constants above"""
+    parser = argparse.ArgumentParser(description="Real-time TMP36 temperature plot")
+    parser.add_argument('--port', default=COM_PORT,
+                        help=f"serial port, e.g. COM4, /dev/ttyACM0 or a stm32_simulator.py pty (default {COM_PORT})")
+    parser.add_argument('--baud', type=int, default=BAUD_RATE, help=f"baud rate (default {BAUD_RATE})")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default=PROTOCOL)
+    parser.add_argument('--acquisition', action='store_true', default=USE_ACQUISITION_PROCESS,
+                        help="read the port in a separate process")
+    parser.add_argument('--log-dir', default=LOG_DIR, help="record the session to this directory")
+    parser.add_argument('--compress', choices=METHODS, default=COMPRESSION,
+                        help="store only the points needed to stay within --tolerance")
+    parser.add_argument('--tolerance', type=float, default=COMPRESSION_TOLERANCE,
+                        help=f"compression error bound in °C (default {COMPRESSION_TOLERANCE})")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (and /metrics.json)")
+    parser.add_argument('--overlay', action='store_true', help="show live metrics on the plot")
+    parser.add_argument('--log-level', default=None, help="DEBUG shows every frame (default INFO)")
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_args()
+    configure(args.log_level)
+    if args.metrics_port:
+        start_server(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    print("Starting real-time temperature monitoring...")
+    print("Press Ctrl+C to stop - zoom and pan with the toolbar, 'f' follows the live data again")
+    if args.log_dir:
+        print(f"Recording to {args.log_dir}/ - press 'e' to plot the entire session")
+
+    monitor = TemperatureMonitor(port=args.port, baudrate=args.baud, protocol=args.protocol,
+                                 acquisition=args.acquisition, log_dir=args.log_dir,
+                                 metrics=bool(args.metrics_port), overlay=args.overlay,
+                                 compression=args.compress, tolerance=args.tolerance)
+    try:
+        monitor.start_animation()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        monitor.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,84 @@
 # This code belongs to the YouTube Video "Servo Control Using PWM with Interrupts with Real-Time Angle Visualization in Python" at https://youtu.be/ueq3rqgOjj0   
+import argparse
 import serial
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import numpy as np
 from collections import deque
 import time
-import re
+import threading
 from matplotlib.patches import Wedge, Circle
 import matplotlib.patches as patches
+from serial_ingest import SerialIngest
+from line_parsers import get_parser
+from servo_trajectory import TrajectoryCapture, show_analysis
+from acquisition import open_ingest
+from session_log import SessionLog
+from metrics import CommandMetrics, IngestMetrics, ViewMetrics, REGISTRY, start_server
+from servo_command import CommandChannel, Sweeper, sweep_setpoints, PROFILES, MATCH_MODES
+from log_config import configure, get_logger
+
+logger = get_logger('servo')
+
+ARM_LENGTH = 1.3
+INDICATOR_RADIUS = 1.45
+SEGMENT_DEGREES = 5
+FRAME_INTERVAL_MS = 50
+CAPTURE_POLL_S = 0.001       # Reader thread poll interval when the port is idle
+LOG_DIR = None               # e.g. 'logs' to record the session (see session_log.py)
+OVERLAY_INTERVAL_S = 1.0     # refresh of the on-screen metrics overlay
+SWEEP_PROFILE = 'sine'       # setpoint sweep started with 'w' (see servo_command.py)
+SWEEP_RATE = 20              # setpoints per second
+SWEEP_PERIOD_S = 4.0
 
 class ServoVisualizer:
-    def __init__(self, port='COM4', baudrate=9600):
+    def __init__(self, port='COM4', baudrate=9600, protocol='text', acquisition=False, ingest=None,
+                 log_dir=LOG_DIR, metrics=False, overlay=False, sweep=None, sweep_rate=SWEEP_RATE,
+                 sweep_period=SWEEP_PERIOD_S, match='value'):
         self.port = port
         self.baudrate = baudrate
+        self.protocol = protocol    # 'text' ("ANGLE:XXX") or 'binary' frames
+        self.acquisition = acquisition  # read the port in a separate process (acquisition.py)
         self.ser = None
+        self.worker = None
+        self.ingest = ingest    # e.g. MultiPortEngine.ingest(name) instead of opening a port
         self.current_angle = 0
+        self.current_receive_time = None    # host time of current_angle
+        self.read_error = None      # set by the reader thread when it gives up
         self.start_time = time.time()
+        self.last_poll_time = self.start_time   # host time of the previous poll of the ingest
+        self.drawn_angle = None     # angle currently shown on screen
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        
+        # Per-stage timers and counters (see metrics.py); the overlay needs them too
+        self.metrics = ViewMetrics() if (metrics or overlay) else None
+        self.overlay = overlay
+        self.overlay_updated = 0.0
+        
+        # Every received sample is kept for the trajectory analysis
+        # and, optionally, recorded to a session log on disk
+        self.capture = TrajectoryCapture()
+        self.log = SessionLog(log_dir, 'servo', devices=[(str(port), 'angle')]) if log_dir else None
+        self.reader_thread = None
+        self.running = False
+        
+        # Setpoint commands need a port of our own to write to
+        self.commands = None
+        self.sweeper = None
+        self.sweep_profile = sweep     # started with the animation when given
+        self.sweep_rate = sweep_rate
+        self.sweep_period = sweep_period
+        self.match = match
+        
+        # Per-degree lookup tables (0-180) for everything update_plot needs
+        self.build_lookup_tables()
         
         # Initialize serial connection
-        self.init_serial()
+        if self.ingest is None:
+            self.init_serial()
+        if self.ser:
+            self.commands = CommandChannel(self.ser, match=match,
+                                           metrics=CommandMetrics() if self.metrics else None)
         
         # Setup the plot
         self.setup_plot()
@@ -26,10 +86,17 @@ class ServoVisualizer:
     def init_serial(self):
         """Initialize serial connection"""
         try:
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
-            print(f"Connected to {self.port} at {self.baudrate} baud")
-        except serial.SerialException as e:
-            print(f"Error connecting to serial port: {e}")
+            if self.acquisition:
+                self.worker, self.ingest = open_ingest(self.port, self.baudrate, 'angle',
+                                                       protocol=self.protocol)
+                logger.info("Attached to acquisition of %s", self.port)
+            else:
+                self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
+                self.ingest = SerialIngest(self.ser, parser=get_parser('angle'), protocol=self.protocol,
+                                           metrics=IngestMetrics() if self.metrics else None)
+                logger.info("Connected to %s at %d baud", self.port, self.baudrate)
+        except (serial.SerialException, RuntimeError) as e:
+            logger.error("Error connecting to serial port: %s", e)
             exit(1)
     
     def get_color_for_angle(self, angle):
@@ -53,6 +120,21 @@ class ServoVisualizer:
         
         return color
     
+    def build_lookup_tables(self):
+        """Precompute color, arm and indicator coordinates for every whole degree"""
+        angles = np.arange(181)
+        rad = np.radians(angles)
+        cos, sin = np.cos(rad), np.sin(rad)
+        
+        self.color_lut = [self.get_color_for_angle(a) for a in angles]
+        self.arm_lut = [([0, x], [0, y]) for x, y in zip((ARM_LENGTH * cos).tolist(),
+                                                        (ARM_LENGTH * sin).tolist())]
+        self.indicator_lut = list(zip((INDICATOR_RADIUS * cos).tolist(),
+                                      (INDICATOR_RADIUS * sin).tolist()))
+        self.label_lut = [f'{a}°' for a in angles]
+        # 180° belongs to the last segment
+        self.segment_lut = [min(a // SEGMENT_DEGREES, 180 // SEGMENT_DEGREES - 1) for a in angles]
+    
     def setup_plot(self):
         """Setup the matplotlib plot"""
         self.fig, self.ax = plt.subplots(1, 1, figsize=(8, 8))
@@ -73,29 +155,45 @@ class ServoVisualizer:
         # Draw the gauge background
         self.draw_gauge_background()
         
-        # Initialize dynamic elements
-        self.servo_arm, = self.ax.plot([0, 0], [0, 1.3], linewidth=8, alpha=0.9)
+        # Initialize dynamic elements (animated: drawn by blitting, not part of the background)
+        self.servo_arm, = self.ax.plot([0, 0], [0, ARM_LENGTH], linewidth=8, alpha=0.9, animated=True)
         self.angle_text = self.ax.text(0, -1.7, '0°', ha='center', va='center', 
-                                       fontsize=28, fontweight='bold', color='white')
+                                       fontsize=28, fontweight='bold', color='white', animated=True)
         
         # Position indicator circle
         self.position_circle = Circle((0, 0), 0.15, facecolor='white', edgecolor='black', 
-                                     linewidth=3, alpha=0.9, zorder=10)
+                                     linewidth=3, alpha=0.9, zorder=10, animated=True)
         self.ax.add_patch(self.position_circle)
         
         # Create colored arc segments for the range indicator
         self.create_colored_arc()
         
+        dynamic = [self.highlight, self.servo_arm, self.angle_text, self.position_circle]
+        
+        # Metrics overlay in the top left corner, blitted with the other dynamic artists
+        self.overlay_text = None
+        if self.overlay:
+            self.overlay_text = self.ax.text(0.01, 0.99, '', transform=self.ax.transAxes, fontsize=7,
+                                             family='monospace', color='white', alpha=0.8,
+                                             verticalalignment='top', animated=True)
+            dynamic.append(self.overlay_text)
+        self.dynamic_artists = sorted(dynamic, key=lambda a: a.get_zorder())
+        
+        # Static background is cached after every full redraw
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        self.fig.canvas.mpl_connect('key_press_event', self.on_key)
+        
         plt.tight_layout()
     
     def create_colored_arc(self):
         """Create colored arc segments showing the servo range"""
-        num_segments = 36  # 5-degree segments
+        num_segments = 180 // SEGMENT_DEGREES  # 5-degree segments
         self.arc_patches = []
         
         for i in range(num_segments):
-            start_angle = i * 5
-            end_angle = (i + 1) * 5
+            start_angle = i * SEGMENT_DEGREES
+            end_angle = (i + 1) * SEGMENT_DEGREES
             color = self.get_color_for_angle(start_angle + 2.5)  # Use middle of segment
             
             # Create wedge for each segment
@@ -103,6 +201,13 @@ class ServoVisualizer:
                          facecolor=color, edgecolor='white', linewidth=0.5, alpha=0.8)
             self.ax.add_patch(wedge)
             self.arc_patches.append(wedge)
+        
+        # The segments are static; the current one is highlighted by a single
+        # overlay wedge that is moved instead of restyling the segments
+        self.highlight = Wedge(center=(0, 0), r=1.7, theta1=0, theta2=SEGMENT_DEGREES,
+                               facecolor=self.arc_patches[0].get_facecolor(), edgecolor='white',
+                               linewidth=2, alpha=1.0, zorder=1.5, animated=True)
+        self.ax.add_patch(self.highlight)
     
     def draw_gauge_background(self):
         """Draw the circular gauge background"""
@@ -152,84 +257,242 @@ class ServoVisualizer:
         self.ax.text(0, 2.05, 'SERVO ANGLE', ha='center', va='center', 
                      fontsize=16, fontweight='bold', color='purple', alpha=0.8)
     
+    def sample_times(self, receive_time, count, previous):
+        """Host times for a batch of `count` samples received at receive_time"""
+        if count == 1 or not np.isscalar(receive_time):
+            # A single sample, or already stamped per sample by the acquisition process
+            return receive_time
+        # The batch arrived since the previous poll; spread it evenly over that interval
+        return np.linspace(previous, receive_time, count + 1)[1:]
+    
     def read_serial_data(self):
-        """Read and parse serial data"""
-        if self.ser and self.ser.in_waiting > 0:
-            try:
-                line = self.ser.readline().decode('utf-8').strip()
-                
-                # Parse the angle from the format "ANGLE:XXX"
-                match = re.match(r'ANGLE:(\d+)', line)
-                if match:
-                    angle = int(match.group(1))
-                    # Ensure angle is within valid range
-                    if 0 <= angle <= 180:
-                        self.current_angle = angle
-                        return True
-            except (UnicodeDecodeError, ValueError) as e:
-                print(f"Error parsing serial data: {e}")
+        """Read and parse serial data, recording every sample in the capture"""
+        if self.ingest:
+            previous = self.last_poll_time
+            self.last_poll_time = time.time()
+            # Drains the whole OS buffer (or everything the acquisition process published)
+            samples = self.ingest.poll_timestamped()
+            if samples:
+                receive_time = self.ingest.last_receive_time
+                host_times = self.sample_times(receive_time, len(samples), previous)
+                self.capture.extend(host_times, samples)
+                if self.commands:
+                    # Acks are timed by when they were actually seen
+                    self.commands.acknowledge(receive_time, [angle for _, angle in samples])
+                if self.log:
+                    self.log.append(host_times, samples)
+                self.current_receive_time = host_times if np.isscalar(host_times) else host_times[-1]
+                self.current_angle = samples[-1][1]
+                return True
         return False
     
+    def capture_loop(self):
+        """Reader thread: capture at full rate, independent of the frame rate"""
+        while self.running:
+            try:
+                if not self.read_serial_data():
+                    time.sleep(CAPTURE_POLL_S)
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                # SerialException and AcquisitionStopped are OSErrors too
+                logger.error("Error reading serial data, capture stopped: %s", e)
+                self.read_error = e
+                self.running = False
+    
     def update_plot(self, frame):
-        """Update the plot with new data"""
-        # Read new data
-        self.read_serial_data()
+        """Update the dynamic artists, returns the ones that changed"""
+        # current_angle is kept up to date by the reader thread
+        angle = self.current_angle
+        if angle == self.drawn_angle:
+            return []
         
         # Get color for current angle
-        current_color = self.get_color_for_angle(self.current_angle)
+        current_color = self.color_lut[angle]
         
         # Update servo arm
-        angle_rad = np.radians(self.current_angle)
-        x = 1.3 * np.cos(angle_rad)
-        y = 1.3 * np.sin(angle_rad)
-        
-        self.servo_arm.set_data([0, x], [0, y])
+        self.servo_arm.set_data(*self.arm_lut[angle])
         self.servo_arm.set_color(current_color)
         
         # Update position indicator
-        pos_x = 1.45 * np.cos(angle_rad)
-        pos_y = 1.45 * np.sin(angle_rad)
-        self.position_circle.center = (pos_x, pos_y)
+        self.position_circle.center = self.indicator_lut[angle]
         self.position_circle.set_facecolor(current_color)
         
         # Update angle text with color
-        self.angle_text.set_text(f'{self.current_angle}°')
+        self.angle_text.set_text(self.label_lut[angle])
         self.angle_text.set_color(current_color)
         
-        # Add glow effect to current position on arc
-        current_segment = int(self.current_angle / 5)
-        if 0 <= current_segment < len(self.arc_patches):
-            # Reset all segments to normal alpha
-            for patch in self.arc_patches:
-                patch.set_alpha(0.8)
-            
-            # Highlight current segment
-            self.arc_patches[current_segment].set_alpha(1.0)
-            self.arc_patches[current_segment].set_linewidth(2)
+        # Move the glow to the current segment on the arc
+        changed = [self.servo_arm, self.angle_text, self.position_circle]
+        segment = self.segment_lut[angle]
+        if self.drawn_angle is None or segment != self.segment_lut[self.drawn_angle]:
+            self.highlight.set_theta1(segment * SEGMENT_DEGREES)
+            self.highlight.set_theta2((segment + 1) * SEGMENT_DEGREES)
+            self.highlight.set_facecolor(self.arc_patches[segment].get_facecolor())
+            changed.append(self.highlight)
+        
+        self.drawn_angle = angle
+        return changed
+    
+    def on_draw(self, event):
+        """Cache the static background after a full redraw and draw the dynamic artists on it"""
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self.dynamic_artists:
+            self.ax.draw_artist(artist)
+    
+    def on_timer(self):
+        """Timer callback: blit a new frame only if the angle (or the overlay) changed"""
+        if self.background is None:
+            return
+        start = time.perf_counter()
+        receive_time = self.current_receive_time
+        changed = self.update_plot(None)
+        if self.read_error is not None and self.angle_text.get_text() != 'Read error':
+            # The reader thread has stopped; don't keep showing its last angle as live
+            self.angle_text.set_text('Read error')
+            self.angle_text.set_color('red')
+            changed = changed + [self.angle_text]
+        new_angle = bool(changed)
+        if self.overlay_text is not None and time.time() - self.overlay_updated >= OVERLAY_INTERVAL_S:
+            self.overlay_text.set_text(REGISTRY.overlay_text())
+            self.overlay_updated = time.time()
+            changed = changed or [self.overlay_text]
+        if not changed:
+            self.frames_skipped += 1
+            if self.metrics:
+                self.metrics.frames_skipped.inc()
+            return
         
-        return [self.servo_arm, self.angle_text, self.position_circle] + self.arc_patches
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        for artist in self.dynamic_artists:
+            self.ax.draw_artist(artist)
+        canvas.blit(self.ax.bbox)
+        self.frames_drawn += 1
+        if self.metrics:
+            self.metrics.render_seconds.observe(time.perf_counter() - start)
+            self.metrics.frames_drawn.inc()
+            if self.ser:
+                self.metrics.queue_depth.set(self.ser.in_waiting)
+            if receive_time is not None and new_angle:
+                self.metrics.latency.observe(time.time() - receive_time)
+    
+    def start_sweep(self, profile=None):
+        """Send a setpoint sweep at sweep_rate without waiting for the reports"""
+        if self.commands is None:
+            logger.warning("Setpoint commands need the port opened directly (not --acquisition)")
+            return
+        self.stop_sweep()
+        self.sweep_profile = profile or self.sweep_profile or SWEEP_PROFILE
+        self.commands.reset()
+        setpoints = sweep_setpoints(self.sweep_profile, self.sweep_rate, period=self.sweep_period)
+        self.sweeper = Sweeper(self.commands, setpoints).start()
+        logger.info("Sweep '%s' at %g setpoints/s", self.sweep_profile, self.sweep_rate)
+    
+    def stop_sweep(self):
+        """Stop the sweep and log the command -> ack latency"""
+        if self.sweeper is None:
+            return
+        self.sweeper.stop()
+        self.sweeper = None
+        logger.info("Sweep stopped: %s", self.commands.summary())
+    
+    def set_angle(self, angle):
+        """Send a single setpoint"""
+        if self.commands is None:
+            logger.warning("Setpoint commands need the port opened directly (not --acquisition)")
+            return False
+        return self.commands.send(angle)
+    
+    def on_key(self, event):
+        """'a' opens the trajectory analysis, 's' saves the capture, 'w' starts/stops a sweep, 't' logs latency"""
+        if event.key == 'a':
+            show_analysis(self.capture)
+        elif event.key == 's':
+            path = time.strftime('servo_capture_%Y%m%d_%H%M%S.npz')
+            self.capture.save(path)
+            logger.info("Saved %d samples to %s", len(self.capture), path)
+        elif event.key == 'w':
+            if self.sweeper is None:
+                self.start_sweep()
+            else:
+                self.stop_sweep()
+        elif event.key == 't' and self.commands:
+            logger.info("Setpoint commands: %s", self.commands.summary())
     
     def start_animation(self):
         """Start the real-time animation"""
-        self.ani = animation.FuncAnimation(self.fig, self.update_plot, 
-                                         interval=50, blit=True, cache_frame_data=False)
+        self.running = True
+        self.reader_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.reader_thread.start()
+        if self.sweep_profile:
+            self.start_sweep()
+        
+        self.timer = self.fig.canvas.new_timer(interval=FRAME_INTERVAL_MS)
+        self.timer.add_callback(self.on_timer)
+        self.timer.start()
         plt.show()
     
     def close(self):
         """Close the serial connection"""
+        self.stop_sweep()
+        self.running = False
+        if self.reader_thread:
+            self.reader_thread.join(timeout=1)
         if self.ser:
             self.ser.close()
-            print("Serial connection closed")
+            logger.info("Serial connection closed")
+        if self.acquisition and self.ingest:
+            self.ingest.close()
+            if self.worker:
+                self.worker.stop()
+                logger.info("Acquisition process stopped")
+        if self.log:
+            self.log.close()
+            logger.info("Recorded %d samples to %s", self.log.records, self.log.path)
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Real-time servo angle visualizer")
+    parser.add_argument('--port', default='COM4',
+                        help="serial port, e.g. COM4, /dev/ttyACM0 or a stm32_simulator.py pty (default COM4)")
+    parser.add_argument('--baud', type=int, default=9600, help="baud rate (default 9600)")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--acquisition', action='store_true', help="read the port in a separate process")
+    parser.add_argument('--log-dir', default=LOG_DIR, help="record the session to this directory")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (and /metrics.json)")
+    parser.add_argument('--overlay', action='store_true', help="show live metrics on the gauge")
+    parser.add_argument('--sweep', choices=sorted(PROFILES),
+                        help="send this setpoint profile as SET:NNN commands from the start ('w' toggles)")
+    parser.add_argument('--sweep-rate', type=float, default=SWEEP_RATE,
+                        help=f"setpoints per second (default {SWEEP_RATE})")
+    parser.add_argument('--sweep-period', type=float, default=SWEEP_PERIOD_S,
+                        help=f"sweep profile period in s (default {SWEEP_PERIOD_S:g})")
+    parser.add_argument('--match', choices=MATCH_MODES, default='value',
+                        help="'value': match the reported angle (default); 'next': every report answers "
+                             "the oldest SET, only for firmware that reports once per SET")
+    parser.add_argument('--log-level', default=None, help="DEBUG, INFO, WARNING, ... (default INFO)")
+    return parser.parse_args()
 
 def main():
     """Main function"""    
+    args = parse_args()
+    configure(args.log_level)
+    if args.metrics_port:
+        start_server(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
     print("STM32 Servo Position Visualizer")
     print("=" * 50)    
     
     try:
-        visualizer = ServoVisualizer(port='COM4', baudrate=9600)
+        visualizer = ServoVisualizer(port=args.port, baudrate=args.baud, protocol=args.protocol,
+                                     acquisition=args.acquisition, log_dir=args.log_dir,
+                                     metrics=bool(args.metrics_port), overlay=args.overlay,
+                                     sweep=args.sweep, sweep_rate=args.sweep_rate,
+                                     sweep_period=args.sweep_period, match=args.match)
         print("\nStarting visualization...")
         print("Color coding: Blue (0°) -> Green (45°) -> Yellow (90°) -> Orange (135°) -> Red (180°)")
+        print("Press 'a' for the trajectory analysis, 's' to save the capture.")
+        print("Press 'w' to start/stop a setpoint sweep, 't' to log the command latency.")
         print("Close the plot window to exit.")
         visualizer.start_animation()
     except KeyboardInterrupt:
@@ -1,5 +1,6 @@
 # This code belongs to the YouTube Video "Real-Time Frequency Measurement STM32 using Input Capture Mode of Timer and Python for Data Display" at https://youtu.be/mEHG08xiqEc 
 
+import argparse
 import serial
 from collections import deque
 import numpy as np
@@ -7,28 +8,87 @@ import time
 import threading
 import tkinter as tk
 from tkinter import ttk
-import re
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from serial_ingest import SerialIngest
+from line_parsers import get_parser
+from ring_buffer import RingBuffer
+from rolling_extrema import RollingExtrema
+from decimate import MinMaxDecimator
+from pyramid import TimePyramid
+from compression import METHODS, make_compressor
+from streaming_stats import FrequencyStats
+from acquisition import open_ingest
+from session_log import SessionLog
+from metrics import IngestMetrics, ViewMetrics, REGISTRY, start_server
+from log_config import configure, get_logger
+
+logger = get_logger('frequency')
+
+GUI_FRAME_MS = 50            # Drain the sample queue and refresh the GUI at 20 fps
+MAX_SCROLLBACK_LINES = 500   # Raw data pane keeps only the newest lines
+PLOT_CAPACITY = 100000       # Samples kept for the live plot
+PLOT_WINDOW_SECONDS = 30     # Time span shown on the live plot
+PLOT_MIN_WINDOW_SECONDS = 1  # Zoom limits (mouse wheel)
+PLOT_MAX_WINDOW_SECONDS = 7 * 86400
+ZOOM_STEP = 2
+ALLAN_TAUS = (1, 10, 100)    # Allan deviation averaging windows (samples)
+LOG_DIR = None               # e.g. 'logs' to record every run (see session_log.py)
+COMPRESSION = None           # 'deadband' or 'swinging-door': store only points needed (see compression.py)
+COMPRESSION_TOLERANCE = 1.0  # Hz, maximum error of the stored curve
+OVERLAY_INTERVAL_S = 1.0     # refresh of the metrics overlay
 
 class FrequencyMonitor:
-    def __init__(self, port='COM4', baudrate=38400):
+    def __init__(self, port='COM4', baudrate=38400, protocol='text', acquisition=False, ingest=None,
+                 log_dir=LOG_DIR, metrics=False, overlay=False, compression=COMPRESSION,
+                 tolerance=COMPRESSION_TOLERANCE):
         self.port = port
         self.baudrate = baudrate
+        self.protocol = protocol    # 'text' ("Frequency: N Hz") or 'binary' frames
+        self.acquisition = acquisition  # read the port in a separate process (acquisition.py)
         self.serial_connection = None
+        self.worker = None
+        self.ingest = None
+        self.external_ingest = ingest   # e.g. MultiPortEngine.ingest(name) instead of opening a port
+        self.log_dir = log_dir
+        self.log = None             # SessionLog of the current run
         self.frequencies = deque(maxlen=100)  # Store last 100 readings
         self.timestamps = deque(maxlen=100)
         self.current_frequency = 0
         self.running = False
+        self.read_thread = None
+        self.drain_job = None       # pending root.after() id of the drain_queue chain
+        self.start_time = time.time()
+        self.last_batch_time = 0.0
+        self.stats = FrequencyStats(allan_taus=ALLAN_TAUS)
+        
+        # Optional compression between the parser and plot / log; statistics see every sample
+        self.compression = compression
+        self.tolerance = tolerance
+        self.compressor = None      # one per run
+        self.latest = None          # (time, frequency) of the newest sample
+        
+        # Per-stage timers and counters (see metrics.py); the overlay needs them too
+        self.metrics = ViewMetrics() if (metrics or overlay) else None
+        self.overlay = overlay
+        self.overlay_updated = 0.0
+        if self.metrics and compression:
+            REGISTRY.gauge('compression_ratio', 'Samples received per sample stored',
+                           fn=lambda: self.compressor.ratio if self.compressor else 1.0)
+        
+        # Reader thread -> GUI thread hand-off; deque append/popleft are thread-safe
+        self.sample_queue = deque()
         
         # GUI setup
         self.root = tk.Tk()
         self.root.title("STM32 Nucleo32-F303K8 Frequency Monitor- Timer Input Capture Mode")
-        self.root.geometry("800x600")
+        self.root.geometry("800x850")
         
         # Create GUI elements
         self.setup_gui()
         
         # Setup matplotlib
-      #  self.setup_plot()
+        self.setup_plot()
         
     def setup_gui(self):
         # Control frame
@@ -55,6 +115,10 @@ class FrequencyMonitor:
         self.stop_btn = ttk.Button(control_frame, text="Stop", command=self.stop_monitoring, state='disabled')
         self.stop_btn.grid(row=0, column=5, padx=5)
         
+        self.session_btn = ttk.Button(control_frame, text="Session", command=self.show_session,
+                                      state='normal' if self.log_dir else 'disabled')
+        self.session_btn.grid(row=0, column=6, padx=5)
+        
         # Status frame
         status_frame = ttk.LabelFrame(self.root, text="Current Reading", padding=10)
         status_frame.pack(pady=10, padx=10, fill='x')
@@ -67,95 +131,465 @@ class FrequencyMonitor:
                                      font=('Arial', 10))
         self.status_label.pack()
         
+        self.stats_label = ttk.Label(status_frame, text="Statistics: ---", 
+                                    font=('Arial', 9))
+        self.stats_label.pack()
+        
+        self.metrics_label = None
+        if self.overlay:
+            self.metrics_label = ttk.Label(status_frame, text="", font=('Courier', 8), justify='left')
+            self.metrics_label.pack()
+        
         # Raw data display
-        data_frame = ttk.LabelFrame(self.root, text="Raw Data", padding=10)
-        data_frame.pack(pady=10, padx=10, fill='both', expand=True)
+        self.data_frame = ttk.LabelFrame(self.root, text="Raw Data", padding=10)
+        self.data_frame.pack(pady=10, padx=10, fill='both', expand=True)
         
-        self.text_display = tk.Text(data_frame, height=10, width=80)
-        scrollbar = ttk.Scrollbar(data_frame, orient="vertical", command=self.text_display.yview)
+        self.text_display = tk.Text(self.data_frame, height=8, width=80)
+        scrollbar = ttk.Scrollbar(self.data_frame, orient="vertical", command=self.text_display.yview)
         self.text_display.configure(yscrollcommand=scrollbar.set)
         
         self.text_display.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+    def setup_plot(self):
+        """Embed a live frequency plot that is redrawn by blitting only the line"""
+        plot_frame = ttk.LabelFrame(self.root, padding=5,
+                                    text="Frequency History (wheel: zoom, drag: pan, double-click: live)")
+        plot_frame.pack(pady=10, padx=10, fill='both', expand=True, before=self.data_frame)
+        
+        # Columns: 0 = time (s since start), 1 = frequency (Hz)
+        self.plot_buffer = RingBuffer(PLOT_CAPACITY, columns=2)
+        self.plot_extrema = RollingExtrema(window=PLOT_WINDOW_SECONDS)
+        self.decimator = MinMaxDecimator()
+        # Min/max/mean buckets of the whole run for zoomed-out or panned views
+        self.pyramid = TimePyramid()
+        self.window_seconds = PLOT_WINDOW_SECONDS
+        self.view_end = None        # s since start of the right edge, None = live (0 = now)
+        self.drag = None
+        
+        self.fig = Figure(figsize=(8, 3), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        self.freq_line, = self.ax.plot([], [], 'b-', linewidth=1.5, animated=True)
+        if self.compression == 'deadband':
+            self.freq_line.set_drawstyle('steps-post')     # deadband points are a sample-and-hold curve
+        self.ax.set_xlim(-PLOT_WINDOW_SECONDS, 0)
+        self.ax.set_ylim(0, 1000)
+        self.ax.set_xlabel("Time (s, 0 = now)")
+        self.ax.set_ylabel("Frequency (Hz)")
+        self.ax.grid(True, alpha=0.3)
+        self.fig.tight_layout()
+        
+        self.canvas = FigureCanvasTkAgg(self.fig, master=plot_frame)
+        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        
+        # The x-axis is relative to "now", so the background only changes
+        # when the y-limits or the window size change
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.canvas.mpl_connect('button_press_event', self.on_press)
+        self.canvas.mpl_connect('motion_notify_event', self.on_motion)
+        self.canvas.mpl_connect('button_release_event', self.on_release)
+        
+    def on_draw(self, event):
+        """Cache the static background after every full redraw"""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.freq_line)
+        
+    def set_view(self, window_seconds, view_end=None):
+        """Show `window_seconds` ending at view_end (s since start), or ending now when None"""
+        self.window_seconds = min(max(window_seconds, PLOT_MIN_WINDOW_SECONDS), PLOT_MAX_WINDOW_SECONDS)
+        if view_end is not None and view_end >= time.time() - self.start_time:
+            view_end = None     # panned back to the present
+        self.view_end = view_end
+        if view_end is None:
+            self.ax.set_xlim(-self.window_seconds, 0)
+            self.ax.set_xlabel("Time (s, 0 = now)")
+        else:
+            self.ax.set_xlim(view_end - self.window_seconds, view_end)
+            self.ax.set_xlabel("Time (s since start)")
+        self.canvas.draw()      # new axis, on_draw() recaptures the background
+        self.update_plot()
+        
+    def on_scroll(self, event):
+        """Mouse wheel zooms the time span, keeping the right edge"""
+        factor = 1.0 / ZOOM_STEP if event.button == 'up' else ZOOM_STEP
+        self.set_view(self.window_seconds * factor, self.view_end)
+        
+    def on_press(self, event):
+        """Start panning with the left button; double-click returns to the live view"""
+        if event.inaxes is not self.ax or event.button != 1:
+            return
+        if event.dblclick:
+            self.drag = None
+            self.set_view(PLOT_WINDOW_SECONDS)
+            return
+        end = self.view_end if self.view_end is not None else time.time() - self.start_time
+        self.drag = (event.x, end)
+        
+    def on_motion(self, event):
+        if self.drag is None or event.x is None:
+            return
+        press_x, press_end = self.drag
+        seconds_per_pixel = self.window_seconds / max(self.ax.get_window_extent().width, 1)
+        self.set_view(self.window_seconds, press_end - (event.x - press_x) * seconds_per_pixel)
+        
+    def on_release(self, event):
+        self.drag = None
+        
+    def update_plot(self):
+        """Blit the frequency line from the ring buffer, or the pyramid when zoomed out or panned"""
+        if self.background is None or len(self.plot_buffer) == 0:
+            return
+        
+        now = time.time() - self.start_time
+        live = self.view_end is None
+        t1 = now if live else self.view_end
+        t0 = t1 - self.window_seconds
+        data = self.plot_buffer.view()
+        width = self.ax.get_window_extent().width
+        
+        if live and self.window_seconds <= PLOT_WINDOW_SECONDS:
+            # Live window: incremental min/max decimation of the raw samples
+            first = np.searchsorted(data[:, 0], t0)
+            self.decimator.set_pixel_width(width)
+            x, y = self.decimator.update(data[first:, 0], data[first:, 1],
+                                         self.plot_buffer.total - len(self.plot_buffer) + first)
+        else:
+            # O(pixels) buckets of the pyramid level matching the span, raw samples close up
+            x, y = self.pyramid.view(t0, t1, width, data[:, 0], data[:, 1])
+        if self.compressor and self.latest is not None and self.latest[0] > data[-1, 0]:
+            # The newest sample is not stored yet (swinging door holds it back, deadband drops it)
+            x, y = np.append(x, self.latest[0]), np.append(y, self.latest[1])
+        self.freq_line.set_data(x - now if live else x, y)
+        
+        # Rescale when the data leaves the axis or only fills a small part of it
+        lo = hi = None
+        if live and self.window_seconds == PLOT_WINDOW_SECONDS:
+            self.plot_extrema.expire(t0)
+            lo, hi = self.plot_extrema.min, self.plot_extrema.max
+        elif len(y):
+            lo, hi = y.min(), y.max()
+        if lo is not None:
+            y_min, y_max = self.ax.get_ylim()
+            margin = max((hi - lo) * 0.1, 1)
+            if lo < y_min or hi > y_max or (y_max - y_min) > 4 * (hi - lo + 2 * margin):
+                self.ax.set_ylim(lo - margin, hi + margin)
+                self.canvas.draw()  # full redraw, on_draw() recaptures the background
+                return
+        
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.freq_line)
+        self.canvas.blit(self.ax.bbox)
+        
     def start_monitoring(self):
         try:
             self.port = self.port_var.get()
             self.baudrate = int(self.baudrate_var.get())
             
-            # Open serial connection
-            self.serial_connection = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=1,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE
-            )
+            if self.external_ingest:
+                # Samples come from an already running reader (e.g. multi_serial.py)
+                self.ingest = self.external_ingest
+            elif self.acquisition:
+                # Attach to (or start) the acquisition process that owns the port
+                self.worker, self.ingest = open_ingest(self.port, self.baudrate, 'frequency',
+                                                       protocol=self.protocol)
+            else:
+                # Open serial connection
+                self.serial_connection = serial.Serial(
+                    port=self.port,
+                    baudrate=self.baudrate,
+                    timeout=1,
+                    bytesize=serial.EIGHTBITS,
+                    parity=serial.PARITY_NONE,
+                    stopbits=serial.STOPBITS_ONE
+                )
+                self.ingest = SerialIngest(self.serial_connection, parser=get_parser('frequency'),
+                                           protocol=self.protocol,
+                                           metrics=IngestMetrics() if self.metrics else None)
+            
+            if self.log_dir:
+                self.log = SessionLog(self.log_dir, 'frequency', devices=[(self.port, 'frequency')])
             
+            self.compressor = make_compressor(self.compression, self.tolerance)
+            self.latest = None
             self.running = True
+            self.start_time = time.time()
+            self.last_batch_time = 0.0
+            self.plot_buffer.clear()
+            self.plot_extrema.reset()
+            self.pyramid.clear()
+            self.set_view(PLOT_WINDOW_SECONDS)
+            self.stats.reset()
             self.start_btn.config(state='disabled')
             self.stop_btn.config(state='normal')
             self.status_label.config(text=f"Status: Connected to {self.port}")
             
             # Start reading thread
-            self.read_thread = threading.Thread(target=self.read_serial_data)
+            self.read_thread = threading.Thread(target=self.read_serial_data, args=(self.ingest, self.worker))
             self.read_thread.daemon = True
             self.read_thread.start()
-                  
+            
+            # GUI refresh runs on the Tk thread; a chain left over from the
+            # previous run is replaced, so only one drains the queue
+            if self.drain_job is not None:
+                self.root.after_cancel(self.drain_job)
+            self.drain_job = self.root.after(GUI_FRAME_MS, self.drain_queue)
             
         except Exception as e:
             self.status_label.config(text=f"Error: {str(e)}")
             self.running = False
+            # Don't hold on to the port when monitoring did not start
+            if self.serial_connection:
+                self.serial_connection.close()
+                self.serial_connection = None
+            if self.acquisition and self.ingest:
+                self.ingest.close()
+                if self.worker:
+                    self.worker.stop()
+                    self.worker = None
+            self.ingest = None
             
     def stop_monitoring(self):
         self.running = False
+        if self.read_thread:
+            self.read_thread.join(timeout=1)
+            # The reader flushes the compressor, closes the session log and detaches
+            # from the acquisition itself once it is out of the read loop
+            if self.read_thread.is_alive():
+                logger.warning("Reader still busy; it finishes the run when it returns")
         if self.serial_connection:
             self.serial_connection.close()
+        if self.acquisition and self.ingest:
+            self.ingest = None
+            self.worker = None
             
         self.start_btn.config(state='normal')
         self.stop_btn.config(state='disabled')
         self.status_label.config(text="Status: Disconnected")
         
-    def read_serial_data(self):
-        start_time = time.time()
+    def read_batch(self, ingest):
+        """Drain the serial buffer, returns (raw text, device timestamp, frequency or None)"""
+        if self.protocol == 'binary' or self.acquisition or self.external_ingest:
+            return [(f"[{timestamp:.0f} ms] Frequency: {frequency} Hz" if timestamp is not None
+                     else f"Frequency: {frequency} Hz", timestamp, frequency)
+                    for timestamp, frequency in ingest.poll_timestamped()]
         
-        while self.running:
+        # Extract frequency from each line
+        lines = ingest.read_lines()
+        return [(line, None, frequency) for line, frequency in zip(lines, ingest.parse_each(lines))]
+        
+    def read_serial_data(self, ingest, worker=None):
+        """Reader thread: never touches Tk, only pushes batches onto sample_queue
+
+        Gets the ingest (and acquisition worker) of its run and finishes
+        the run on the way out: flushes the compressor, closes the session
+        log and, in acquisition mode, closes the ingest and worker.
+        stop_monitoring() may give up waiting while this thread is still
+        inside poll_timestamped().
+        """
+        compressor, log = self.compressor, self.log
+        try:
+            self.read_loop(ingest)
+        finally:
+            if compressor:
+                # Store the point the compressor still holds back; drain_queue()
+                # keeps running until this thread is done, so it gets drawn
+                kept = compressor.flush()
+                if kept:
+                    self.sample_queue.append(('data', [], [], [(t, frequency) for t, frequency, _ in kept]))
+                    if log:
+                        self.log_points(kept, log)
+                logger.info("Compression: %s", compressor.summary())
+            if log:
+                log.close()
+                logger.info("Recorded %d samples to %s", log.records, log.path)
+            if self.acquisition and ingest is not None:
+                # Only now is nothing polling the shared-memory ring any more
+                ingest.close()
+                if worker:
+                    worker.stop()
+                    logger.info("Acquisition process stopped")
+    
+    def read_loop(self, ingest):
+        """Push batches from `ingest` onto sample_queue until monitoring stops"""
+        # A reader left over from a previous run also stops once a new one has started
+        while self.running and self.read_thread is threading.current_thread():
             try:
-                if self.serial_connection and self.serial_connection.in_waiting:
-                    line = self.serial_connection.readline().decode('utf-8').strip()
-                    
-                    if line:
-                        # Update text display
-                        self.text_display.insert(tk.END, line + '\n')
-                        self.text_display.see(tk.END)
+                if ingest:
+                    # Drain everything buffered since the last pass
+                    batch = self.read_batch(ingest)
+                    if batch:
+                        current_time = time.time() - self.start_time
+                        lines = [line for line, _, _ in batch]
+                        readings = [(timestamp, frequency) for _, timestamp, frequency in batch
+                                    if frequency is not None]
+                        # A batch is spread evenly over the interval since the previous one
+                        step = (current_time - self.last_batch_time) / max(len(readings), 1)
+                        samples = [(self.last_batch_time + step * (i + 1), frequency)
+                                   for i, (_, frequency) in enumerate(readings)]
+                        self.last_batch_time = current_time
                         
-                        # Extract frequency from line
-                        freq_match = re.search(r'Frequency:\s*(\d+)\s*Hz', line)
-                        if freq_match:
-                            frequency = int(freq_match.group(1))
-                            current_time = time.time() - start_time
-                            
-                            self.frequencies.append(frequency)
-                            self.timestamps.append(current_time)
-                            self.current_frequency = frequency
-                            
-                            # Update frequency label
-                            self.freq_label.config(text=f"Frequency: {frequency} Hz")
+                        stored = samples
+                        if self.compressor:
+                            kept = self.compressor.compress((t, frequency, timestamp) for (t, frequency), (timestamp, _)
+                                                            in zip(samples, readings))
+                            stored = [(t, frequency) for t, frequency, _ in kept]
+                            if self.log and kept:
+                                self.log_points(kept)
+                        elif self.log:
+                            self.log.append(ingest.last_receive_time, readings)
+                        self.sample_queue.append(('data', lines, samples, stored))
                             
                 time.sleep(0.01)  # Small delay to prevent high CPU usage
                 
             except Exception as e:
-                self.status_label.config(text=f"Read Error: {str(e)}")
+                if self.running:
+                    logger.warning("Read error on %s: %s", self.port, e)
+                    self.sample_queue.append(('error', f"Read Error: {str(e)}", None, None))
                 break                   
             
+    def log_points(self, points, log=None):
+        """Record compressed (time, frequency, device timestamp) points"""
+        (log or self.log).append(np.array([t for t, _, _ in points]) + self.start_time,
+                                 [(timestamp, frequency) for _, frequency, timestamp in points])
+            
+    def drain_queue(self):
+        """Apply everything the reader queued since the last frame as one GUI update"""
+        self.drain_job = None
+        lines = []
+        latest = None
+        latest_time = None
+        if self.metrics:
+            start = time.perf_counter()
+            self.metrics.queue_depth.set(sum(len(samples) for _, _, samples, _ in list(self.sample_queue)
+                                             if samples))
+        
+        while self.sample_queue:
+            kind, payload, samples, stored = self.sample_queue.popleft()
+            if kind == 'error':
+                self.status_label.config(text=payload)
+                continue
+            lines.extend(payload)
+            for current_time, frequency in samples:
+                self.plot_extrema.push(current_time, frequency)
+                self.stats.update(frequency)
+                latest = frequency
+                latest_time = current_time
+            if latest_time is not None:
+                self.latest = (latest_time, latest)
+            # History and plot only get the points kept by the compressor (all without one)
+            for current_time, frequency in stored:
+                self.frequencies.append(frequency)
+                self.timestamps.append(current_time)
+            if stored:
+                rows = np.asarray(stored, dtype=np.float64)
+                self.plot_buffer.extend(rows)
+                self.pyramid.extend(rows[:, 0], rows[:, 1])
+        
+        if lines:
+            self.append_scrollback(lines)
+        
+        if latest is not None:
+            self.current_frequency = latest
+            # Update frequency label
+            self.freq_label.config(text=f"Frequency: {latest} Hz")
+            summary = self.stats.summary()
+            if self.compressor:
+                summary += f"\nStored: 1 in {self.compressor.ratio:.1f} (±{self.compressor.tolerance:g} Hz)"
+            self.stats_label.config(text=summary)
+        
+        self.update_plot()
+        
+        if self.metrics:
+            self.metrics.render_seconds.observe(time.perf_counter() - start)
+            self.metrics.frames_drawn.inc()
+            if latest_time is not None:
+                self.metrics.latency.observe(time.time() - self.start_time - latest_time)
+            if self.metrics_label is not None and time.time() - self.overlay_updated >= OVERLAY_INTERVAL_S:
+                self.metrics_label.config(text=REGISTRY.overlay_text())
+                self.overlay_updated = time.time()
+        
+        # Until the reader has finished it may still queue the compressor's last point
+        if self.running or self.sample_queue or (self.read_thread and self.read_thread.is_alive()):
+            self.drain_job = self.root.after(GUI_FRAME_MS, self.drain_queue)
+            
+    def append_scrollback(self, lines):
+        """Append lines to the raw data pane, trimming it to MAX_SCROLLBACK_LINES"""
+        lines = lines[-MAX_SCROLLBACK_LINES:]
+        self.text_display.insert(tk.END, '\n'.join(lines) + '\n')
+        
+        # 'end-1c' is on the empty line after the last newline
+        line_count = int(self.text_display.index('end-1c').split('.')[0]) - 1
+        excess = line_count - MAX_SCROLLBACK_LINES
+        if excess > 0:
+            self.text_display.delete('1.0', f'{excess + 1}.0')
+        self.text_display.see(tk.END)
+            
+    def get_statistics(self):
+        """Running statistics of this session (see FrequencyStats.snapshot)"""
+        return self.stats.snapshot()
+            
+    def show_session(self):
+        """Plot the whole recorded run from the session log in a separate window"""
+        if not self.log:
+            self.status_label.config(text="Status: Nothing recorded yet")
+            return
+        records = self.log.history()
+        if len(records) == 0:
+            return
+        window = tk.Toplevel(self.root)
+        window.title(f"Session - {len(records)} samples")
+        fig = Figure(figsize=(8, 4), dpi=100)
+        ax = fig.add_subplot(111)
+        times = records['host_time'] - records['host_time'][0]
+        ax.plot(*MinMaxDecimator(max_buckets=1500).update(times, records['value']), 'b-', linewidth=1)
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Frequency (Hz)')
+        ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+        canvas = FigureCanvasTkAgg(fig, master=window)
+        canvas.get_tk_widget().pack(fill='both', expand=True)
+        canvas.draw()
+            
     def run(self):
         self.root.mainloop()
 
-if __name__ == "__main__":    
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Input capture frequency monitor")
+    parser.add_argument('--port', default='COM4',
+                        help="serial port, e.g. COM4, /dev/ttyACM0 or a stm32_simulator.py pty (default COM4)")
+    parser.add_argument('--baud', type=int, default=9600, help="baud rate (default 9600)")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--acquisition', action='store_true', help="read the port in a separate process")
+    parser.add_argument('--log-dir', default=LOG_DIR, help="record every run to this directory")
+    parser.add_argument('--compress', choices=METHODS, default=COMPRESSION,
+                        help="store only the points needed to stay within --tolerance")
+    parser.add_argument('--tolerance', type=float, default=COMPRESSION_TOLERANCE,
+                        help=f"compression error bound in Hz (default {COMPRESSION_TOLERANCE})")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (and /metrics.json)")
+    parser.add_argument('--overlay', action='store_true', help="show live metrics in the window")
+    parser.add_argument('--log-level', default=None, help="DEBUG, INFO, WARNING, ... (default INFO)")
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_args()
+    configure(args.log_level)
     print("STM32 Nucleo32-F303K8 Frequency Monitor- Timer Input Capture Mode")
     print()
+    if args.metrics_port:
+        start_server(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
     
     # Create and run the monitor
-    monitor = FrequencyMonitor(port='COM4', baudrate=9600)  # Adjust COM port as needed
+    monitor = FrequencyMonitor(port=args.port, baudrate=args.baud, protocol=args.protocol,
+                               acquisition=args.acquisition, log_dir=args.log_dir,
+                               metrics=bool(args.metrics_port), overlay=args.overlay,
+                               compression=args.compress, tolerance=args.tolerance)
     monitor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# Serial acquisition in a separate process, published through shared memory.
+#
+# The worker process owns the serial.Serial port, parses every sample and
+# appends it to a ring buffer in multiprocessing.shared_memory.  GUIs (one
+# or several, in any process) attach as readers by name, so a slow redraw
+# or GC pause in a viewer can never delay or drop acquisition.
+#
+# Shared memory layout:
+#
+#   header   8 x int64: write sequence (records ever written), capacity,
+#            status, bytes read, samples parsed, parse errors, start-up
+#            time (ms), reserved
+#   readers  MAX_READERS x (token, heartbeat ms) int64 pairs, one per
+#            attached SharedMemoryIngest (token 0 = free slot), claimed
+#            and released under a lock file in the temp directory
+#   records  capacity x RECORD_DTYPE (host_time, device_time_ms, value)
+#
+# The single writer fills records first and only then advances the write
+# sequence, so a reader never sees a sequence number for data that is not
+# there yet.  A reader that falls more than `capacity` records behind
+# skips ahead and counts the lost records as dropped.
+#
+# The viewer that started the worker owns it, but acquisition outlives the
+# owner while other viewers are still attached: the worker exits (and
+# removes the segment) once the owner has left and the last reader slot is
+# released or has not sent a heartbeat for READER_TIMEOUT_S.  An owner
+# that dies without stopping the worker (killed, crashed) counts as gone
+# too, so the port is never held open forever.
+#
+#   worker = AcquisitionWorker('COM4', 9600, 'angle')
+#   worker.start()
+#   ingest = SharedMemoryIngest(worker.shm_name, 'angle')
+#   ingest.poll()       # same API as SerialIngest
+
+import atexit
+import contextlib
+import multiprocessing as mp
+import os
+import re
+import secrets
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from log_config import get_logger
+
+logger = get_logger('acquisition')
+
+RECORD_DTYPE = np.dtype([('host_time', '<f8'), ('device_time', '<f8'), ('value', '<f8')])
+MAX_READERS = 16
+HEADER_FIELDS = 8 + 2 * MAX_READERS
+HEADER_SIZE = HEADER_FIELDS * 8
+SEQ, CAPACITY, STATUS, BYTES_READ, SAMPLES, PARSE_ERRORS, CREATED = range(7)
+READER_SLOTS = 8
+
+STATUS_STARTING, STATUS_RUNNING, STATUS_STOPPED, STATUS_ERROR = range(4)
+
+DEFAULT_CAPACITY = 1 << 18          # records (6 MiB)
+IDLE_POLL_S = 0.001
+READER_TIMEOUT_S = 30.0             # a reader that stops polling this long counts as gone
+HEARTBEAT_S = 1.0
+STARTUP_TIMEOUT_S = 10.0            # a ring stuck in STATUS_STARTING this long is stale
+
+
+class AcquisitionStopped(OSError):
+    """The acquisition worker behind a SharedMemoryIngest stopped or failed"""
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def shm_name_for_port(port):
+    """Well-known shared memory name for a port, so viewers can find a running worker"""
+    return 'stm32_' + re.sub(r'[^A-Za-z0-9]+', '_', port).strip('_')
+
+
+@contextlib.contextmanager
+def _slot_lock(name):
+    """Exclusive lock on the reader slots of a ring, shared by every viewer process"""
+    path = os.path.join(tempfile.gettempdir(), name + '.lock')
+    with open(path, 'a+b') as f:
+        if os.name == 'posix':
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        else:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _attach(name):
+    """Attach to an existing segment without handing its lifetime to this process"""
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        # Before Python 3.13 attaching registers the segment with the resource
+        # tracker, which would unlink it when this (reader) process exits
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+    return shm
+
+
+class SharedRing:
+    def __init__(self, name, capacity=DEFAULT_CAPACITY, create=False):
+        if create:
+            size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = _attach(name)
+        self.name = name
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+        self.capacity = int(self.header[CAPACITY])
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE,
+                                  buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.readers = self.header[READER_SLOTS:].reshape(MAX_READERS, 2)
+        if create:
+            # Start-up time, so a ring whose worker never got going can be recognised
+            self.header[CREATED] = _now_ms()
+
+    @property
+    def status(self):
+        return int(self.header[STATUS])
+
+    def register_reader(self):
+        """Claim a reader slot, returns its (slot, token)"""
+        token = secrets.randbits(62) + 1
+        with _slot_lock(self.name):
+            now = _now_ms()
+            for slot in range(MAX_READERS):
+                if self.readers[slot, 0] == 0 or now - self.readers[slot, 1] > READER_TIMEOUT_S * 1000:
+                    self.readers[slot] = (token, now)
+                    return slot, token
+        raise RuntimeError(f"More than {MAX_READERS} viewers attached to {self.name}")
+
+    def heartbeat(self, slot, token):
+        if self.readers[slot, 0] == token:
+            self.readers[slot, 1] = _now_ms()
+
+    def release_reader(self, slot, token):
+        # Under the lock, so a slot that timed out and was claimed again is not freed
+        with _slot_lock(self.name):
+            if self.readers[slot, 0] == token:
+                self.readers[slot] = 0
+
+    def reader_count(self):
+        """Readers that are attached and polled within READER_TIMEOUT_S"""
+        active = self.readers[:, 0] != 0
+        fresh = _now_ms() - self.readers[:, 1] <= READER_TIMEOUT_S * 1000
+        return int(np.count_nonzero(active & fresh))
+
+    def stale(self):
+        """True when no worker is (or will be) writing to this ring"""
+        status = self.status
+        if status in (STATUS_STOPPED, STATUS_ERROR):
+            return True
+        age = _now_ms() - int(self.header[CREATED])
+        return status == STATUS_STARTING and age > STARTUP_TIMEOUT_S * 1000
+
+    def write(self, host_time, samples):
+        """Append (device_time_ms or None, value) samples; single writer only"""
+        n = len(samples)
+        if n == 0:
+            return
+        seq = int(self.header[SEQ])
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            seq += n - self.capacity
+            n = self.capacity
+
+        block = np.empty(n, dtype=RECORD_DTYPE)
+        block['host_time'] = host_time
+        block['device_time'] = [np.nan if ts is None else ts for ts, _ in samples]
+        block['value'] = [value for _, value in samples]
+
+        start = seq % self.capacity
+        first = min(n, self.capacity - start)
+        self.records[start:start + first] = block[:first]
+        self.records[:n - first] = block[first:]
+        # Publish only after the records are in place
+        self.header[SEQ] = seq + n
+
+    def read_range(self, start, end):
+        """Copy records [start, end) (absolute sequence numbers) out of the ring"""
+        first = start % self.capacity
+        count = end - start
+        if first + count <= self.capacity:
+            return self.records[first:first + count].copy()
+        split = self.capacity - first
+        return np.concatenate([self.records[first:], self.records[:count - split]])
+
+    def close(self):
+        # Drop the numpy views before closing the mapping
+        self.header = None
+        self.records = None
+        self.readers = None
+        self.shm.close()
+
+    def unlink(self):
+        if os.name == 'posix':
+            # A reader sharing our resource tracker may have unregistered the
+            # name (see _attach); register again so unlink() can unregister it
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+
+def _acquire(shm_name, port, baudrate, kind, protocol, stop_event, handed_over):
+    """Worker process body: serial -> parser -> shared ring
+
+    Runs until the owner has set `stop_event` (or died without doing so)
+    and no reader is attached.  If the owner left while readers were still
+    attached (`handed_over`) or died, the worker also removes the shared
+    memory segment on the way out.
+    """
+    import serial
+    from serial_ingest import SerialIngest
+    from line_parsers import get_parser
+
+    ring = SharedRing(shm_name)
+    try:
+        ser = serial.Serial(port, baudrate, timeout=1)
+    except serial.SerialException as e:
+        logger.error("Error opening %s: %s", port, e)
+        ring.header[STATUS] = STATUS_ERROR
+        ring.close()
+        return
+
+    parent = mp.parent_process()
+    orphaned = False
+    next_check = 0.0
+
+    def done():
+        nonlocal orphaned, next_check
+        if not (stop_event.is_set() or orphaned):
+            now = time.monotonic()
+            if now < next_check:
+                return False
+            next_check = now + HEARTBEAT_S
+            orphaned = parent is not None and not parent.is_alive()
+            if not orphaned:
+                return False
+        return ring.reader_count() == 0
+
+    ingest = SerialIngest(ser, parser=get_parser(kind), protocol=protocol)
+    ring.header[STATUS] = STATUS_RUNNING
+    try:
+        while not done():
+            samples = ingest.poll_timestamped()
+            if samples:
+                ring.write(ingest.last_receive_time, samples)
+                ring.header[SAMPLES] += len(samples)
+                ring.header[BYTES_READ] = ingest.bytes_read
+                ring.header[PARSE_ERRORS] = ingest.parse_errors
+            else:
+                time.sleep(IDLE_POLL_S)
+        ring.header[STATUS] = STATUS_STOPPED
+    except serial.SerialException as e:
+        logger.error("Serial error on %s: %s", port, e)
+        ring.header[STATUS] = STATUS_ERROR
+    finally:
+        ser.close()
+        ring.close()
+        if handed_over.is_set() or orphaned:
+            try:
+                ring.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class AcquisitionWorker:
+    def __init__(self, port, baudrate, kind, protocol='text', capacity=DEFAULT_CAPACITY, shm_name=None):
+        self.port = port
+        self.shm_name = shm_name or shm_name_for_port(port)
+        self.ring = SharedRing(self.shm_name, capacity=capacity, create=True)
+        self.stop_event = mp.Event()
+        self.handed_over = mp.Event()
+        self.stopped = False
+        # Not a daemon: it keeps serving the other viewers after this one exits
+        self.process = mp.Process(target=_acquire, name=f"acquire-{port}",
+                                  args=(self.shm_name, port, baudrate, kind, protocol,
+                                        self.stop_event, self.handed_over))
+
+    def start(self, timeout=5.0):
+        """Start the worker and wait until the port is open; raises on failure"""
+        self.process.start()
+        # An owner that exits without close() (e.g. an uncaught exception) still
+        # hands over or stops the worker, instead of blocking in the join of
+        # multiprocessing's own exit hook
+        atexit.register(self.stop)
+        deadline = time.time() + timeout
+        while self.ring.header[STATUS] == STATUS_STARTING and time.time() < deadline:
+            if not self.process.is_alive():
+                break
+            time.sleep(0.01)
+        if self.ring.header[STATUS] != STATUS_RUNNING:
+            self.stop()
+            raise RuntimeError(f"Acquisition worker could not open {self.port}")
+
+    def stop(self):
+        """Stop the worker and release the shared memory
+
+        Close this process's own SharedMemoryIngest first.  While other
+        viewers are still attached the worker is left running for them; it
+        stops and removes the segment itself when the last one detaches.
+        """
+        if self.stopped:
+            return
+        self.stopped = True
+        atexit.unregister(self.stop)
+        readers = self.ring.reader_count()
+        if readers and self.process.is_alive():
+            self.handed_over.set()
+            self.stop_event.set()
+            self.ring.close()
+            logger.info("%d viewer(s) still attached to %s; acquisition continues until they detach",
+                        readers, self.port)
+            return
+        self.stop_event.set()
+        if self.process.is_alive():
+            self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+        try:
+            self.ring.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedMemoryIngest:
+    def __init__(self, shm_name, kind, latest_only=False, from_start=False):
+        self.ring = SharedRing(shm_name)
+        self.kind = kind
+        self.latest_only = latest_only
+        self.protocol = 'shared'
+        self.integer = kind in ('angle', 'frequency')
+        self.cursor = 0 if from_start else int(self.ring.header[SEQ])
+        self.dropped = 0
+        self.last_receive_time = None   # host times of the last batch (array)
+        self.slot, self.token = self.ring.register_reader()
+        self.last_heartbeat = time.time()
+        # Free the slot on exit even without close(), so the worker is not kept waiting
+        atexit.register(self.release)
+
+    @property
+    def bytes_read(self):
+        return int(self.ring.header[BYTES_READ])
+
+    @property
+    def parse_errors(self):
+        return int(self.ring.header[PARSE_ERRORS])
+
+    @property
+    def backlog(self):
+        """Records published but not yet read by this viewer"""
+        return int(self.ring.header[SEQ]) - self.cursor
+
+    @property
+    def worker_alive(self):
+        return self.ring.status == STATUS_RUNNING
+
+    def read_new(self):
+        """All records written since the last call, oldest first
+
+        Raises AcquisitionStopped once the worker has stopped or failed and
+        everything it published has been read.
+        """
+        now = time.time()
+        if now - self.last_heartbeat >= HEARTBEAT_S:
+            self.ring.heartbeat(self.slot, self.token)
+            self.last_heartbeat = now
+        status = self.ring.status
+        end = int(self.ring.header[SEQ])
+        start = max(self.cursor, end - self.ring.capacity)
+        self.dropped += start - self.cursor
+        records = self.ring.read_range(start, end)
+
+        # The writer may have lapped us while copying; discard overwritten records
+        oldest_valid = int(self.ring.header[SEQ]) - self.ring.capacity
+        if oldest_valid > start:
+            lost = min(oldest_valid - start, len(records))
+            records = records[lost:]
+            self.dropped += lost
+
+        self.cursor = end
+        if len(records) == 0 and status in (STATUS_STOPPED, STATUS_ERROR):
+            raise AcquisitionStopped(f"Acquisition worker for {self.ring.name} "
+                                     f"{'stopped' if status == STATUS_STOPPED else 'failed'}")
+        if self.latest_only:
+            records = records[-1:]
+        self.last_receive_time = records['host_time']
+        return records
+
+    def poll_timestamped(self):
+        """(device_timestamp_ms or None, value) pairs, as SerialIngest.poll_timestamped"""
+        records = self.read_new()
+        values = records['value']
+        values = values.astype(np.int64).tolist() if self.integer else values.tolist()
+        device = [None if ts != ts else ts for ts in records['device_time'].tolist()]
+        return list(zip(device, values))
+
+    def poll(self):
+        return [value for _, value in self.poll_timestamped()]
+
+    def release(self):
+        """Give up the reader slot (keeps the mapping)"""
+        atexit.unregister(self.release)
+        if self.ring.header is not None:
+            self.ring.release_reader(self.slot, self.token)
+
+    def close(self):
+        self.release()
+        self.ring.close()
+
+
+def open_ingest(port, baudrate, kind, protocol='text', latest_only=False):
+    """Attach to a running worker for `port`, or start one; returns (worker or None, ingest)
+
+    The worker is None when another process already acquires from the port
+    (or is still opening it), in which case this viewer just attaches as an
+    additional reader.
+    """
+    name = shm_name_for_port(port)
+    worker = None
+    try:
+        ring = SharedRing(name)
+        if not ring.stale():
+            ring.close()
+            return None, SharedMemoryIngest(name, kind, latest_only=latest_only)
+        # Left over from a worker that exited without cleaning up
+        ring.close()
+        ring.unlink()
+        raise FileNotFoundError(name)
+    except FileNotFoundError:
+        worker = AcquisitionWorker(port, baudrate, kind, protocol=protocol, shm_name=name)
+        worker.start()
+        ingest = SharedMemoryIngest(name, kind, latest_only=latest_only)
+    return worker, ingest
@@ -0,0 +1,290 @@
+# End-to-end benchmark of the three monitoring tools against a simulated board.
+#
+# A stm32_simulator.py feeder writes to a local pty at increasing rates and
+# each tool reads it through its normal code path, headless:
+#
+#   adc         TemperatureMonitor.update() + full canvas draw (Agg)
+#   servo       ServoVisualizer reader thread + on_timer() blit (Agg)
+#   frequency   FrequencyMonitor reader thread + drain_queue() (withdrawn Tk root)
+#
+# Frames run at each tool's own frame interval.  Per run it reports:
+#
+#   throughput      samples/s the tool consumed (parsed and plotted)
+#   frame_ms        frame time percentiles (update + draw)
+#   backlog         samples sent but not yet on screen when the feeder stops
+#   dropped         samples never displayed after a settle period, including
+#                   those the feeder could not write because the tool fell behind
+#   latency_ms      device-to-pixel latency: from the feeder writing the
+#                   newest displayed sample to the end of the frame showing it
+#
+# Results are written as JSON; --baseline compares against an earlier file
+# and flags regressions.
+#
+#   python bench_end_to_end.py [--tools adc,servo,frequency] [--rates 100,1000,max]
+#                              [--duration 5] [--output results.json] [--baseline old.json]
+#
+# Needs a pty (Linux / macOS); the frequency tool also needs a display for Tk.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+from stm32_simulator import SimulatedBoard, live_samples, line_rate
+from log_config import configure
+
+TOOL_KINDS = {'adc': 'temperature', 'servo': 'angle', 'frequency': 'frequency'}
+FEEDER_BAUD = 921600            # pty is not baud limited; this caps the 'max' rate
+SETTLE_S = 1.0                  # extra time to drain after the feeder stops
+REGRESSION_TOLERANCE = 0.2      # 20 % worse than the baseline is flagged ...
+REGRESSION_FLOOR_MS = 2.0       # ... if the time also grew by more than this (timer noise)
+
+
+def percentiles(values, scale=1000.0):
+    """p50/p95/p99/max of a list of seconds, in ms"""
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': scale * float(p50), 'p95': scale * float(p95), 'p99': scale * float(p99),
+            'max': scale * float(max(values))}
+
+
+class Run:
+    """Frame loop for one tool at one rate"""
+
+    def __init__(self, board, frame, consumed, interval_s):
+        self.board = board
+        self.frame = frame              # renders one frame
+        self.consumed = consumed        # samples on screen so far
+        self.interval_s = interval_s
+        self.frame_times = []
+        self.latencies = []
+
+    def step(self):
+        before = self.consumed()
+        start = time.perf_counter()
+        self.frame()
+        self.frame_times.append(time.perf_counter() - start)
+        shown = self.consumed()
+        if shown > before:
+            sent = self.board.sent_at(shown)
+            if sent is not None:
+                self.latencies.append(time.monotonic() - sent)
+
+    def loop(self, duration):
+        end = time.monotonic() + duration
+        next_frame = time.monotonic()
+        while time.monotonic() < end:
+            self.step()
+            next_frame += self.interval_s
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame = time.monotonic()     # fell behind, don't try to catch up
+
+    def result(self, duration, backlog):
+        sent = self.board.samples_sent
+        shown = self.consumed()
+        return {
+            'offered_rate': (sent + self.board.dropped) / duration,
+            'sent': sent,
+            'received': shown,
+            'throughput': (sent - backlog) / duration,
+            'frames': len(self.frame_times),
+            'frame_ms': percentiles(self.frame_times),
+            'latency_ms': percentiles(self.latencies),
+            'backlog': backlog,
+            # Samples the pty could not take (the tool fell behind) are lost as on a real UART
+            'dropped': self.board.dropped + sent - shown,
+            'feeder_dropped': self.board.dropped,
+        }
+
+
+def bench(board, frame, consumed, interval_s, duration):
+    """Run frames while the feeder sends for `duration`, then let the tool drain"""
+    run = Run(board, frame, consumed, interval_s)
+    board.start(duration=duration)
+    run.loop(duration)
+    board.stop()
+    backlog = board.samples_sent - consumed()
+    run.loop(SETTLE_S)
+    return run.result(duration, backlog)
+
+
+# Each setup returns (frame, consumed, frame interval s, close, frame times or None)
+
+def bench_adc(port):
+    from ADC_TMP36 import TemperatureMonitor
+    monitor = TemperatureMonitor(port=port, baudrate=FEEDER_BAUD, log_dir=None)
+    canvas = monitor.fig.canvas
+
+    def frame():
+        monitor.update(0)
+        canvas.draw()       # FuncAnimation(blit=False) redraws the whole figure
+
+    return frame, lambda: monitor.history.total, 0.1, monitor.close, None
+
+
+def bench_servo(port):
+    from PWM_Servo_Python import ServoVisualizer, FRAME_INTERVAL_MS
+    vis = ServoVisualizer(port=port, baudrate=FEEDER_BAUD, log_dir=None)
+    vis.fig.canvas.draw()
+    vis.running = True
+    vis.reader_thread = threading.Thread(target=vis.capture_loop, daemon=True)
+    vis.reader_thread.start()
+
+    # The reader thread captures continuously; a frame shows what was captured when it started
+    shown = [0]
+
+    def frame():
+        shown[0] = len(vis.capture)
+        vis.on_timer()
+
+    return frame, lambda: shown[0], FRAME_INTERVAL_MS / 1000.0, vis.close, None
+
+
+def bench_frequency(port):
+    from Timer_ICMode_GUI import FrequencyMonitor, GUI_FRAME_MS
+    monitor = FrequencyMonitor(port=port, baudrate=FEEDER_BAUD, log_dir=None)
+    monitor.root.withdraw()
+    monitor.canvas.draw()
+
+    # Time drain_queue() itself; Tk schedules it with root.after()
+    frame_times = []
+    drain = monitor.drain_queue
+
+    def timed_drain():
+        start = time.perf_counter()
+        drain()
+        frame_times.append(time.perf_counter() - start)
+
+    monitor.drain_queue = timed_drain
+    monitor.start_monitoring()
+
+    def frame():
+        # One pass of the Tk event loop; drain_queue runs when its after() fires
+        monitor.root.update()
+
+    def close():
+        monitor.stop_monitoring()
+        monitor.root.destroy()
+
+    # Pump Tk faster than the GUI frame rate so after() callbacks run on time
+    return frame, lambda: monitor.stats.running.count, GUI_FRAME_MS / 1000.0 / 5, close, frame_times
+
+
+def run_tool(tool, rate, duration, protocol='text'):
+    kind = TOOL_KINDS[tool]
+    if rate == 'max':
+        rate = line_rate(kind, protocol, FEEDER_BAUD)
+    board = SimulatedBoard(live_samples(kind, float(rate)), protocol=protocol,
+                           baudrate=FEEDER_BAUD, record_sends=True)
+    setup = {'adc': bench_adc, 'servo': bench_servo, 'frequency': bench_frequency}[tool]
+    try:
+        # The tools log through log_config; main() sets WARNING to keep the report readable
+        frame, consumed, interval_s, close, frame_times = setup(board.port)
+        try:
+            result = bench(board, frame, consumed, interval_s, duration)
+        finally:
+            close()
+        if frame_times is not None:
+            # Frequency tool: frames are the drain_queue() calls, not Tk passes
+            result['frames'] = len(frame_times)
+            result['frame_ms'] = percentiles(frame_times)
+    finally:
+        board.close()
+    result.update(tool=tool, kind=kind, protocol=protocol, requested_rate=float(rate), duration=duration)
+    return result
+
+
+def compare(results, baseline_path):
+    """Print regressions against a baseline JSON file, returns their count"""
+    with open(baseline_path) as f:
+        baseline = {(r['tool'], r['protocol'], round(r['requested_rate'])): r for r in json.load(f)['results']}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r['tool'], r['protocol'], round(r['requested_rate'])))
+        if old is None:
+            continue
+        checks = [('throughput', r['throughput'], old['throughput'], True)]
+        for metric in ('frame_ms', 'latency_ms'):
+            if r[metric] and old[metric]:
+                checks.append((f"{metric} p99", r[metric]['p99'], old[metric]['p99'], False))
+        for name, new_value, old_value, higher_is_better in checks:
+            if not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            if not higher_is_better and new_value - old_value < REGRESSION_FLOOR_MS:
+                continue
+            if worse > REGRESSION_TOLERANCE:
+                regressions += 1
+                print(f"REGRESSION {r['tool']} @ {r['requested_rate']:.0f}/s: {name} "
+                      f"{old_value:.2f} -> {new_value:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the monitoring tools")
+    parser.add_argument('--tools', default='adc,servo,frequency')
+    parser.add_argument('--rates', default='100,1000,max',
+                        help=f"comma separated samples/s; 'max' = line rate at {FEEDER_BAUD} baud")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per run")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--output', default=time.strftime('bench_end_to_end_%Y%m%d_%H%M%S.json'))
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        print("This benchmark needs a pty (Linux / macOS)")
+        sys.exit(1)
+    configure('WARNING')    # keep the tools' connect / close messages out of the table
+
+    results = []
+    print(f"{'tool':<10} {'rate':>8} {'thru/s':>9} {'fps':>6} {'frame p50':>10} {'p99':>8} "
+          f"{'lat p50':>8} {'p99':>8} {'backlog':>8} {'dropped':>8}")
+    for tool in args.tools.split(','):
+        for rate in args.rates.split(','):
+            try:
+                r = run_tool(tool, rate, args.duration, args.protocol)
+            except Exception as e:
+                # e.g. no display for Tk
+                print(f"{tool:<10} {rate:>8} skipped: {e}")
+                continue
+            results.append(r)
+            frame, latency = r['frame_ms'] or {}, r['latency_ms'] or {}
+            print(f"{tool:<10} {r['requested_rate']:>8.0f} {r['throughput']:>9.0f} "
+                  f"{r['frames'] / (args.duration + SETTLE_S):>6.1f} "
+                  f"{frame.get('p50', float('nan')):>10.2f} {frame.get('p99', float('nan')):>8.2f} "
+                  f"{latency.get('p50', float('nan')):>8.1f} {latency.get('p99', float('nan')):>8.1f} "
+                  f"{r['backlog']:>8} {r['dropped']:>8}")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'matplotlib': matplotlib.__version__,
+        'numpy': np.__version__,
+        'feeder_baud': FEEDER_BAUD,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline)
+        print(f"{regressions} regression(s) against {args.baseline}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
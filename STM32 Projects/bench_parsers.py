@@ -0,0 +1,51 @@
+# Micro-benchmark for line_parsers: lines per second for every registered format,
+# parsing one line at a time and as a whole batch.
+#
+#   python bench_parsers.py [--lines 200000] [--batch 256]
+
+import argparse
+import random
+import time
+
+from line_parsers import PARSERS
+
+SAMPLE_LINES = {
+    'temperature': lambda rng: f"{rng.uniform(-10, 60):.2f}°C",
+    'angle': lambda rng: f"ANGLE:{rng.randint(0, 180)}",
+    'frequency': lambda rng: f"Frequency: {rng.randint(1, 100000)} Hz",
+}
+
+
+def measure(fn, repeat=3):
+    """Best wall time of `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Line parser micro-benchmark")
+    parser.add_argument('--lines', type=int, default=200000, help="lines per format")
+    parser.add_argument('--batch', type=int, default=256, help="lines per parse_batch() call")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'format':<12} {'per-line':>14} {'batch':>14}")
+    print("-" * 42)
+    for name, line_parser in PARSERS.items():
+        make_line = SAMPLE_LINES.get(name)
+        if make_line is None:
+            continue
+        lines = [make_line(rng) for _ in range(args.lines)]
+        batches = [lines[i:i + args.batch] for i in range(0, len(lines), args.batch)]
+
+        single = measure(lambda: [line_parser.parse(line) for line in lines])
+        batched = measure(lambda: [line_parser.parse_batch(b) for b in batches])
+        print(f"{name:<12} {len(lines) / single:>10,.0f} l/s {len(lines) / batched:>10,.0f} l/s")
+
+
+if __name__ == "__main__":
+    main()
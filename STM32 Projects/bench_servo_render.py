@@ -0,0 +1,143 @@
+# Frame-rate / CPU comparison of ServoVisualizer rendering: the original
+# per-frame trigonometry + restyle-all-segments path against the lookup
+# table, change-detecting path in update_plot().  Runs headless on Agg.
+#
+#   python bench_servo_render.py [--frames 2000] [--hold 0.5]
+#
+# --hold is the fraction of frames in which the angle does not change
+# (a servo resting between moves).
+
+import argparse
+import random
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+from PWM_Servo_Python import ServoVisualizer
+
+
+class HeadlessServo(ServoVisualizer):
+    """ServoVisualizer fed from a list of angles instead of a serial port"""
+
+    def __init__(self, angles):
+        self.angles = iter(angles)
+        super().__init__(port=None)
+
+    def init_serial(self):
+        self.ser = None
+
+    def read_serial_data(self):
+        self.current_angle = next(self.angles)
+        return True
+
+    def on_timer(self):
+        # Stands in for the reader thread delivering one angle per frame
+        self.read_serial_data()
+        super().on_timer()
+
+
+def legacy_update_plot(vis, frame):
+    """The update_plot() body as it was before the lookup tables"""
+    vis.read_serial_data()
+    current_color = vis.get_color_for_angle(vis.current_angle)
+
+    angle_rad = np.radians(vis.current_angle)
+    x = 1.3 * np.cos(angle_rad)
+    y = 1.3 * np.sin(angle_rad)
+    vis.servo_arm.set_data([0, x], [0, y])
+    vis.servo_arm.set_color(current_color)
+
+    pos_x = 1.45 * np.cos(angle_rad)
+    pos_y = 1.45 * np.sin(angle_rad)
+    vis.position_circle.center = (pos_x, pos_y)
+    vis.position_circle.set_facecolor(current_color)
+
+    vis.angle_text.set_text(f'{vis.current_angle}°')
+    vis.angle_text.set_color(current_color)
+
+    current_segment = int(vis.current_angle / 5)
+    if 0 <= current_segment < len(vis.arc_patches):
+        for patch in vis.arc_patches:
+            patch.set_alpha(0.8)
+        vis.arc_patches[current_segment].set_alpha(1.0)
+        vis.arc_patches[current_segment].set_linewidth(2)
+
+    return [vis.servo_arm, vis.angle_text, vis.position_circle] + vis.arc_patches
+
+
+def make_angles(count, hold, seed=0):
+    """Random moves, each angle repeated with probability `hold`"""
+    rng = random.Random(seed)
+    angle = 90
+    angles = []
+    while len(angles) < count:
+        if rng.random() >= hold:
+            angle = min(180, max(0, angle + rng.randint(-15, 15)))
+        angles.append(angle)
+    return angles
+
+
+def run_legacy(angles):
+    vis = HeadlessServo(angles)
+    # As under FuncAnimation(blit=True): every returned artist is animated
+    vis.highlight.set_visible(False)
+    for patch in vis.arc_patches:
+        patch.set_animated(True)
+    canvas = vis.fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(vis.ax.bbox)
+
+    def frame():
+        artists = sorted(legacy_update_plot(vis, None), key=lambda a: a.get_zorder())
+        canvas.restore_region(background)
+        for artist in artists:
+            vis.ax.draw_artist(artist)
+        canvas.blit(vis.ax.bbox)
+
+    return measure(frame, len(angles)), len(angles), 0
+
+
+def run_lut(angles):
+    vis = HeadlessServo(angles)
+    vis.fig.canvas.draw()
+    result = measure(vis.on_timer, len(angles))
+    return result, vis.frames_drawn, vis.frames_skipped
+
+
+def measure(frame, count):
+    wall_times = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(count):
+        start = time.perf_counter()
+        frame()
+        wall_times.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        'fps': count / wall,
+        'cpu_ms_per_frame': 1000 * cpu / count,
+        'p50_ms': 1000 * float(np.percentile(wall_times, 50)),
+        'p99_ms': 1000 * float(np.percentile(wall_times, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servo gauge rendering benchmark")
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--hold', type=float, default=0.5, help="fraction of frames without a new angle")
+    args = parser.parse_args()
+
+    angles = make_angles(args.frames, args.hold)
+    print(f"{args.frames} frames, {args.hold:.0%} without angle change (Agg, headless)")
+    print(f"{'path':<8} {'max fps':>10} {'CPU ms/frame':>14} {'p50 ms':>8} {'p99 ms':>8} {'drawn':>7} {'skipped':>8}")
+    for name, run in (('legacy', run_legacy), ('lut', run_lut)):
+        result, drawn, skipped = run(angles)
+        print(f"{name:<8} {result['fps']:>10.0f} {result['cpu_ms_per_frame']:>14.3f} "
+              f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} {drawn:>7} {skipped:>8}")
+
+
+if __name__ == "__main__":
+    main()
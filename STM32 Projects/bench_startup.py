@@ -0,0 +1,88 @@
+# Cold start benchmark of the headless CLI (stm32_monitor.py --headless).
+#
+# Spawns a fresh interpreter per run against a simulated board and measures
+# the wall time from process spawn to the first CSV sample on stdout, i.e.
+# what a logging box pays before the first reading is stored.  For
+# comparison the same is measured for importing each GUI script.
+#
+#   python bench_startup.py [--runs 10] [--kind temperature] [--protocol text]
+#
+# Exits with 1 when the headless median is above STARTUP_TARGET_MS.
+# Needs a pty (Linux / macOS).
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from stm32_simulator import simulate
+from stm32_monitor import STARTUP_TARGET_MS, VIEWS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RATE = 500       # the first sample is at most 2 ms away once the port is open
+
+
+def time_to_first_sample(view, port, protocol):
+    """Seconds from spawning a headless run to its first sample line"""
+    command = [sys.executable, os.path.join(HERE, 'stm32_monitor.py'), view, '--headless',
+               '--port', port, '--protocol', protocol, '--count', '1', '--log-level', 'WARNING']
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=HERE)
+    process.stdout.readline()       # CSV header
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    process.wait(timeout=5)
+    if not line:
+        raise RuntimeError(f"no sample from {view} (exit code {process.returncode})")
+    return elapsed
+
+
+def time_to_import(module):
+    """Seconds to start an interpreter and import a GUI script"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=HERE, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def summary(times):
+    times = sorted(times)
+    p90 = times[min(len(times) - 1, int(0.9 * len(times)))]
+    return f"median {statistics.median(times) * 1000:7.1f} ms  p90 {p90 * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark of the headless CLI")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--kind', choices=sorted(VIEWS), default='temperature')
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--skip-gui', action='store_true', help="don't time the GUI imports")
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        print("This benchmark needs a pty (Linux / macOS)")
+        sys.exit(1)
+
+    board = simulate(VIEWS[args.kind][1], rate=SAMPLE_RATE, protocol=args.protocol, baudrate=921600)
+    try:
+        time_to_first_sample(args.kind, board.port, args.protocol)      # warm the disk cache
+        headless = [time_to_first_sample(args.kind, board.port, args.protocol) for _ in range(args.runs)]
+    finally:
+        board.close()
+    print(f"{'headless ' + args.kind:<28} {summary(headless)}  (spawn -> first sample)")
+
+    if not args.skip_gui:
+        for view, (module, _, _) in sorted(VIEWS.items()):
+            times = [time_to_import(module) for _ in range(min(args.runs, 3))]
+            print(f"{'import ' + module:<28} {summary(times)}  (spawn -> imported)")
+
+    median_ms = statistics.median(headless) * 1000
+    ok = median_ms <= STARTUP_TARGET_MS
+    print(f"Headless cold start {median_ms:.1f} ms, target {STARTUP_TARGET_MS} ms: {'OK' if ok else 'OVER TARGET'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Compact binary framing for STM32 -> PC samples (optional alternative to text lines).
+#
+# Every frame is 12 bytes, little-endian:
+#
+#   offset  size  field
+#   0       1     sync       0xA5
+#   1       1     tag        1 = temperature (°C), 2 = angle (deg), 3 = frequency (Hz)
+#   2       4     value      float32
+#   6       4     timestamp  uint32, device milliseconds (HAL_GetTick())
+#   10      2     crc        CRC-16/XMODEM (poly 0x1021, init 0) over bytes 1..9
+#
+# On the firmware side this is a packed struct sent with HAL_UART_Transmit:
+#
+#   typedef struct __attribute__((packed)) {
+#       uint8_t  sync, tag;
+#       float    value;
+#       uint32_t timestamp;
+#       uint16_t crc;
+#   } SampleFrame;
+#
+# The host decodes whole buffers with struct.iter_unpack over a memoryview
+# and, after a bad sync byte or CRC, resynchronizes on the next 0xA5.
+
+import struct
+from binascii import crc_hqx
+
+SYNC = 0xA5
+FRAME = struct.Struct('<BBfIH')
+FRAME_SIZE = FRAME.size
+CRC_SPAN = slice(1, FRAME_SIZE - 2)
+
+TAGS = {'temperature': 1, 'angle': 2, 'frequency': 3}
+KINDS = {tag: kind for kind, tag in TAGS.items()}
+
+# Values that the text protocol reports as integers
+INTEGER_KINDS = {'angle', 'frequency'}
+
+
+def encode_frame(kind, value, timestamp_ms):
+    """Build one frame (used by simulators and as a reference for the firmware)"""
+    body = FRAME.pack(SYNC, TAGS[kind], value, timestamp_ms & 0xFFFFFFFF, 0)
+    crc = crc_hqx(body[CRC_SPAN], 0)
+    return body[:-2] + struct.pack('<H', crc)
+
+
+class FrameDecoder:
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.bad_frames = 0
+        self.skipped_bytes = 0
+
+    @property
+    def backlog(self):
+        """Bytes held back waiting for the rest of a frame"""
+        return len(self._buffer)
+
+    def feed(self, data):
+        """Add received bytes; returns a list of (tag, timestamp_ms, value) for every valid frame"""
+        buf = self._buffer
+        buf += data
+        frames = []
+        pos = 0
+
+        with memoryview(buf) as view:
+            while True:
+                sync_pos = buf.find(SYNC, pos)
+                if sync_pos < 0:
+                    self.skipped_bytes += len(buf) - pos
+                    pos = len(buf)
+                    break
+                self.skipped_bytes += sync_pos - pos
+                pos = sync_pos
+
+                count = (len(buf) - pos) // FRAME_SIZE
+                if count == 0:
+                    break
+
+                # Fast path: decode the aligned run of frames in one go
+                good = 0
+                for sync, tag, value, timestamp, crc in FRAME.iter_unpack(view[pos:pos + count * FRAME_SIZE]):
+                    start = pos + good * FRAME_SIZE
+                    if sync != SYNC or crc_hqx(view[start + 1:start + FRAME_SIZE - 2], 0) != crc:
+                        break
+                    frames.append((tag, timestamp, value))
+                    good += 1
+
+                pos += good * FRAME_SIZE
+                if good < count:
+                    # Corrupt frame: skip its sync byte and search for the next one
+                    self.bad_frames += 1
+                    self.skipped_bytes += 1
+                    pos += 1
+
+        del buf[:pos]
+        self.frames += len(frames)
+        return frames
@@ -0,0 +1,134 @@
+# Pty check of the multi-board engine (multi_serial.py).
+#
+# Two simulated boards (stm32_simulator.py) feed one MultiPortEngine: a
+# temperature board sending text lines and a servo board sending binary
+# frames.  Checks that every sample arrives tagged with the right device
+# and kind, in the order the board sent it, and that a board hanging up
+# ends only its own reader (no busy loop) while the other keeps going.
+#
+#   python check_multi_serial.py [--rate 200] [--seconds 1]
+#
+# Prints one line per check and exits with 1 if any fails.
+# Needs a pty (Linux / macOS).
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from multi_serial import MultiPortEngine, PortSpec
+from stm32_simulator import SIGNALS, SimulatedBoard, live_samples
+
+BAUDRATE = 115200
+PORT_OPEN_S = 0.2   # opening a port flushes its input: let the engine open them first
+SETTLE_S = 0.3      # time for the last samples to go through the engine
+
+
+def expected_values(kind, rate, count):
+    """The first `count` values the simulated board sends, as the parser returns them"""
+    rng = random.Random(0)
+    values = [SIGNALS[kind](k / rate, rng) for k in range(count)]
+    if kind == 'temperature':
+        return [float(f"{value:.2f}") for value in values]
+    return [int(round(value)) for value in values]
+
+
+def check(results, name, ok, detail=''):
+    results.append(ok)
+    print(f"  {'OK  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+
+def run_boards(boards, specs):
+    """Engine reading `specs`, started before the boards so no sample is flushed on open"""
+    engine = MultiPortEngine(specs)
+    engine.start()
+    time.sleep(PORT_OPEN_S)
+    for board, duration in boards:
+        board.start(duration=duration)
+    return engine
+
+
+def check_tagging(results, rate, seconds):
+    """Text temperature board and binary servo board into one engine"""
+    temperature = SimulatedBoard(live_samples('temperature', rate), protocol='text', baudrate=BAUDRATE)
+    servo = SimulatedBoard(live_samples('angle', rate), protocol='binary', baudrate=BAUDRATE)
+    engine = None
+    try:
+        engine = run_boards([(temperature, seconds), (servo, seconds)],
+                            [PortSpec('lab', temperature.port, BAUDRATE, 'temperature'),
+                             PortSpec('arm', servo.port, BAUDRATE, 'angle', 'binary')])
+        temperature.thread.join()
+        servo.thread.join()
+        time.sleep(SETTLE_S)
+        samples = engine.drain()
+    finally:
+        if engine:
+            engine.stop()
+        temperature.close()
+        servo.close()
+
+    for device, kind, board in (('lab', 'temperature', temperature), ('arm', 'angle', servo)):
+        mine = [s for s in samples if s.device == device]
+        check(results, f"{device}: every sample received", len(mine) == board.samples_sent,
+              f"{len(mine)} of {board.samples_sent}")
+        check(results, f"{device}: tagged as {kind}", all(s.kind == kind for s in mine))
+        check(results, f"{device}: values in the order sent",
+              [s.value for s in mine] == expected_values(kind, rate, len(mine)))
+    arm_times = [s.device_time for s in samples if s.device == 'arm']
+    check(results, "arm: device timestamps increase", all(b > a for a, b in zip(arm_times, arm_times[1:])))
+    host_times = [s.host_time for s in samples]
+    check(results, "drain(): merged by host time", host_times == sorted(host_times))
+    check(results, "no errors", not engine.errors, str(engine.errors))
+
+
+def check_hangup(results, rate):
+    """One board goes away: only its reader ends, without spinning on the dead fd"""
+    leaving = SimulatedBoard(live_samples('temperature', rate), baudrate=BAUDRATE)
+    staying = SimulatedBoard(live_samples('angle', rate), baudrate=BAUDRATE)
+    engine = None
+    try:
+        engine = run_boards([(leaving, None), (staying, None)],
+                            [PortSpec('lab', leaving.port, BAUDRATE, 'temperature'),
+                             PortSpec('arm', staying.port, BAUDRATE, 'angle')])
+        time.sleep(SETTLE_S)
+        leaving.close()
+        deadline = time.time() + 2.0
+        while 'lab' not in engine.errors and time.time() < deadline:
+            time.sleep(0.01)
+        check(results, "lab: reader ended", 'lab' in engine.errors, engine.errors.get('lab', 'still running'))
+        engine.drain()
+        cpu = time.process_time()
+        time.sleep(0.5)
+        cpu = (time.process_time() - cpu) / 0.5
+        check(results, "no busy loop after the hang-up", cpu < 0.5, f"{cpu * 100:.0f}% CPU")
+        check(results, "arm: still delivering", len(engine.drain('arm')) > 0)
+    finally:
+        if engine:
+            engine.stop()
+        staying.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pty check of the multi-board engine")
+    parser.add_argument('--rate', type=float, default=200.0, help="samples per second per board")
+    parser.add_argument('--seconds', type=float, default=1.0, help="time both boards send")
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        print("This check needs a pty (Linux / macOS)")
+        sys.exit(1)
+
+    results = []
+    print("Tagging and ordering")
+    check_tagging(results, args.rate, args.seconds)
+    print("Hang-up")
+    check_hangup(results, args.rate)
+
+    failed = results.count(False)
+    print(f"{len(results) - failed} of {len(results)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
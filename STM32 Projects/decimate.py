@@ -0,0 +1,95 @@
+# Min/max level-of-detail decimation for long time-series plots.
+#
+# The visible samples are grouped into at most `max_buckets` buckets (one
+# per horizontal pixel) and each bucket is replaced by its minimum and
+# maximum sample, kept in time order.  At one bucket per pixel this draws
+# the same envelope as the raw line while handing matplotlib at most two
+# points per pixel.
+#
+# Buckets are aligned on absolute sample indices with a power-of-two size,
+# so completed buckets never change and are cached; each update only
+# reduces the samples that arrived since the previous call.
+
+import numpy as np
+
+
+def reduce_min_max(times, values, bucket_size):
+    """Vectorized min/max reduction of whole buckets, returns (x, y)"""
+    n_buckets = len(values) // bucket_size
+    if n_buckets == 0:
+        return times[:0], values[:0]
+
+    blocks = values[:n_buckets * bucket_size].reshape(n_buckets, bucket_size)
+    i_min = blocks.argmin(axis=1)
+    i_max = blocks.argmax(axis=1)
+
+    # Keep the two points of each bucket in time order
+    offsets = np.stack([np.minimum(i_min, i_max), np.maximum(i_min, i_max)], axis=1)
+    rows = (np.arange(n_buckets) * bucket_size)[:, None] + offsets
+    return times[rows].ravel(), values[rows].ravel()
+
+
+class MinMaxDecimator:
+    def __init__(self, max_buckets=1000):
+        self.max_buckets = max(1, int(max_buckets))
+        self._reset_cache(1)
+
+    def _reset_cache(self, bucket_size):
+        self._bucket_size = bucket_size
+        self._first_bucket = 0      # absolute id of the first cached bucket
+        self._end_bucket = 0        # absolute id one past the last cached bucket
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+
+    def set_pixel_width(self, width):
+        """Resize to one bucket per horizontal pixel"""
+        width = max(1, int(width))
+        if width != self.max_buckets:
+            self.max_buckets = width
+            self._reset_cache(1)
+
+    def update(self, times, values, first_index=0):
+        """Decimate the live window; first_index is the absolute index of times[0]"""
+        n = len(values)
+        if n <= 2 * self.max_buckets:
+            return times, values
+
+        bucket_size = 1
+        while -(-n // bucket_size) > self.max_buckets:
+            bucket_size *= 2
+        if bucket_size != self._bucket_size:
+            self._reset_cache(bucket_size)
+
+        end_index = first_index + n
+        first_full = -(-first_index // bucket_size)     # first bucket fully inside the window
+        last_full = end_index // bucket_size            # one past the last complete bucket
+
+        # Drop buckets that scrolled out of the window
+        if self._first_bucket < first_full:
+            drop = min(first_full, self._end_bucket) - self._first_bucket
+            self._x = self._x[2 * drop:]
+            self._y = self._y[2 * drop:]
+            self._first_bucket += drop
+        if self._end_bucket < first_full or self._first_bucket > first_full:
+            self._first_bucket = self._end_bucket = first_full
+            self._x = self._x[:0]
+            self._y = self._y[:0]
+
+        # Reduce newly completed buckets only
+        if last_full > self._end_bucket:
+            lo = self._end_bucket * bucket_size - first_index
+            hi = last_full * bucket_size - first_index
+            x, y = reduce_min_max(times[lo:hi], values[lo:hi], bucket_size)
+            self._x = np.concatenate([self._x, x])
+            self._y = np.concatenate([self._y, y])
+            self._end_bucket = last_full
+
+        # Partial buckets at both edges are reduced fresh every call
+        head = first_full * bucket_size - first_index
+        tail = last_full * bucket_size - first_index
+        head_x, head_y = reduce_min_max(times[:head], values[:head], max(head, 1))
+        tail_x, tail_y = reduce_min_max(times[tail:], values[tail:], max(n - tail, 1))
+
+        # Pin the first and last samples so the line spans the same range as the raw data
+        return (np.concatenate([times[:1], head_x, self._x, tail_x, times[-1:]]),
+                np.concatenate([values[:1], head_y, self._y, tail_y, values[-1:]]))
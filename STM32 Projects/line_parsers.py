@@ -0,0 +1,91 @@
+# Line parsers for the text formats printed by the STM32 firmware.
+#
+#   temperature   "23.4°C", "Temp: 23.4 °C", or any line with a number in it
+#   angle         "ANGLE:123"   (0-180)
+#   frequency     "Frequency: 1000 Hz"
+#
+# Every format is a single precompiled regex anchored at the start of a
+# line.  parse_batch() joins a whole batch of lines and runs one findall()
+# over it in MULTILINE mode, so the per-line Python overhead is one float()
+# or int() call.  New formats are added with @register_parser.
+
+import re
+
+PARSERS = {}
+
+
+class LineParser:
+    def __init__(self, name, pattern, convert, validate=None):
+        self.name = name
+        self.pattern = re.compile(pattern, re.MULTILINE)
+        self.convert = convert      # callable(match groups) -> value
+        self.validate = validate    # optional callable(value) -> bool
+
+    def parse(self, line):
+        """Parse one line, returns None if it does not match"""
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+        value = self.convert(match.groups())
+        if self.validate is not None and not self.validate(value):
+            return None
+        return value
+
+    def parse_batch(self, lines):
+        """Parse a batch of lines with a single regex pass, skipping non-matching lines"""
+        if not lines:
+            return []
+        groups = self.pattern.findall('\n'.join(lines))
+        if groups and not isinstance(groups[0], tuple):
+            groups = [(g,) for g in groups]
+        values = [self.convert(g) for g in groups]
+        if self.validate is not None:
+            values = [v for v in values if self.validate(v)]
+        return values
+
+
+def register_parser(name, pattern, validate=None):
+    """Decorator registering a converter function as the parser for `name`"""
+    def decorator(convert):
+        PARSERS[name] = LineParser(name, pattern, convert, validate)
+        return convert
+    return decorator
+
+
+def get_parser(name):
+    """Look up a registered parser by format name"""
+    try:
+        return PARSERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown line format '{name}' (known: {', '.join(sorted(PARSERS))})") from None
+
+
+def parse_line(name, line):
+    return get_parser(name).parse(line)
+
+
+def parse_batch(name, lines):
+    return get_parser(name).parse_batch(lines)
+
+
+# === Firmware formats ===
+# `.` never matches a newline and `[ \t]` is used instead of `\s`, so a match
+# can never run into the next line of a joined batch.
+
+_NUMBER = r'(-?\d+(?:\.\d*)?)'
+
+
+# Prefer the number directly in front of "°C", otherwise take the first number on the line
+@register_parser('temperature', rf'^(?:.*?{_NUMBER}[ \t]*°C|.*?{_NUMBER})')
+def _convert_temperature(groups):
+    return float(groups[0] or groups[1])
+
+
+@register_parser('angle', r'^ANGLE:(\d+)', validate=lambda angle: 0 <= angle <= 180)
+def _convert_angle(groups):
+    return int(groups[0])
+
+
+@register_parser('frequency', r'^.*?Frequency:[ \t]*(\d+)[ \t]*Hz')
+def _convert_frequency(groups):
+    return int(groups[0])
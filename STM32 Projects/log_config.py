@@ -0,0 +1,79 @@
+# Leveled, rate-limited logging for the monitoring tools.
+#
+# Replaces the per-sample debug prints: messages go through the standard
+# logging module under the 'stm32' logger, and each call site (file and
+# line) may log at most BURST messages at once and RATE per second after
+# that.  Suppressed messages are counted and reported with the next one
+# that gets through, so a flood of serial errors costs almost nothing.
+#
+#   from log_config import get_logger
+#   log = get_logger('adc')
+#   log.debug("Temperature %.1f°C", value)     # %-args: not formatted when disabled
+#
+# The level is INFO unless set with configure(level) or the
+# STM32_LOG_LEVEL environment variable (DEBUG, INFO, WARNING, ...).
+
+import logging
+import os
+import threading
+import time
+
+ROOT = 'stm32'
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+RATE = 1.0      # messages per second per call site
+BURST = 5       # messages allowed at once per call site
+
+_configured = False
+_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site"""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}      # (pathname, lineno) -> [tokens, last time, suppressed]
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now, 0]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.msg} [{bucket[2]} similar messages suppressed]"
+            bucket[2] = 0
+        return True
+
+
+def configure(level=None, rate=RATE, burst=BURST):
+    """Set up the 'stm32' logger: console handler, level and rate limit"""
+    global _configured
+    with _lock:
+        logger = logging.getLogger(ROOT)
+        level = level or os.environ.get('STM32_LOG_LEVEL', 'INFO')
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        if not _configured:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt='%H:%M:%S'))
+            handler.addFilter(RateLimitFilter(rate, burst))
+            logger.addHandler(handler)
+            logger.propagate = False
+            _configured = True
+    return logger
+
+
+def get_logger(name):
+    """Logger 'stm32.<name>', configuring the defaults on first use"""
+    if not _configured:
+        configure()
+    return logging.getLogger(f"{ROOT}.{name}")
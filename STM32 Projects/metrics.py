@@ -0,0 +1,255 @@
+# Low-overhead metrics for the monitoring tools.
+#
+# Counters, gauges and fixed-bucket histograms live in a Registry (the
+# module-level REGISTRY by default).  Updates are plain attribute
+# arithmetic with no locking - each metric is written by one thread and a
+# slightly stale read from the endpoint is harmless - so the hot paths
+# only pay for a perf_counter() call and an add per batch, not per line.
+#
+# Standard metrics used by the scripts (all prefixed stm32_):
+#
+#   bytes_read_total, lines_parsed_total, parse_errors_total   SerialIngest
+#   read_seconds, parse_seconds                                 SerialIngest, per poll
+#   render_seconds, frames_drawn_total, frames_skipped_total    views, per frame
+#   queue_depth                                                 backlog before a frame
+#   read_to_render_seconds                                      receive -> frame on screen
+#
+# start_server(port) serves them on localhost:
+#
+#   curl http://127.0.0.1:9108/metrics          # Prometheus text format
+#   curl http://127.0.0.1:9108/metrics.json     # JSON snapshot with estimated quantiles
+
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'stm32_'
+DEFAULT_PORT = 9108
+
+# Seconds; covers 10 µs parse batches up to multi-second backlogs
+TIME_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def collect(self):
+        return self.value
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help='', fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn            # optional callable evaluated at read time
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def collect(self):
+        return self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)     # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of a with-block"""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile by linear interpolation inside its bucket"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                if index == len(self.bounds):
+                    return low          # +Inf bucket: best we can say
+                return low + (self.bounds[index] - low) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def collect(self):
+        return {'count': self.count, 'sum': self.sum,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()   # only guards registration
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric '{name}' already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help=''):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help='', fn=None):
+        gauge = self._get(Gauge, name, help)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help='', buckets=TIME_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict"""
+        return {name: metric.collect() for name, metric in list(self.metrics.items())}
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, metric in list(self.metrics.items()):
+            full = self.prefix + name
+            if metric.help:
+                lines.append(f"# HELP {full} {metric.help}")
+            lines.append(f"# TYPE {full} {metric.kind}")
+            if metric.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.bounds + (float('inf'),), metric.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{full}_bucket{{le="{le}"}} {cumulative}')
+                lines.append(f"{full}_sum {metric.sum}")
+                lines.append(f"{full}_count {metric.count}")
+            else:
+                lines.append(f"{full} {metric.collect()}")
+        return "\n".join(lines) + "\n"
+
+    def overlay_text(self):
+        """Compact multi-line summary for on-screen overlays"""
+        lines = []
+        for name, metric in list(self.metrics.items()):
+            if metric.kind == 'histogram':
+                if metric.count:
+                    p50, p99 = metric.quantile(0.5), metric.quantile(0.99)
+                    lines.append(f"{name}: p50 {p50 * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms")
+            else:
+                lines.append(f"{name}: {metric.collect():g}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Forget all metrics (for tests and benchmarks)"""
+        with self._lock:
+            self.metrics.clear()
+
+
+REGISTRY = Registry()
+
+
+class IngestMetrics:
+    """The SerialIngest metrics, resolved once so the hot path is attribute access only"""
+
+    def __init__(self, registry=REGISTRY):
+        self.bytes_read = registry.counter('bytes_read_total', 'Bytes read from the serial port')
+        self.lines_parsed = registry.counter('lines_parsed_total', 'Lines or frames parsed')
+        self.parse_errors = registry.counter('parse_errors_total', 'Lines or frames rejected')
+        self.read_seconds = registry.histogram('read_seconds', 'Serial read time per poll')
+        self.parse_seconds = registry.histogram('parse_seconds', 'Parse time per poll')
+
+
+class ViewMetrics:
+    """Frame metrics of one view"""
+
+    def __init__(self, registry=REGISTRY):
+        self.render_seconds = registry.histogram('render_seconds', 'Frame update + draw time')
+        self.frames_drawn = registry.counter('frames_drawn_total', 'Frames drawn')
+        self.frames_skipped = registry.counter('frames_skipped_total', 'Frames skipped (nothing changed)')
+        self.queue_depth = registry.gauge('queue_depth', 'Samples or bytes waiting before a frame')
+        self.latency = registry.histogram('read_to_render_seconds', 'Serial receive to frame drawn')
+
+
+class CommandMetrics:
+    """Servo setpoint command metrics (see servo_command.py)"""
+
+    def __init__(self, registry=REGISTRY):
+        self.sent = registry.counter('commands_sent_total', 'Setpoint commands written')
+        self.acked = registry.counter('commands_acked_total', 'Setpoint commands answered by a report')
+        self.lost = registry.counter('commands_lost_total', 'Setpoint commands never answered')
+        self.skipped = registry.counter('commands_skipped_total', 'Setpoints skipped, too many in flight')
+        self.ack_seconds = registry.histogram('command_ack_seconds', 'Setpoint written to report received')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path in ('/', '/metrics'):
+            body = self.registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body = json.dumps(self.registry.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass    # no per-request output on the console
+
+
+def start_server(port=DEFAULT_PORT, registry=REGISTRY, host='127.0.0.1'):
+    """Serve /metrics and /metrics.json from a daemon thread; returns the server"""
+    handler = type('MetricsHandler', (_Handler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
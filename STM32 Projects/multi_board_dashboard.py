@@ -0,0 +1,130 @@
+# Combined live dashboard for several STM32 boards at once.
+#
+# All ports are read concurrently by one MultiPortEngine (multi_serial.py);
+# every device gets its own subplot with the same ring buffer / min-max
+# decimation / rolling extrema pipeline as the single-board scripts.
+#
+#   python multi_board_dashboard.py lab=temperature@COM4:9600 arm=angle@COM5:9600
+#   python multi_board_dashboard.py a=frequency@/dev/ttyACM0:38400/binary b=temperature@/dev/pts/4
+
+import sys
+import time
+
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+import numpy as np
+
+from multi_serial import MultiPortEngine, parse_port_spec
+from ring_buffer import RingBuffer
+from rolling_extrema import RollingExtrema
+from decimate import MinMaxDecimator
+
+# === Dashboard Configuration ===
+HISTORY_CAPACITY = 36000        # Samples kept per device
+WINDOW_SECONDS = 60             # Visible time span per subplot
+FRAME_INTERVAL_MS = 100
+
+UNITS = {'temperature': '°C', 'angle': '°', 'frequency': 'Hz'}
+
+
+class DeviceTrace:
+    """Plot state of one device"""
+
+    def __init__(self, ax, spec):
+        self.spec = spec
+        self.ax = ax
+        self.history = RingBuffer(HISTORY_CAPACITY, columns=2)
+        self.extrema = RollingExtrema(window=WINDOW_SECONDS)
+        self.decimator = MinMaxDecimator(max_buckets=ax.get_window_extent().width)
+        self.line, = ax.plot([], [], linewidth=1.5)
+        self.label = ax.text(0.01, 0.95, '', transform=ax.transAxes, fontsize=9,
+                             verticalalignment='top',
+                             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+        ax.set_title(f"{spec.name} - {spec.kind} ({spec.port})", fontsize=10)
+        ax.set_ylabel(UNITS.get(spec.kind, ''))
+        ax.set_xlim(0, WINDOW_SECONDS)
+        ax.grid(True, alpha=0.3)
+
+    def add(self, times, values):
+        """Append a batch of samples and refresh the line"""
+        self.history.extend(np.column_stack([times, values]))
+        for t, value in zip(times, values):
+            self.extrema.push(t, value)
+
+        # Only the visible window is decimated, so it gets every pixel bucket
+        current_time = times[-1]
+        time_view = self.history.column(0)
+        value_view = self.history.column(1)
+        first = np.searchsorted(time_view, current_time - WINDOW_SECONDS)
+        self.decimator.set_pixel_width(self.ax.get_window_extent().width)
+        self.line.set_data(*self.decimator.update(time_view[first:], value_view[first:],
+                                                  self.history.total - len(self.history) + first))
+
+        self.ax.set_xlim(max(0.0, current_time - WINDOW_SECONDS), max(WINDOW_SECONDS, current_time + 1))
+        low, high = self.extrema.min, self.extrema.max
+        margin = max(1.0, (high - low) * 0.1)
+        self.ax.set_ylim(low - margin, high + margin)
+        self.label.set_text(f"{values[-1]:g} {UNITS.get(self.spec.kind, '')}  ({len(self.history)} pts)")
+
+
+class MultiBoardDashboard:
+    def __init__(self, specs):
+        self.engine = MultiPortEngine(specs)
+        self.start_time = time.time()
+
+        self.fig, axes = plt.subplots(len(specs), 1, figsize=(10, 3 * len(specs)), squeeze=False)
+        self.fig.canvas.manager.set_window_title('STM32 Multi-Board Dashboard')
+        axes[-1][0].set_xlabel("Time (seconds since start)")
+        self.traces = {spec.name: DeviceTrace(row[0], spec) for spec, row in zip(specs, axes)}
+
+    def update(self, frame):
+        """Animation callback: distribute the engine's samples to their subplots"""
+        batches = {}
+        for sample in self.engine.drain():
+            times, values = batches.setdefault(sample.device, ([], []))
+            times.append(sample.host_time - self.start_time)
+            values.append(sample.value)
+        for device, (times, values) in batches.items():
+            self.traces[device].add(times, values)
+        return [trace.line for trace in self.traces.values()]
+
+    def run(self):
+        """Start the engine and show the dashboard until the window is closed"""
+        self.engine.start()
+        self.ani = animation.FuncAnimation(self.fig, self.update, interval=FRAME_INTERVAL_MS,
+                                           blit=False, cache_frame_data=False)
+        plt.tight_layout()
+        plt.show()
+
+    def close(self):
+        """Stop the engine and release the buffers"""
+        self.engine.stop()
+        for device, error in self.engine.errors.items():
+            print(f"{device}: {error}")
+        for trace in self.traces.values():
+            trace.history.close()
+        plt.close('all')
+
+
+def main():
+    """Main function"""
+    if len(sys.argv) < 2:
+        print("usage: python multi_board_dashboard.py name=kind@port[:baud][/binary] ...")
+        print("       kind is one of temperature, angle, frequency")
+        sys.exit(1)
+    try:
+        specs = [parse_port_spec(arg) for arg in sys.argv[1:]]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    dashboard = MultiBoardDashboard(specs)
+    try:
+        dashboard.run()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        dashboard.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# Concurrent multi-board serial engine built on asyncio.
+#
+# One event loop reads any number of ports at once.  On POSIX the ports are
+# opened non-blocking and registered with loop.add_reader(), so a port is
+# only touched when its fd is readable; Windows COM ports have no
+# selectable fd and are polled from the loop instead.  Every sample is
+# tagged with the device name it came from.
+#
+# The loop runs in a background thread so matplotlib / Tk keep the main
+# thread.  Views either drain() the tagged samples directly or take an
+# engine.ingest(name) adapter, which has the same poll() API as SerialIngest.
+#
+# Works the same against pty pairs (e.g. `socat -d -d pty,raw,echo=0
+# pty,raw,echo=0` or os.openpty()) as against real boards:
+#
+#   engine = MultiPortEngine([PortSpec('board1', '/dev/pts/3', 9600, 'temperature'),
+#                             PortSpec('board2', '/dev/pts/5', 9600, 'angle')])
+#   engine.start()
+#   engine.drain()      # [DeviceSample(device='board1', kind='temperature', ...), ...]
+#
+# A port whose other end goes away (EIO, or readable with nothing to read)
+# ends only its own reader; engine.errors says why.  check_multi_serial.py
+# runs the engine against two simulated boards on ptys.
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+import serial
+
+from serial_ingest import SerialIngest
+from line_parsers import get_parser
+from log_config import get_logger
+
+logger = get_logger('multi_serial')
+
+PortSpec = namedtuple('PortSpec', 'name port baudrate kind protocol', defaults=('text',))
+DeviceSample = namedtuple('DeviceSample', 'device kind host_time device_time value')
+
+POLL_INTERVAL_S = 0.005     # used for ports without a selectable fd
+QUEUE_LIMIT = 100000        # samples buffered per device between drains
+HANGUP_WAKEUPS = 3          # readable fd with nothing to read this many times in a row = peer hung up
+
+
+def parse_port_spec(text):
+    """Parse 'name=kind@port[:baud][/binary]', e.g. 'lab=temperature@/dev/ttyACM0:9600'"""
+    name, _, rest = text.partition('=')
+    kind, _, rest = rest.partition('@')
+    protocol = 'text'
+    if rest.endswith('/binary'):
+        rest, protocol = rest[:-len('/binary')], 'binary'
+    port, baud = rest, ''
+    head, sep, tail = rest.rpartition(':')
+    if sep and tail.isdigit():
+        port, baud = head, tail
+    if not (name and kind and port):
+        raise ValueError(f"Bad port spec '{text}' (expected name=kind@port[:baud][/binary])")
+    get_parser(kind)    # validate the kind early
+    return PortSpec(name, port, int(baud) if baud else 9600, kind, protocol)
+
+
+class EngineIngest:
+    """SerialIngest-compatible view of one device of a MultiPortEngine"""
+
+    def __init__(self, engine, device, latest_only=False):
+        self.engine = engine
+        self.device = device
+        self.latest_only = latest_only
+        self.protocol = 'engine'
+        self.last_receive_time = None
+
+    @property
+    def backlog(self):
+        return len(self.engine.queues[self.device])
+
+    def poll_timestamped(self):
+        samples = self.engine.drain(self.device)
+        if self.latest_only:
+            samples = samples[-1:]
+        if samples:
+            # Per-sample host times, like SharedMemoryIngest
+            self.last_receive_time = np.array([s.host_time for s in samples])
+        return [(s.device_time, s.value) for s in samples]
+
+    def poll(self):
+        return [value for _, value in self.poll_timestamped()]
+
+    def close(self):
+        pass
+
+
+class MultiPortEngine:
+    def __init__(self, specs):
+        self.specs = list(specs)
+        names = [spec.name for spec in self.specs]
+        if len(set(names)) != len(names):
+            raise ValueError("device names must be unique")
+        self.queues = {spec.name: deque(maxlen=QUEUE_LIMIT) for spec in self.specs}
+        self.errors = {}
+        self.stats = {spec.name: {'samples': 0, 'bytes': 0, 'parse_errors': 0} for spec in self.specs}
+        self.loop = None
+        self.thread = None
+        self._stop = None
+
+    # === asyncio side ===
+
+    def _publish(self, spec, ingest, samples):
+        """Tag samples with their device and queue them (runs on the loop)"""
+        if not samples:
+            return
+        host_time = ingest.last_receive_time
+        queue = self.queues[spec.name]
+        for device_time, value in samples:
+            queue.append(DeviceSample(spec.name, spec.kind, host_time, device_time, value))
+        stats = self.stats[spec.name]
+        stats['samples'] += len(samples)
+        stats['bytes'] = ingest.bytes_read
+        stats['parse_errors'] = ingest.parse_errors
+
+    async def _read_port(self, spec):
+        """Read one port until the engine stops"""
+        loop = asyncio.get_running_loop()
+        try:
+            # timeout=0: non-blocking, the loop decides when to read
+            ser = serial.Serial(spec.port, spec.baudrate, timeout=0)
+        except serial.SerialException as e:
+            self.errors[spec.name] = str(e)
+            logger.error("%s: error opening %s: %s", spec.name, spec.port, e)
+            return
+
+        ingest = SerialIngest(ser, parser=get_parser(spec.kind), protocol=spec.protocol)
+        readable = asyncio.Event()
+        fd = ser.fileno() if os.name == 'posix' else None
+        if fd is not None:
+            loop.add_reader(fd, readable.set)
+        empty_wakeups = 0
+        try:
+            while not self._stop.is_set():
+                if fd is not None:
+                    await readable.wait()
+                    readable.clear()
+                    if not ser.in_waiting:
+                        # Readable but empty: EOF, the other end (pty master, socat) has gone
+                        empty_wakeups += 1
+                        if empty_wakeups >= HANGUP_WAKEUPS:
+                            self.errors[spec.name] = 'port closed by the other end'
+                            logger.error("%s: %s was closed by the other end", spec.name, spec.port)
+                            break
+                        continue
+                    empty_wakeups = 0
+                else:
+                    await asyncio.sleep(POLL_INTERVAL_S)
+                self._publish(spec, ingest, ingest.poll_timestamped())
+        except (serial.SerialException, OSError) as e:
+            self.errors[spec.name] = str(e)
+            logger.error("%s: serial error on %s: %s", spec.name, spec.port, e)
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+            ser.close()
+
+    async def run(self):
+        """Read all ports concurrently until stop() is called"""
+        if self._stop is None:
+            self._stop = asyncio.Event()
+        readers = [asyncio.create_task(self._read_port(spec)) for spec in self.specs]
+        await self._stop.wait()
+        # Wake readers blocked on their fd so they see the stop flag
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    # === thread side ===
+
+    def start(self):
+        """Run the event loop in a background thread"""
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self._stop = asyncio.Event()
+            self.loop.call_soon(started.set)
+            self.loop.run_until_complete(self.run())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run_loop, name='multi-serial', daemon=True)
+        self.thread.start()
+        started.wait(timeout=5)
+
+    def stop(self):
+        """Stop reading and close every port"""
+        if self.loop and self._stop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def drain(self, device=None):
+        """Take all queued samples (of one device, or of all devices)"""
+        names = [device] if device is not None else list(self.queues)
+        samples = []
+        for name in names:
+            queue = self.queues[name]
+            # popleft is atomic, so this is safe against the loop thread appending
+            for _ in range(len(queue)):
+                samples.append(queue.popleft())
+        if device is None:
+            samples.sort(key=lambda s: s.host_time)
+        return samples
+
+    def ingest(self, device, latest_only=False):
+        """Adapter to feed one device into a view that expects a SerialIngest"""
+        if device not in self.queues:
+            raise ValueError(f"Unknown device '{device}'")
+        return EngineIngest(self, device, latest_only=latest_only)
+
+
+if __name__ == "__main__":
+    # Print tagged samples from every port, e.g.
+    #   python multi_serial.py a=temperature@/dev/pts/3 b=angle@/dev/pts/5:9600
+    import sys
+    engine = MultiPortEngine([parse_port_spec(arg) for arg in sys.argv[1:]])
+    engine.start()
+    try:
+        while True:
+            for sample in engine.drain():
+                print(f"{sample.host_time:.3f} {sample.device:<10} {sample.kind:<12} {sample.value}")
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
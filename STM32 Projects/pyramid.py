@@ -0,0 +1,238 @@
+# Multi-resolution min/max/mean pyramid for zooming long sessions.
+#
+# Every sample is folded into buckets of 1 s, 10 s, 1 min and 10 min.  Only
+# the finest level sees raw samples; a coarser level is fed the buckets the
+# level below has completed, so appending costs one vectorized reduction
+# per batch plus a few rows whenever a bucket closes.  Each level keeps
+# (start, min, max, sum, count) rows in a RingBuffer sized for its
+# retention, so a day at 1 s and a year at 10 min fit in a few MB.
+#
+# view(t0, t1, pixels) picks the finest level that still has at most
+# `pixels` buckets in [t0, t1] and returns a min/max envelope line, so a
+# zoom or pan only touches O(pixels) rows.  At full zoom the raw samples
+# are used instead when the caller passes them (e.g. its RingBuffer window
+# or a session log), so nothing is lost close up.
+#
+#   pyramid = TimePyramid()
+#   pyramid.extend(times, values)                   # seconds, any batch size
+#   x, y = pyramid.view(t0, t1, pixels, raw_times, raw_values)
+#   starts, mins, maxs, means = pyramid.buckets(level, t0, t1)
+
+import bisect
+
+import numpy as np
+
+from decimate import reduce_min_max
+from ring_buffer import RingBuffer
+
+# (bucket resolution, retention) in seconds; each resolution divides the next
+LEVELS = ((1, 86400), (10, 7 * 86400), (60, 30 * 86400), (600, 365 * 86400))
+
+
+class PyramidLevel:
+    """Buckets of one resolution: completed rows plus the bucket still filling"""
+
+    def __init__(self, resolution, retention):
+        self.resolution = resolution
+        # Columns: 0 = bucket start (s), 1 = min, 2 = max, 3 = sum, 4 = count
+        self.rows = RingBuffer(max(1, int(retention // resolution)), columns=5)
+        self.open = None        # row of the newest bucket, not yet handed up
+
+    def add(self, starts, mins, maxs, sums, counts):
+        """Fold time-ordered partial aggregates in, returns the rows of the buckets they completed"""
+        open_row = self.open
+        if open_row is not None and starts[-1] < open_row[0] + self.resolution:
+            # Common case: the whole batch falls into the bucket still filling
+            open_row[1] = min(open_row[1], mins.min())
+            open_row[2] = max(open_row[2], maxs.max())
+            open_row[3] += sums.sum()
+            open_row[4] += counts.sum()
+            return open_row[:0]
+
+        ids = np.floor(starts / self.resolution)
+        if self.open is not None:
+            # A late sample (clock step) is counted in the current bucket
+            ids = np.maximum(ids, self.open[0] / self.resolution)
+        ids = np.maximum.accumulate(ids)
+        firsts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        rows = np.column_stack([ids[firsts] * self.resolution,
+                                np.minimum.reduceat(mins, firsts),
+                                np.maximum.reduceat(maxs, firsts),
+                                np.add.reduceat(sums, firsts),
+                                np.add.reduceat(counts, firsts)])
+
+        if self.open is not None:
+            if rows[0, 0] == self.open[0]:
+                rows[0] = merge_rows(self.open, rows[0])
+            else:
+                rows = np.vstack([self.open, rows])
+        self.open = rows[-1].copy()
+        done = rows[:-1]
+        if len(done):
+            self.rows.extend(done)
+        return done
+
+    def oldest(self):
+        """Start of the oldest bucket still held, None if empty"""
+        if len(self.rows):
+            return self.rows.view()[0, 0]
+        return None if self.open is None else self.open[0]
+
+    def clear(self):
+        self.rows.clear()
+        self.open = None
+
+
+def merge_rows(a, b):
+    """One (start, min, max, sum, count) row covering both rows"""
+    return np.array([min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), a[3] + b[3], a[4] + b[4]])
+
+
+def merge_groups(rows, factor):
+    """Combine every `factor` consecutive rows into one"""
+    firsts = np.arange(0, len(rows), factor)
+    return np.column_stack([rows[firsts, 0],
+                            np.minimum.reduceat(rows[:, 1], firsts),
+                            np.maximum.reduceat(rows[:, 2], firsts),
+                            np.add.reduceat(rows[:, 3], firsts),
+                            np.add.reduceat(rows[:, 4], firsts)])
+
+
+def envelope(starts, mins, maxs, resolution):
+    """Line through the min and max of every bucket, drawn at the bucket centre"""
+    x = np.repeat(starts + resolution / 2.0, 2)
+    y = np.empty(2 * len(mins))
+    y[0::2] = mins
+    y[1::2] = maxs
+    return x, y
+
+
+class TimePyramid:
+    def __init__(self, levels=LEVELS):
+        self.levels = [PyramidLevel(resolution, retention) for resolution, retention in levels]
+        self.first_time = None
+        self.last_time = None
+        self.total = 0
+        self.level = None       # level drawn by the last view(), None = raw samples
+
+    def append(self, t, value):
+        """Add a single sample"""
+        self.extend([t], [value])
+
+    def extend(self, times, values):
+        """Add a time-ordered batch of samples (times in seconds)"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(times) == 0:
+            return
+        if self.first_time is None:
+            self.first_time = times[0]
+        self.last_time = times[-1]
+        self.total += len(times)
+
+        block = (times, values, values, values, np.ones(len(values)))
+        for level in self.levels:
+            done = level.add(*block)
+            # Only completed buckets move up a level
+            if len(done) == 0:
+                break
+            block = tuple(done.T)
+
+    def tail(self, index):
+        """Rows of level `index` for the data not yet handed up to it (1-2 partial buckets)"""
+        resolution = self.levels[index].resolution
+        rows = []
+        # Data is exclusive per level: each open bucket holds what has not reached the level above
+        for level in reversed(self.levels[:index + 1]):
+            if level.open is None:
+                continue
+            row = level.open.copy()
+            row[0] = np.floor(row[0] / resolution) * resolution
+            if rows and rows[-1][0] == row[0]:
+                rows[-1] = merge_rows(rows[-1], row)
+            else:
+                rows.append(row)
+        return np.array(rows).reshape(-1, 5)
+
+    def rows(self, index, t0, t1):
+        """(start, min, max, sum, count) rows of level `index` overlapping [t0, t1]"""
+        level = self.levels[index]
+        done = level.rows.view()
+        # bisect rather than searchsorted: the column is strided and searchsorted would copy it
+        starts = done[:, 0]
+        lo = max(bisect.bisect_right(starts, t0) - 1, 0)
+        hi = bisect.bisect_right(starts, t1)
+        tail = self.tail(index)
+        tail = tail[(tail[:, 0] + level.resolution > t0) & (tail[:, 0] <= t1)]
+        return np.concatenate([done[lo:hi], tail])
+
+    def buckets(self, index, t0, t1):
+        """(starts, mins, maxs, means) of level `index` in [t0, t1]"""
+        rows = self.rows(index, t0, t1)
+        return rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3] / rows[:, 4]
+
+    def select(self, t0, t1, pixels):
+        """Finest level with at most `pixels` buckets in [t0, t1] that still holds t0"""
+        span = max(t1 - t0, 0.0)
+        oldest_wanted = max(t0, self.first_time if self.first_time is not None else t0)
+        for index, level in enumerate(self.levels):
+            if span / level.resolution > pixels:
+                continue
+            oldest = level.oldest()
+            if oldest is not None and oldest <= oldest_wanted:
+                return index
+        return len(self.levels) - 1
+
+    def view(self, t0, t1, pixels, raw_times=None, raw_values=None):
+        """Envelope line (x, y) of [t0, t1] for an axis `pixels` wide
+
+        Raw samples are drawn when the span is narrower than `pixels` of
+        the finest buckets and the raw arrays reach back to t0; more than
+        two samples per pixel are then min/max reduced.
+        """
+        pixels = max(1, int(pixels))
+        if raw_times is not None and len(raw_times) and (t1 - t0) <= pixels * self.levels[0].resolution:
+            first_wanted = max(t0, self.first_time if self.first_time is not None else t0)
+            if raw_times[0] <= first_wanted:
+                self.level = None
+                return raw_view(raw_times, raw_values, t0, t1, pixels)
+        if self.total == 0:
+            self.level = None
+            return np.empty(0), np.empty(0)
+
+        index = self.level = self.select(t0, t1, pixels)
+        rows = self.rows(index, t0, t1)
+        resolution = self.levels[index].resolution
+        if len(rows) > pixels:
+            # Even the coarsest level is too fine for this span
+            factor = -(-len(rows) // pixels)
+            rows = merge_groups(rows, factor)
+            resolution *= factor
+        return envelope(rows[:, 0], rows[:, 1], rows[:, 2], resolution)
+
+    def clear(self):
+        """Forget all samples"""
+        for level in self.levels:
+            level.clear()
+        self.first_time = None
+        self.last_time = None
+        self.total = 0
+        self.level = None
+
+
+def raw_view(times, values, t0, t1, pixels):
+    """Raw samples in [t0, t1] (one beyond each edge), min/max reduced to ~2 per pixel"""
+    lo = max(bisect.bisect_left(times, t0) - 1, 0)
+    hi = min(bisect.bisect_right(times, t1) + 1, len(times))
+    times, values = times[lo:hi], values[lo:hi]
+    n = len(values)
+    if n <= 2 * pixels:
+        return times, values
+    bucket_size = 1
+    while -(-n // bucket_size) > pixels:
+        bucket_size *= 2
+    full = n // bucket_size * bucket_size
+    x, y = reduce_min_max(times[:full], values[:full], bucket_size)
+    tail_x, tail_y = reduce_min_max(times[full:], values[full:], max(n - full, 1))
+    return np.concatenate([x, tail_x]), np.concatenate([y, tail_y])
+
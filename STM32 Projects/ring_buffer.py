@@ -0,0 +1,107 @@
+# Fixed-memory sample history shared by the STM32 monitoring scripts.
+#
+# Samples are stored in a preallocated NumPy array that is twice the
+# capacity: every row is written at position i and i + capacity, so the
+# newest `capacity` rows are always one contiguous slice and view() never
+# has to copy.  Rows that fall out of the window can optionally be spilled
+# to a raw binary file (float64 rows) instead of being discarded.
+
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity, columns=1, dtype=np.float64, spill_path=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self.columns = int(columns)
+        self._data = np.zeros((2 * self.capacity, self.columns), dtype=dtype)
+        self._head = 0      # next write position in [0, capacity)
+        self._count = 0     # rows currently held (<= capacity)
+        self.total = 0      # rows ever appended
+        self.spilled = 0    # rows written to the spill file
+
+        self._spill = open(spill_path, 'ab') if spill_path else None
+
+    def __len__(self):
+        return self._count
+
+    def append(self, row):
+        """Append a single row (scalar or sequence of length `columns`)"""
+        if self._count == self.capacity and self._spill is not None:
+            self._spill.write(self._data[self._head].tobytes())
+            self.spilled += 1
+
+        self._data[self._head] = row
+        self._data[self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, rows):
+        """Append a block of rows with vectorized copies"""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.columns)
+        n = len(rows)
+        if n == 0:
+            return
+
+        # Only the newest `capacity` rows can survive; older ones go straight to spill
+        if n > self.capacity:
+            self._spill_rows(self.view())
+            self._spill_rows(rows[:n - self.capacity])
+            self.total += n - self.capacity
+            self._head = 0
+            self._count = 0
+            rows = rows[n - self.capacity:]
+            n = self.capacity
+
+        overflow = self._count + n - self.capacity
+        if overflow > 0:
+            self._spill_rows(self.view()[:overflow])
+
+        first = min(n, self.capacity - self._head)
+        for start, block in ((self._head, rows[:first]), (0, rows[first:])):
+            if len(block):
+                self._data[start:start + len(block)] = block
+                self._data[start + self.capacity:start + self.capacity + len(block)] = block
+
+        self._head = (self._head + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+        self.total += n
+
+    def _spill_rows(self, rows):
+        """Write rows that are about to be overwritten to the spill file"""
+        if self._spill is not None and len(rows):
+            self._spill.write(np.ascontiguousarray(rows).tobytes())
+            self.spilled += len(rows)
+
+    def view(self):
+        """Zero-copy (count, columns) view of the live window, oldest first"""
+        end = self._head + self.capacity
+        return self._data[end - self._count:end]
+
+    def column(self, index):
+        """Zero-copy view of one column of the live window"""
+        return self.view()[:, index]
+
+    def last(self):
+        """Most recent row, or None if the buffer is empty"""
+        if self._count == 0:
+            return None
+        return self._data[self._head + self.capacity - 1]
+
+    def clear(self):
+        """Drop all live rows (spilled rows are kept on disk)"""
+        self._head = 0
+        self._count = 0
+
+    def close(self):
+        """Flush and close the spill file"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    @staticmethod
+    def load_spill(path, columns=1, dtype=np.float64):
+        """Memory-map a spill file as a (rows, columns) array"""
+        return np.memmap(path, dtype=dtype, mode='r').reshape(-1, columns)
@@ -0,0 +1,62 @@
+# Streaming min/max used for y-axis autoscaling.
+#
+# With window=None the extrema cover the whole session (two running values).
+# With window=<seconds> two monotonic deques hold only the candidates that
+# can still become the minimum or maximum of the last `window` seconds, so
+# push() and the min/max queries are O(1) amortized.
+
+from collections import deque
+
+
+class RollingExtrema:
+    def __init__(self, window=None):
+        self.window = window
+        self._min_q = deque()   # (time, value), values increasing
+        self._max_q = deque()   # (time, value), values decreasing
+        self._min = None
+        self._max = None
+
+    def push(self, t, value):
+        """Add a sample taken at time t (seconds)"""
+        if self.window is None:
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+            return
+
+        while self._min_q and self._min_q[-1][1] >= value:
+            self._min_q.pop()
+        self._min_q.append((t, value))
+
+        while self._max_q and self._max_q[-1][1] <= value:
+            self._max_q.pop()
+        self._max_q.append((t, value))
+
+        self.expire(t - self.window)
+
+    def expire(self, oldest):
+        """Forget samples taken before `oldest` (windowed mode only)"""
+        while self._min_q and self._min_q[0][0] < oldest:
+            self._min_q.popleft()
+        while self._max_q and self._max_q[0][0] < oldest:
+            self._max_q.popleft()
+
+    @property
+    def min(self):
+        if self.window is None:
+            return self._min
+        return self._min_q[0][1] if self._min_q else None
+
+    @property
+    def max(self):
+        if self.window is None:
+            return self._max
+        return self._max_q[0][1] if self._max_q else None
+
+    def reset(self):
+        """Clear all state"""
+        self._min_q.clear()
+        self._max_q.clear()
+        self._min = None
+        self._max = None
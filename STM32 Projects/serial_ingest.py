@@ -0,0 +1,172 @@
+# Batch serial ingestion shared by the STM32 monitoring scripts.
+#
+# Each poll drains everything the OS has buffered (ser.in_waiting) with a
+# single read, splits it into lines in a reusable bytearray and returns the
+# whole batch, so the display never falls behind a board that sends faster
+# than the animation interval.  A trailing partial line is kept for the
+# next poll.
+#
+# With protocol='binary' the same calls decode fixed-size frames instead
+# (see binary_protocol.py); the text format remains the default.
+#
+# Pass metrics=metrics.IngestMetrics() to count bytes, lines and parse
+# errors and to time the read and parse stages of every non-empty poll.
+
+import time
+
+from binary_protocol import FrameDecoder, KINDS, INTEGER_KINDS
+
+PROTOCOLS = ('text', 'binary')
+
+
+class SerialIngest:
+    def __init__(self, ser, parser=None, latest_only=False, encoding='utf-8', max_line=4096,
+                 protocol='text', metrics=None):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol '{protocol}' (expected one of {PROTOCOLS})")
+        self.ser = ser
+        self.parser = parser            # LineParser, or callable(line) -> value or None
+        self.latest_only = latest_only  # only return the newest sample of each batch
+        self.encoding = encoding
+        self.max_line = max_line        # partial lines longer than this are discarded
+        self.protocol = protocol
+        self.metrics = metrics          # optional metrics.IngestMetrics
+
+        self._buffer = bytearray()
+        self._decoder = FrameDecoder() if protocol == 'binary' else None
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.parse_errors = 0
+        self.last_receive_time = None   # time.time() of the last read that returned data
+
+    @property
+    def backlog(self):
+        """Bytes received but not yet turned into a line or frame"""
+        if self._decoder is not None:
+            return self._decoder.backlog
+        return len(self._buffer)
+
+    def _read_available(self):
+        """Read everything currently waiting in the OS buffer"""
+        waiting = self.ser.in_waiting
+        if not waiting:
+            return b''
+        self.last_receive_time = time.time()
+        if self.metrics is None:
+            data = self.ser.read(waiting)
+        else:
+            start = time.perf_counter()
+            data = self.ser.read(waiting)
+            self.metrics.read_seconds.observe(time.perf_counter() - start)
+            self.metrics.bytes_read.inc(len(data))
+        # read() can return less than in_waiting promised
+        self.bytes_read += len(data)
+        return data
+
+    def read_lines(self):
+        """Drain the OS buffer and return all complete, non-empty lines"""
+        self._buffer += self._read_available()
+
+        end = self._buffer.rfind(b'\n') + 1
+        if end == 0:
+            if len(self._buffer) > self.max_line:
+                self._buffer.clear()    # no line terminator in sight - resync
+            return []
+
+        chunk = self._buffer[:end].decode(self.encoding, errors='replace')
+        del self._buffer[:end]
+
+        lines = [line.strip() for line in chunk.split('\n')]
+        lines = [line for line in lines if line]
+        self.lines_read += len(lines)
+        return lines
+
+    def read_frames(self):
+        """Drain the OS buffer and return (kind, timestamp_ms, value) for every valid frame"""
+        data = self._read_available()
+        start = time.perf_counter()
+        frames = self._decoder.feed(data)
+        if self.metrics is not None and data:
+            self.metrics.parse_seconds.observe(time.perf_counter() - start)
+            self.metrics.lines_parsed.inc(len(frames))
+            self.metrics.parse_errors.inc(self._decoder.bad_frames - self.parse_errors)
+        self.parse_errors = self._decoder.bad_frames
+        samples = []
+        for tag, timestamp, value in frames:
+            kind = KINDS.get(tag)
+            if kind in INTEGER_KINDS:
+                value = int(round(value))
+            samples.append((kind, timestamp, value))
+        return samples
+
+    def parse(self, lines):
+        """Run the parser over a batch of lines, skipping lines it rejects"""
+        if self.parser is None or not lines:
+            return lines
+        start = time.perf_counter()
+        if hasattr(self.parser, 'parse_batch'):
+            samples = self.parser.parse_batch(lines)
+            rejected = len(lines) - len(samples)
+        else:
+            samples = []
+            rejected = 0
+            for line in lines:
+                try:
+                    value = self.parser(line)
+                except ValueError:
+                    value = None
+                if value is not None:
+                    samples.append(value)
+                else:
+                    rejected += 1
+        self._count_parsed(start, lines, rejected)
+        return samples
+
+    def parse_each(self, lines):
+        """Parse every line on its own; returns one value or None per line"""
+        start = time.perf_counter()
+        values = [self.parser.parse(line) for line in lines]
+        if lines:
+            self._count_parsed(start, lines, values.count(None))
+        return values
+
+    def _count_parsed(self, start, lines, rejected):
+        # The attribute is what the acquisition worker publishes; keep it in step with the metric
+        self.parse_errors += rejected
+        if self.metrics is not None:
+            self.metrics.parse_seconds.observe(time.perf_counter() - start)
+            self.metrics.lines_parsed.inc(len(lines))
+            self.metrics.parse_errors.inc(rejected)
+
+    def poll_timestamped(self):
+        """Like poll(), but returns (device_timestamp_ms, value) pairs
+
+        The text protocol carries no device time, so its timestamps are None.
+        """
+        if self.protocol == 'text':
+            return [(None, value) for value in self.poll()]
+
+        kind = getattr(self.parser, 'name', None)
+        validate = getattr(self.parser, 'validate', None)
+        samples = [(timestamp, value) for frame_kind, timestamp, value in self.read_frames()
+                   if kind is None or frame_kind == kind]
+        if validate is not None:
+            samples = [s for s in samples if validate(s[1])]
+        if self.latest_only:
+            return samples[-1:]
+        return samples
+
+    def poll(self):
+        """Read and parse everything available; returns a list of samples"""
+        if self.protocol == 'binary':
+            return [value for _, value in self.poll_timestamped()]
+
+        lines = self.read_lines()
+        if self.latest_only:
+            # Parse from the newest line backwards and stop at the first hit
+            for line in reversed(lines):
+                samples = self.parse([line])
+                if samples:
+                    return samples
+            return []
+        return self.parse(lines)
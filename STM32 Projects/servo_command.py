@@ -0,0 +1,366 @@
+# Pipelined setpoint commands for the servo firmware.
+#
+#   SET:NNN\r\n    host -> board, NNN = 0..180 degrees
+#   ANGLE:NNN      board -> host, the report PWM_Servo_Python.py already parses
+#
+# CommandChannel writes setpoints without waiting for the echo: each
+# command is put in flight and the ANGLE reports coming back are matched
+# to them in order.  With match='value' (the default) a report
+# acknowledges the oldest command for that angle, and commands overtaken
+# by it count as lost.  This works for firmware that streams ANGLE reports
+# on its own: a report of the angle in effect before the oldest command
+# was sent is stale and ignored, and a setpoint equal to the previous one
+# is still written, so the offered load matches the rate, but not put in
+# flight (counted as repeated) because its answer could not be told from
+# a periodic report.  match='next' makes every report
+# acknowledge the oldest command in flight; it is only valid for firmware
+# that sends exactly one report per SET and nothing else, otherwise it
+# measures the report spacing.  Commands without a report within
+# ack_timeout are lost too.  At most `window` commands are in flight: a
+# setpoint that does not fit is skipped rather than delayed, so a sweep
+# keeps its timing and the skip count shows where the board stops keeping
+# up.
+#
+# Sweeper sends a profile (sine, triangle, step, random) at a fixed rate.
+# Run this module to characterize how quickly the PWM interrupt loop picks
+# up new setpoints as the command rate goes up:
+#
+#   python servo_command.py --port /dev/ttyACM0 --profile sine --rates 10,50,100,200
+#
+#   rate/s  sent/s    sent   acked  lost  skipped  repeated   ack p50    p90    p99    max (ms)
+#       10    10.0      50      50     0        0         0      12.1   19.0   20.8   21.0
+#   ...
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+
+import numpy as np
+
+SET_FORMAT = 'SET:{:03d}\r\n'
+ANGLE_MIN = 0
+ANGLE_MAX = 180
+DEFAULT_WINDOW = 16             # commands in flight
+DEFAULT_ACK_TIMEOUT = 1.0       # s without a report before a command counts as lost
+MATCH_MODES = ('value', 'next')
+READER_POLL_S = 0.001
+
+
+def format_command(angle):
+    """Bytes of the SET command for `angle`, clamped to 0-180"""
+    return SET_FORMAT.format(int(round(min(max(angle, ANGLE_MIN), ANGLE_MAX)))).encode('ascii')
+
+
+# === Sweep profiles: phase in [0, 1) -> fraction of the range ===
+
+def sine_profile(phase, rng):
+    return 0.5 - 0.5 * math.cos(2 * math.pi * phase)
+
+
+def triangle_profile(phase, rng):
+    return 1.0 - abs(2.0 * phase - 1.0)
+
+
+def step_profile(phase, rng):
+    return 0.0 if phase < 0.5 else 1.0
+
+
+def random_profile(phase, rng):
+    return rng.random()
+
+
+PROFILES = {'sine': sine_profile, 'triangle': triangle_profile, 'step': step_profile,
+            'random': random_profile}
+
+
+def sweep_setpoints(profile, rate, low=ANGLE_MIN, high=ANGLE_MAX, period=4.0, seed=0):
+    """Endless (due_s, angle) setpoints of a profile at `rate` per second"""
+    rng = random.Random(seed)
+    shape = PROFILES[profile]
+    k = 0
+    while True:
+        t = k / rate
+        yield t, int(round(low + (high - low) * shape((t / period) % 1.0, rng)))
+        k += 1
+
+
+class CommandChannel:
+    def __init__(self, ser, window=DEFAULT_WINDOW, ack_timeout=DEFAULT_ACK_TIMEOUT, match='value',
+                 metrics=None):
+        if match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode '{match}' (expected one of {MATCH_MODES})")
+        self.ser = ser
+        self.window = window            # None = no limit
+        self.ack_timeout = ack_timeout
+        self.match = match
+        self.metrics = metrics          # optional metrics.CommandMetrics
+        self.in_flight = deque()        # (angle, time.time() written, angle before), oldest first
+        self.latencies = array('d')     # s, command written -> report received
+        self._lock = threading.Lock()   # send() and acknowledge() run on different threads
+        self._write_lock = threading.Lock()     # keeps in_flight in the order commands hit the wire
+        self.reset()
+
+    def reset(self):
+        """Forget commands in flight and all counts"""
+        with self._lock:
+            self.in_flight.clear()
+            self.latencies = array('d')
+            self.sent = 0
+            self.acked = 0
+            self.lost = 0
+            self.skipped = 0
+            self.unmatched = 0          # reports with no command to acknowledge
+            self.repeated = 0           # setpoints equal to the previous one, sent but not tracked ('value')
+            self.setpoint = None        # last angle sent
+            self.reported = None        # last angle reported
+            self.started = time.time()
+            self.first_sent = None      # time.time() of the first and the last write
+            self.last_sent = None
+
+    def send(self, angle):
+        """Write a setpoint without waiting for its report; False if it was not sent (window full)
+
+        A repeated setpoint ('value' mode) is written but not put in flight.
+        """
+        command = format_command(angle)
+        angle = int(command[4:7])
+        # The write can block on a saturated UART: only senders wait for it, never the reader
+        with self._write_lock:
+            with self._lock:
+                now = time.time()
+                self._expire(now)
+                previous = self.setpoint if self.setpoint is not None else self.reported
+                if self.match == 'value' and angle == previous:
+                    self.repeated += 1
+                elif self.window and len(self.in_flight) >= self.window:
+                    self.skipped += 1
+                    if self.metrics:
+                        self.metrics.skipped.inc()
+                    return False
+                else:
+                    self.in_flight.append((angle, now, previous))
+                self.setpoint = angle
+                self.sent += 1
+                if self.first_sent is None:
+                    self.first_sent = now
+                self.last_sent = now
+            self.ser.write(command)
+        if self.metrics:
+            self.metrics.sent.inc()
+        return True
+
+    def acknowledge(self, receive_time, angles):
+        """Match ANGLE reports received at receive_time (scalar or one per report) to commands in flight"""
+        if not angles:
+            return
+        times = np.broadcast_to(receive_time, (len(angles),)).tolist()
+        acked = []
+        with self._lock:
+            for t, angle in zip(times, angles):
+                index = self._match(t, angle)
+                self.reported = angle
+                if index is None:
+                    self.unmatched += 1
+                    continue
+                for _ in range(index):
+                    # Overtaken by a later setpoint before it was reported
+                    self.in_flight.popleft()
+                    self.lost += 1
+                _, sent_time, _ = self.in_flight.popleft()
+                acked.append(t - sent_time)
+            self.latencies.extend(acked)
+            self.acked += len(acked)
+        if self.metrics and acked:
+            self.metrics.acked.inc(len(acked))
+            for latency in acked:
+                self.metrics.ack_seconds.observe(latency)
+
+    def _match(self, t, angle):
+        """Index in in_flight of the command this report acknowledges, or None"""
+        if self.match == 'value' and self.in_flight and angle == self.in_flight[0][2]:
+            return None             # still the angle from before the oldest command
+        for index, (command_angle, sent_time, _) in enumerate(self.in_flight):
+            if sent_time > t:
+                return None         # the report was read before this command was written
+            if self.match == 'next' or command_angle == angle:
+                return index
+        return None
+
+    def _expire(self, now):
+        """Count commands without a report for ack_timeout as lost"""
+        expired = 0
+        while self.in_flight and now - self.in_flight[0][1] > self.ack_timeout:
+            self.in_flight.popleft()
+            expired += 1
+        if expired:
+            self.lost += expired
+            if self.metrics:
+                self.metrics.lost.inc(expired)
+
+    def expire(self):
+        with self._lock:
+            self._expire(time.time())
+
+    def stats(self):
+        """Counts, achieved send rate (setpoints/s) and command -> ack latency percentiles (ms)
+
+        'sent' includes the repeated setpoints; acked + lost + in_flight
+        account for the other sent - repeated.
+        """
+        with self._lock:
+            latencies = np.frombuffer(self.latencies, dtype=np.float64) * 1000.0
+            if self.sent > 1 and self.last_sent > self.first_sent:
+                rate = (self.sent - 1) / (self.last_sent - self.first_sent)
+            else:
+                rate = self.sent / max(time.time() - self.started, 1e-9)
+            result = {'sent': self.sent, 'acked': self.acked, 'lost': self.lost, 'skipped': self.skipped,
+                      'unmatched': self.unmatched, 'repeated': self.repeated, 'in_flight': len(self.in_flight),
+                      'rate': rate, 'ack_ms': None}
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            result['ack_ms'] = {'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+                                'max': float(latencies.max())}
+        return result
+
+    def summary(self):
+        s = self.stats()
+        text = (f"{s['sent']} sent ({s['rate']:.1f}/s), {s['acked']} acked, {s['lost']} lost, "
+                f"{s['skipped']} skipped, {s['repeated']} repeated")
+        if s['ack_ms']:
+            ack = s['ack_ms']
+            text += (f"; ack p50 {ack['p50']:.1f} ms, p90 {ack['p90']:.1f} ms, "
+                     f"p99 {ack['p99']:.1f} ms, max {ack['max']:.1f} ms")
+        return text
+
+
+class Sweeper:
+    """Sends (due_s, angle) setpoints on time from a background thread"""
+
+    def __init__(self, channel, setpoints, duration=None):
+        self.channel = channel
+        self.setpoints = setpoints
+        self.duration = duration
+        self._stop = threading.Event()
+        self.thread = None
+
+    def run(self):
+        start = time.monotonic()
+        for due, angle in self.setpoints:
+            if self.duration is not None and due >= self.duration:
+                break
+            delay = start + due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            if self._stop.is_set():
+                break
+            self.channel.send(angle)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='servo-sweep', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+def characterize(port, baudrate, profile, rates, duration, protocol='text', window=DEFAULT_WINDOW,
+                 ack_timeout=DEFAULT_ACK_TIMEOUT, match='value', low=ANGLE_MIN, high=ANGLE_MAX, period=4.0):
+    """Sweep at each rate in turn, yields one stats() dict per rate"""
+    import serial
+    from serial_ingest import SerialIngest
+    from line_parsers import get_parser
+
+    ser = serial.Serial(port, baudrate, timeout=0)
+    ingest = SerialIngest(ser, parser=get_parser('angle'), protocol=protocol)
+    channel = CommandChannel(ser, window=window, ack_timeout=ack_timeout, match=match)
+    running = threading.Event()
+    running.set()
+
+    def read_reports():
+        while running.is_set():
+            samples = ingest.poll_timestamped()
+            if samples:
+                channel.acknowledge(ingest.last_receive_time, [angle for _, angle in samples])
+            else:
+                time.sleep(READER_POLL_S)
+
+    reader = threading.Thread(target=read_reports, name='servo-reports', daemon=True)
+    reader.start()
+    try:
+        for rate in rates:
+            channel.reset()
+            Sweeper(channel, sweep_setpoints(profile, rate, low, high, period), duration).run()
+            time.sleep(ack_timeout)     # collect the last reports, the rest counts as lost
+            channel.expire()
+            result = channel.stats()
+            result.update(requested_rate=rate, profile=profile)
+            yield result
+    finally:
+        running.clear()
+        reader.join(timeout=1)
+        ser.close()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Servo setpoint sweep with command -> ack latency")
+    parser.add_argument('--port', default='COM4', help="serial port (default COM4)")
+    parser.add_argument('--baud', type=int, default=9600, help="baud rate (default 9600)")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text',
+                        help="format of the ANGLE reports")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='sine')
+    parser.add_argument('--rates', default='10,50,100',
+                        help="comma separated setpoints per second, one run each (default 10,50,100)")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per rate (default 5)")
+    parser.add_argument('--range', default='0:180', help="LOW:HIGH degrees (default 0:180)")
+    parser.add_argument('--period', type=float, default=4.0, help="profile period in s (default 4)")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f"commands in flight, 0 = unlimited (default {DEFAULT_WINDOW})")
+    parser.add_argument('--ack-timeout', type=float, default=DEFAULT_ACK_TIMEOUT)
+    parser.add_argument('--match', choices=MATCH_MODES, default='value',
+                        help="'value': match the reported angle (default); 'next': every report answers "
+                             "the oldest SET, only for firmware that reports once per SET")
+    parser.add_argument('--output', help="write the results as JSON")
+    args = parser.parse_args()
+
+    low, high = (int(x) for x in args.range.split(':'))
+    rates = [float(rate) for rate in args.rates.split(',')]
+    print(f"{'rate/s':>8} {'sent/s':>7} {'sent':>7} {'acked':>7} {'lost':>5} {'skipped':>8} {'repeated':>9} "
+          f"{'ack p50':>9} {'p90':>6} {'p99':>6} {'max':>6} (ms)")
+    results = []
+    try:
+        for r in characterize(args.port, args.baud, args.profile, rates, args.duration, args.protocol,
+                              args.window or None, args.ack_timeout, args.match, low, high, args.period):
+            results.append(r)
+            ack = r['ack_ms'] or {}
+            print(f"{r['requested_rate']:>8.0f} {r['rate']:>7.1f} {r['sent']:>7} {r['acked']:>7} {r['lost']:>5} "
+                  f"{r['skipped']:>8} {r['repeated']:>9} {ack.get('p50', float('nan')):>9.1f} {ack.get('p90', float('nan')):>6.1f} "
+                  f"{ack.get('p99', float('nan')):>6.1f} {ack.get('max', float('nan')):>6.1f}")
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'port': args.port,
+                       'baud': args.baud, 'results': results}, f, indent=2)
+        print(f"Saved {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
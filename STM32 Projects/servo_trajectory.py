@@ -0,0 +1,243 @@
+# Full-rate servo trajectory capture and analysis.
+#
+# TrajectoryCapture keeps every ANGLE sample in compact, growable NumPy
+# arrays (host receive time, device timestamp, angle).  analyze() derives
+# angular velocity, move/settle times, inter-sample jitter and
+# host-receive latency with vectorized operations only, so sessions of
+# millions of samples are analyzed in well under a second.
+#
+#   python servo_trajectory.py capture.npz      # open a saved capture
+#   python servo_trajectory.py logs servo       # or a recorded session log
+
+import sys
+import threading
+
+import numpy as np
+
+
+class TrajectoryCapture:
+    def __init__(self, initial_capacity=65536):
+        self.count = 0
+        self._host = np.empty(initial_capacity, dtype=np.float64)     # s, time.time()
+        self._device = np.empty(initial_capacity, dtype=np.float64)   # ms, NaN if unknown
+        self._angle = np.empty(initial_capacity, dtype=np.int16)      # degrees
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, needed):
+        """Double the arrays until `needed` samples fit"""
+        capacity = len(self._host)
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_host', '_device', '_angle'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def extend(self, host_time, samples):
+        """Append (device_timestamp_ms or None, angle) samples received at host_time"""
+        n = len(samples)
+        if n == 0:
+            return
+        with self._lock:
+            if self.count + n > len(self._host):
+                self._grow(self.count + n)
+            end = self.count + n
+            self._host[self.count:end] = host_time
+            self._device[self.count:end] = [np.nan if ts is None else ts for ts, _ in samples]
+            self._angle[self.count:end] = [angle for _, angle in samples]
+            self.count = end
+
+    def arrays(self):
+        """Views of the captured (host_time, device_ms, angle) arrays"""
+        with self._lock:
+            n = self.count
+            return self._host[:n], self._device[:n], self._angle[:n]
+
+    def save(self, path):
+        host, device, angle = self.arrays()
+        np.savez_compressed(path, host=host, device=device, angle=angle)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        n = len(data['host'])
+        capture = cls(initial_capacity=max(1, n))
+        capture._host[:n] = data['host']
+        capture._device[:n] = data['device']
+        capture._angle[:n] = data['angle']
+        capture.count = n
+        return capture
+
+    @classmethod
+    def from_records(cls, records):
+        """Capture from session log records (see session_log.py)"""
+        capture = cls(initial_capacity=max(1, len(records)))
+        capture._host[:len(records)] = records['host_time']
+        capture._device[:len(records)] = records['device_time']
+        capture._angle[:len(records)] = records['value']
+        capture.count = len(records)
+        return capture
+
+
+def analyze(capture, rest_time=0.2, settle_tolerance=1, histogram_bins=50):
+    """Vectorized analysis of a capture, returns a dict of arrays and summary values
+
+    Timing uses the device timestamps when every sample has one (binary
+    protocol) and the host receive times otherwise.  A move starts at the
+    first angle change after at least `rest_time` seconds without change;
+    its settle time runs from the last resting sample until the angle stays
+    within `settle_tolerance` degrees of the value it rests at before the
+    next move.  Latency is relative: host receive time minus device time,
+    offset so that the fastest sample has zero latency.  On the host
+    timebase samples that share a receive time (one read of a batch) add no
+    interval to the jitter statistics.
+    """
+    host, device, angle = capture.arrays()
+    n = len(angle)
+    result = {'samples': n}
+    if n < 2:
+        return result
+
+    has_device_time = not np.isnan(device).any()
+    t = device / 1000.0 if has_device_time else host - host[0]
+    angle = angle.astype(np.float64)
+    result.update(time=t, angle=angle, timebase='device' if has_device_time else 'host')
+
+    # Angular velocity between consecutive samples
+    dt = np.diff(t)
+    d_angle = np.diff(angle)
+    velocity = np.divide(d_angle, dt, out=np.full_like(dt, np.nan), where=dt > 0)
+    result['velocity'] = velocity
+    result['max_velocity'] = float(np.nanmax(np.abs(velocity))) if np.isfinite(velocity).any() else None
+
+    # Inter-sample jitter
+    intervals = dt if has_device_time or not (dt > 0).any() else dt[dt > 0]
+    result['intervals'] = intervals
+    result['interval_hist'] = np.histogram(intervals, bins=histogram_bins)
+    result['interval_mean'] = float(intervals.mean())
+    result['interval_std'] = float(intervals.std())
+    result['interval_p50'], result['interval_p99'] = (float(v) for v in np.percentile(intervals, [50, 99]))
+
+    # Host-receive latency (needs device timestamps)
+    if has_device_time:
+        latency = host - device / 1000.0
+        latency -= latency.min()
+        result['latency'] = latency
+        result['latency_hist'] = np.histogram(latency, bins=histogram_bins)
+        result['latency_p50'], result['latency_p99'] = (float(v) for v in np.percentile(latency, [50, 99]))
+
+    # Moves and settle times
+    changes = np.flatnonzero(d_angle) + 1
+    if len(changes):
+        gaps = np.diff(t[changes], prepend=-np.inf)
+        onsets = changes[gaps >= rest_time]
+        ends = np.append(onsets[1:], n)
+        final = angle[ends - 1]
+
+        segment = slice(onsets[0], n)
+        target = np.repeat(final, ends - onsets)
+        outside = np.abs(angle[segment] - target) > settle_tolerance
+        index = np.where(outside, np.arange(onsets[0], n), -1)
+        last_outside = np.maximum.reduceat(index, onsets - onsets[0])
+        settled = np.minimum(np.where(last_outside >= 0, last_outside + 1, onsets), n - 1)
+
+        result['move_start'] = t[onsets - 1]
+        result['move_size'] = final - angle[onsets - 1]
+        result['settle_time'] = t[settled] - t[onsets - 1]
+        result['moves'] = len(onsets)
+        result['settle_p50'] = float(np.median(result['settle_time']))
+        result['settle_max'] = float(result['settle_time'].max())
+    else:
+        result['moves'] = 0
+
+    return result
+
+
+def format_summary(result):
+    """Human readable multi-line summary of analyze() output"""
+    if result['samples'] < 2:
+        return f"{result['samples']} samples - not enough data"
+    lines = [
+        f"Samples: {result['samples']}  ({result['timebase']} timebase)",
+        f"Interval: mean {result['interval_mean'] * 1000:.2f} ms, std {result['interval_std'] * 1000:.2f} ms, "
+        f"p99 {result['interval_p99'] * 1000:.2f} ms",
+    ]
+    if result['max_velocity'] is not None:
+        lines.append(f"Max angular velocity: {result['max_velocity']:.0f} deg/s")
+    if 'latency' in result:
+        lines.append(f"Receive latency: p50 {result['latency_p50'] * 1000:.2f} ms, "
+                     f"p99 {result['latency_p99'] * 1000:.2f} ms")
+    if result['moves']:
+        lines.append(f"Moves: {result['moves']}, settle time p50 {result['settle_p50'] * 1000:.0f} ms, "
+                     f"max {result['settle_max'] * 1000:.0f} ms")
+    return "\n".join(lines)
+
+
+def show_analysis(capture, block=False):
+    """Open a matplotlib figure with the trajectory analysis"""
+    import matplotlib.pyplot as plt
+    from decimate import MinMaxDecimator
+
+    result = analyze(capture)
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+    fig.canvas.manager.set_window_title('Servo Trajectory Analysis')
+    (ax_angle, ax_jitter), (ax_latency, ax_settle) = axes
+
+    if result['samples'] >= 2:
+        decimator = MinMaxDecimator(max_buckets=1500)
+        ax_angle.plot(*decimator.update(result['time'], result['angle']), 'b-', linewidth=1)
+        ax_angle.set_xlabel(f"Time (s, {result['timebase']})")
+        ax_angle.set_ylabel("Angle (°)", color='b')
+        ax_velocity = ax_angle.twinx()
+        velocity_time = result['time'][1:]
+        ax_velocity.plot(*MinMaxDecimator(max_buckets=1500).update(velocity_time, result['velocity']),
+                         'r-', linewidth=0.5, alpha=0.6)
+        ax_velocity.set_ylabel("Angular velocity (°/s)", color='r')
+        ax_angle.set_title("Trajectory")
+
+        counts, edges = result['interval_hist']
+        ax_jitter.stairs(counts, edges * 1000, fill=True)
+        ax_jitter.set_xlabel("Inter-sample interval (ms)")
+        ax_jitter.set_title("Sample jitter")
+
+        if 'latency' in result:
+            counts, edges = result['latency_hist']
+            ax_latency.stairs(counts, edges * 1000, fill=True, color='tab:orange')
+            ax_latency.set_xlabel("Relative receive latency (ms)")
+        else:
+            ax_latency.text(0.5, 0.5, "Needs device timestamps\n(binary protocol)",
+                            ha='center', va='center', transform=ax_latency.transAxes)
+        ax_latency.set_title("Host receive latency")
+
+        if result['moves']:
+            ax_settle.scatter(np.abs(result['move_size']), result['settle_time'] * 1000, s=10)
+            ax_settle.set_xlabel("Step size (°)")
+            ax_settle.set_ylabel("Settle time (ms)")
+        ax_settle.set_title("Settle time after a move")
+
+    fig.suptitle(format_summary(result), fontsize=9, ha='left', x=0.02)
+    fig.tight_layout(rect=(0, 0, 1, 0.9))
+    plt.show(block=block)
+    return fig
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("usage: python servo_trajectory.py capture.npz | LOG_DIRECTORY [SESSION]")
+        sys.exit(1)
+    if sys.argv[1].endswith('.npz'):
+        capture = TrajectoryCapture.load(sys.argv[1])
+    else:
+        from binary_protocol import TAGS
+        from session_log import load_session, open_log
+        if sys.argv[1].endswith('.stm32log'):
+            records = open_log(sys.argv[1])
+            records = records[records['kind'] == TAGS['angle']]
+        else:
+            records = load_session(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else 'servo', kind='angle')
+        capture = TrajectoryCapture.from_records(records)
+    show_analysis(capture, block=True)
@@ -0,0 +1,370 @@
+# Append-only binary session log for STM32 samples.
+#
+# A log file is a fixed 4 KiB header followed by fixed-size 32-byte records:
+#
+#   offset  size  field
+#   0       8     host_time     float64, time.time() when received
+#   8       8     device_time   float64, device milliseconds (NaN if unknown)
+#   16      8     value         float64
+#   24      2     device        uint16, index into the header's device table
+#   26      1     kind          uint8, binary_protocol.TAGS (1 temp, 2 angle, 3 freq)
+#   27      5     reserved
+#
+# The header starts with MAGIC, the format version and the record size,
+# followed by a zero-padded JSON document (session name, creation time,
+# device table).  Records are only ever appended; a record cut short by a
+# crash is ignored on reading.  Because every record has the same size a
+# file opens with numpy.memmap as a structured array - hours of history
+# "load" instantly and columns are accessed as log['value'], log['host_time'].
+#
+# Writes go through the normal file buffer; the data is flushed and
+# fsync'ed at most every `fsync_interval` seconds (and on rotate/close).
+# A new file is started when the current one reaches `max_bytes` or is
+# older than `max_seconds`:
+#
+#   logs/tmp36_20240501-142210-513_000.stm32log
+#   logs/tmp36_20240501-142210-513_001.stm32log
+#
+#   log = SessionLog('logs', 'tmp36', devices=[('tmp36', 'temperature')])
+#   log.append(time.time(), [(None, 23.4)])
+#   log.close()
+#   records = load_session('logs', 'tmp36')     # newest run, all its files
+#   records = load_session('logs', 'tmp36', run='20240501-142210-513')
+#   records = load_session('logs', 'tmp36', run=ALL_RUNS)      # every run
+#
+#   python session_log.py logs/tmp36_20240501-142210-513_000.stm32log
+#   python session_log.py logs tmp36 [RUN|all]     # plot a whole run
+
+import bisect
+import glob
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from binary_protocol import TAGS, KINDS
+
+MAGIC = b'STM32LOG'
+VERSION = 1
+HEADER_SIZE = 4096
+HEADER_PREFIX = struct.Struct('<8sII')      # magic, version, record size
+EXTENSION = '.stm32log'
+
+RECORD_DTYPE = np.dtype({
+    'names': ['host_time', 'device_time', 'value', 'device', 'kind'],
+    'formats': ['<f8', '<f8', '<f8', '<u2', 'u1'],
+    'offsets': [0, 8, 16, 24, 26],
+    'itemsize': 32,
+})
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024   # ~8M records per file
+DEFAULT_MAX_SECONDS = 3600
+DEFAULT_FSYNC_INTERVAL = 1.0
+ALL_RUNS = 'all'        # run= value selecting every run of a session
+
+
+def _run_stamp():
+    """Local start time with milliseconds, the run part of a log file name"""
+    now = time.time()
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+
+
+def _encode_header(meta):
+    body = json.dumps(meta).encode('utf-8')
+    header = HEADER_PREFIX.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize) + body
+    if len(header) > HEADER_SIZE:
+        raise ValueError("session log header too large (too many devices?)")
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+def read_header(path):
+    """Header metadata of a log file (session, created, devices, ...)"""
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path}: truncated header")
+    magic, version, record_size = HEADER_PREFIX.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a session log")
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: unsupported log version {version} (record size {record_size})")
+    meta = json.loads(raw[HEADER_PREFIX.size:].rstrip(b'\0').decode('utf-8'))
+    meta['devices'] = [tuple(device) for device in meta['devices']]
+    return meta
+
+
+def open_log(path):
+    """Memory-map one log file as a read-only structured record array"""
+    read_header(path)
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count <= 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def parse_log_name(path):
+    """(session, run, part) of a log file name written by SessionLog"""
+    fields = os.path.basename(path)[:-len(EXTENSION)].rsplit('_', 2)
+    if len(fields) != 3 or not fields[2].isdigit():
+        return fields[0], '', 0      # renamed by hand: a run of its own
+    return fields[0], fields[1], int(fields[2])
+
+
+def session_runs(directory, session=None):
+    """Run stamps (SessionLog.started) in `directory` (of one session name), oldest first"""
+    pattern = f"{session}_*{EXTENSION}" if session else f"*{EXTENSION}"
+    runs = set()
+    for path in glob.glob(os.path.join(directory, pattern)):
+        name, run, _ = parse_log_name(path)
+        if session is None or name == session:
+            runs.add(run)
+    return sorted(runs)
+
+
+def session_files(directory, session=None, run=None):
+    """Log files of one run in `directory`, oldest part first
+
+    run is a SessionLog.started stamp, None for the newest run or ALL_RUNS
+    for the files of every run.
+    """
+    pattern = f"{session}_*{EXTENSION}" if session else f"*{EXTENSION}"
+    files = [(parse_log_name(path), path) for path in glob.glob(os.path.join(directory, pattern))]
+    if session is not None:
+        files = [(key, path) for key, path in files if key[0] == session]
+    if run != ALL_RUNS and files:
+        wanted = run if run is not None else max(key[1] for key, _ in files)
+        files = [(key, path) for key, path in files if key[1] == wanted]
+    return [path for _, path in sorted(files, key=lambda item: (item[0][1], item[0][0], item[0][2]))]
+
+
+def load_session(directory, session=None, kind=None, device=None, run=None):
+    """All records of one run as one array (a memmap when it is a single file)
+
+    run selects the run as for session_files (default: the newest).
+    Rotated files are concatenated, which copies; select `kind` and/or
+    `device` (name) to keep only matching records.
+    """
+    parts = []
+    for path in session_files(directory, session, run):
+        records = open_log(path)
+        if device is not None:
+            names = [name for name, _ in read_header(path)['devices']]
+            records = records[records['device'] == names.index(device)] if device in names else records[:0]
+        if kind is not None:
+            records = records[records['kind'] == TAGS[kind]]
+        parts.append(records)
+    if not parts:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def time_range(records, start, end):
+    """Records with start <= host_time <= end plus one on either side, found by bisection
+
+    Touches O(log n) records of a memmap instead of reading the whole
+    host_time column.
+    """
+    host_time = records['host_time']
+    lo = max(bisect.bisect_left(host_time, start) - 1, 0)
+    hi = min(bisect.bisect_right(host_time, end) + 1, len(records))
+    return records[lo:hi]
+
+
+class SessionLog:
+    def __init__(self, directory, session='session', devices=(('stm32', 'temperature'),),
+                 max_bytes=DEFAULT_MAX_BYTES, max_seconds=DEFAULT_MAX_SECONDS,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        self.directory = directory
+        self.session = session
+        self.devices = [tuple(device) for device in devices]
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.fsync_interval = fsync_interval
+        self.started = _run_stamp()
+        self.file_index = -1
+        self.files = []         # paths written by this log, oldest first
+        self.records = 0        # records written over all files
+        self.syncs = 0
+        self._file = None
+        self._closed_parts = {}     # path -> memmap of files already rotated out (they no longer change)
+        os.makedirs(directory, exist_ok=True)
+        self._open_next()
+
+    @property
+    def path(self):
+        """File currently being written"""
+        return self.files[-1]
+
+    def device_index(self, name):
+        """Index of a device name in the header table"""
+        for index, (device, _) in enumerate(self.devices):
+            if device == name:
+                return index
+        raise ValueError(f"Unknown device '{name}' (log devices: {[d for d, _ in self.devices]})")
+
+    def _open_next(self):
+        """Close the current file and start the next one"""
+        self._close_file()
+        self.file_index += 1
+        stamp, retry = self.started, 0
+        while True:
+            path = os.path.join(self.directory, f"{self.session}_{self.started}_{self.file_index:03d}{EXTENSION}")
+            try:
+                self._file = open(path, 'xb')
+                break
+            except FileExistsError:
+                if self.file_index:
+                    raise
+                # Another log of this session started in the same millisecond
+                retry += 1
+                self.started = f"{stamp}-{retry}"
+        self._file.write(_encode_header({
+            'session': self.session,
+            'created': time.time(),
+            'part': self.file_index,
+            'devices': self.devices,
+        }))
+        self._file_bytes = HEADER_SIZE
+        self._file_opened = time.time()
+        self._last_sync = time.monotonic()
+        self.files.append(path)
+
+    def _close_file(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def append(self, host_time, samples, device=0, kind=None):
+        """Append (device_time_ms or None, value) samples received at host_time
+
+        host_time is a scalar or one time per sample; device is an index or
+        a name from the device table; kind defaults to the device's kind.
+        """
+        n = len(samples)
+        if n == 0 or self._file is None:
+            return
+        if not isinstance(device, int):
+            device = self.device_index(device)
+        kind = kind or self.devices[device][1]
+
+        block = np.zeros(n, dtype=RECORD_DTYPE)
+        block['host_time'] = host_time
+        block['device_time'] = [np.nan if ts is None else ts for ts, _ in samples]
+        block['value'] = [value for _, value in samples]
+        block['device'] = device
+        block['kind'] = TAGS[kind]
+        self.append_records(block)
+
+    def append_records(self, block):
+        """Append an array of RECORD_DTYPE records (e.g. from another log)"""
+        if (self._file_bytes + block.nbytes > self.max_bytes and self._file_bytes > HEADER_SIZE) or \
+                (self.max_seconds and time.time() - self._file_opened > self.max_seconds):
+            self._open_next()
+        self._file.write(block.tobytes())
+        self._file_bytes += block.nbytes
+        self.records += len(block)
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+        self.syncs += 1
+
+    def history(self, kind=None, device=None):
+        """Everything this log has written so far (records of all its files)"""
+        if self._file is not None:
+            self._file.flush()
+        parts = [open_log(path) for path in self.files]
+        records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if device is not None:
+            if not isinstance(device, int):
+                device = self.device_index(device)
+            records = records[records['device'] == device]
+        if kind is not None:
+            records = records[records['kind'] == TAGS[kind]]
+        return records
+
+    def time_range(self, start, end, kind=None, device=None):
+        """Records this log has written with start <= host_time <= end, one beyond each edge
+
+        Each file is bisected on its own memmap and only the matching slices
+        are copied, so a close-up costs O(log n + result) however long the
+        session has run.
+        """
+        if self._file is not None:
+            self._file.flush()
+        parts = []
+        for path in self.files:
+            records = self._closed_parts.get(path)
+            if records is None:
+                records = open_log(path)
+                if path != self.path:
+                    self._closed_parts[path] = records
+            if len(records) == 0 or records['host_time'][-1] < start or records['host_time'][0] > end:
+                continue
+            parts.append(time_range(records, start, end))
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if device is not None:
+            if not isinstance(device, int):
+                device = self.device_index(device)
+            records = records[records['device'] == device]
+        if kind is not None:
+            records = records[records['kind'] == TAGS[kind]]
+        return records
+
+    def close(self):
+        self._close_file()
+
+
+def plot_session(records, devices=None, title='Session log', block=True):
+    """Plot every device of a record array, min/max decimated to the window width"""
+    import matplotlib.pyplot as plt
+    from decimate import MinMaxDecimator
+
+    keys = sorted(set(zip(records['device'].tolist(), records['kind'].tolist())))
+    fig, axes = plt.subplots(max(1, len(keys)), 1, figsize=(12, 3 * max(1, len(keys))),
+                             squeeze=False, sharex=True)
+    fig.canvas.manager.set_window_title(title)
+    t0 = records['host_time'][0] if len(records) else 0.0
+    for (device, tag), row in zip(keys, axes):
+        ax = row[0]
+        selected = records[(records['device'] == device) & (records['kind'] == tag)]
+        decimator = MinMaxDecimator(max_buckets=1500)
+        ax.plot(*decimator.update(selected['host_time'] - t0, selected['value']), linewidth=1)
+        name = devices[device][0] if devices and device < len(devices) else f"device {device}"
+        ax.set_title(f"{name}: {KINDS.get(tag, tag)} ({len(selected)} samples)", fontsize=10)
+        ax.grid(True, alpha=0.3)
+    axes[-1][0].set_xlabel("Time (seconds since start of session)")
+    fig.tight_layout()
+    plt.show(block=block)
+    return fig
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3, 4):
+        print("usage: python session_log.py FILE.stm32log | DIRECTORY [SESSION [RUN|all]]")
+        sys.exit(1)
+    start = time.perf_counter()
+    if os.path.isdir(sys.argv[1]):
+        session = sys.argv[2] if len(sys.argv) >= 3 else None
+        run = sys.argv[3] if len(sys.argv) == 4 else None
+        records = load_session(sys.argv[1], session, run=run)
+        paths = session_files(sys.argv[1], session, run)
+    else:
+        records = open_log(sys.argv[1])
+        paths = [sys.argv[1]]
+    print(f"{len(records)} records from {len(paths)} file(s) opened in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    if len(records):
+        plot_session(records, devices=read_header(paths[0])['devices'], title=sys.argv[-1])
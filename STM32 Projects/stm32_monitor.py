@@ -0,0 +1,236 @@
+# Single entry point for the STM32 monitoring tools.
+#
+#   python stm32_monitor.py temperature [options]     # ADC_TMP36.py plot
+#   python stm32_monitor.py servo [options]           # PWM_Servo_Python.py gauge
+#   python stm32_monitor.py frequency [options]       # Timer_ICMode_GUI.py window
+#   python stm32_monitor.py dashboard SPEC...         # multi_board_dashboard.py
+#   python stm32_monitor.py simulate [options]        # stm32_simulator.py
+#   python stm32_monitor.py command [options]         # servo_command.py setpoint sweeps
+#
+# Options after the tool name go to that tool (--port, --baud, --protocol,
+# ...).  Nothing heavy is imported here: a view's module - and with it
+# matplotlib, numpy or tkinter - is only loaded once that view is asked for.
+#
+# With --headless no GUI is built at all.  Only pyserial and the parser
+# are imported and samples are streamed as CSV (stdout or --csv FILE)
+# and/or into a binary session log (--log-dir), which suits a logging box
+# without a display:
+#
+#   python stm32_monitor.py temperature --headless --port /dev/ttyACM0 --log-dir logs
+#   python stm32_monitor.py frequency --headless --port COM4 --csv freq.csv --quiet
+#   python stm32_monitor.py temperature --headless --compress swinging-door --tolerance 0.1
+#
+# --startup-report prints how long the cold start to the first sample took
+# (and which heavy modules were loaded); bench_startup.py checks it
+# against STARTUP_TARGET_MS.
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import importlib
+import os
+import sys
+
+STARTUP_TARGET_MS = 150     # cold start to first sample, headless, interpreter start included
+
+VIEWS = {
+    'temperature': ('ADC_TMP36', 'temperature', 9600),
+    'servo': ('PWM_Servo_Python', 'angle', 9600),
+    'frequency': ('Timer_ICMode_GUI', 'frequency', 9600),
+}
+ALIASES = {'adc': 'temperature', 'tmp36': 'temperature', 'angle': 'servo', 'timer': 'frequency'}
+TOOLS = {'dashboard': 'multi_board_dashboard', 'simulate': 'stm32_simulator', 'command': 'servo_command'}
+
+TOLERANCES = {'temperature': 0.1, 'angle': 1.0, 'frequency': 1.0}     # --compress defaults
+HEAVY_MODULES = ('matplotlib', 'numpy', 'tkinter')
+IDLE_POLL_S = 0.005
+
+
+def process_age():
+    """Seconds since this process was started (interpreter startup included), None if unknown"""
+    try:
+        # Linux: start time in clock ticks after boot, field 22 of /proc/self/stat
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def startup_report(stages):
+    """One line per startup stage plus the heavy modules that got imported"""
+    age = process_age()
+    interpreter = age - (time.perf_counter() - _START) if age is not None else None
+    lines = []
+    if interpreter is not None:
+        lines.append(f"  interpreter start  {interpreter * 1000:7.1f} ms (/proc, 10 ms resolution)")
+    previous = 0.0
+    for name, at in stages:
+        lines.append(f"  {name:<18} {(at - previous) * 1000:7.1f} ms  (at {at * 1000:.1f} ms)")
+        previous = at
+    total = previous + (interpreter or 0.0)
+    status = 'OK' if total * 1000 <= STARTUP_TARGET_MS else 'OVER TARGET'
+    lines.append(f"  cold start -> first sample {total * 1000:.1f} ms, target {STARTUP_TARGET_MS} ms: {status}")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    lines.append(f"  heavy modules loaded: {', '.join(loaded) if loaded else 'none'}")
+    return "\n".join(lines)
+
+
+def run_headless(view, argv):
+    """Stream samples without any GUI"""
+    module, kind, default_baud = VIEWS[view]
+    parser = argparse.ArgumentParser(prog=f"stm32_monitor.py {view} --headless",
+                                     description=f"Stream {kind} samples without a GUI")
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--port', default='COM4', help="serial port (default COM4)")
+    parser.add_argument('--baud', type=int, default=default_baud, help=f"baud rate (default {default_baud})")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--csv', default='-', help="CSV output file, '-' = stdout (default)")
+    parser.add_argument('--quiet', action='store_true', help="no CSV output (e.g. with --log-dir)")
+    parser.add_argument('--log-dir', help="also record a binary session log (see session_log.py)")
+    parser.add_argument('--compress', choices=('deadband', 'swinging-door'),
+                        help="write only the points needed to stay within --tolerance (see compression.py)")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCES[kind],
+                        help=f"compression error bound (default {TOLERANCES[kind]:g})")
+    parser.add_argument('--count', type=int, help="stop after this many samples")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--metrics-port', type=int, help="serve metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--log-level', default=None, help="DEBUG, INFO, WARNING, ... (default INFO)")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="print the cold start time to the first sample on stderr")
+    args = parser.parse_args(argv)
+
+    import serial
+    from serial_ingest import SerialIngest
+    from line_parsers import get_parser
+    from log_config import configure
+    logger = configure(args.log_level).getChild('headless')
+    stages = [('imports', time.perf_counter() - _START)]
+
+    ingest_metrics = None
+    if args.metrics_port:
+        from metrics import IngestMetrics, start_server
+        start_server(args.metrics_port)
+        ingest_metrics = IngestMetrics()
+
+    try:
+        ser = serial.Serial(args.port, args.baud, timeout=0)
+    except serial.SerialException as e:
+        logger.error("Error opening serial port: %s", e)
+        return 1
+    ingest = SerialIngest(ser, parser=get_parser(kind), protocol=args.protocol, metrics=ingest_metrics)
+    stages.append(('port open', time.perf_counter() - _START))
+    logger.info("Streaming %s from %s at %d baud", kind, args.port, args.baud)
+
+    compressor = None
+    if args.compress:
+        from compression import make_compressor
+        compressor = make_compressor(args.compress, args.tolerance)
+    previous_time = time.time()
+
+    log = None
+    if args.log_dir:
+        from session_log import SessionLog      # imports numpy, only when recording
+        log = SessionLog(args.log_dir, kind, devices=[(args.port, kind)])
+
+    out = None
+    if not args.quiet:
+        out = sys.stdout if args.csv == '-' else open(args.csv, 'a', encoding='utf-8')
+        if out is sys.stdout or out.tell() == 0:
+            out.write("host_time,device_ms,value\n")
+
+    def write(points):
+        """CSV rows and log records for (host_time, value, device_ms) points"""
+        if out is not None:
+            out.write(''.join(f"{t:.6f},{'' if ts is None else f'{ts:.0f}'},{value}\n"
+                              for t, value, ts in points))
+            out.flush()
+        if log is not None and points:
+            log.append([t for t, _, _ in points], [(ts, value) for _, value, ts in points])
+
+    received = 0
+    deadline = time.time() + args.duration if args.duration else None
+    try:
+        while True:
+            samples = ingest.poll_timestamped()
+            if not samples:
+                if deadline and time.time() >= deadline:
+                    break
+                time.sleep(IDLE_POLL_S)
+                continue
+            host_time = ingest.last_receive_time
+            if args.count:
+                samples = samples[:args.count - received]
+            if received == 0:
+                stages.append(('first sample', time.perf_counter() - _START))
+            received += len(samples)
+            if compressor is None:
+                write([(host_time, value, ts) for ts, value in samples])
+            else:
+                # Spread the batch over the time since the previous one: the doors need distinct times
+                step = (host_time - previous_time) / len(samples)
+                write(compressor.compress((previous_time + step * (i + 1), value, ts)
+                                          for i, (ts, value) in enumerate(samples)))
+            previous_time = host_time
+            if (args.count and received >= args.count) or (deadline and time.time() >= deadline):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+        if compressor is not None:
+            write(compressor.flush())
+            logger.info("Compression: %s", compressor.summary())
+        if log is not None:
+            log.close()
+            logger.info("Recorded %d samples to %s", log.records, log.path)
+        if out is not None and out is not sys.stdout:
+            out.close()
+
+    if args.startup_report:
+        print("Startup:\n" + startup_report(stages), file=sys.stderr)
+    return 0
+
+
+def run_tool(module_name, prog, argv):
+    """Import a GUI tool only now and hand it the remaining arguments"""
+    module = importlib.import_module(module_name)
+    sys.argv = [prog] + argv
+    return module.main()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    tools = sorted(VIEWS) + sorted(TOOLS)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(f"usage: stm32_monitor.py {{{','.join(tools)}}} [--headless] [tool options]")
+        print()
+        print("  temperature  TMP36 temperature plot (ADC_TMP36.py)")
+        print("  servo        servo angle gauge (PWM_Servo_Python.py)")
+        print("  frequency    input capture frequency window (Timer_ICMode_GUI.py)")
+        print("  dashboard    several boards at once (multi_board_dashboard.py)")
+        print("  simulate     simulated board on a pty (stm32_simulator.py)")
+        print("  command      servo setpoint sweeps with command -> ack latency (servo_command.py)")
+        print()
+        print("  --headless   temperature / servo / frequency without GUI: CSV and/or session log")
+        print("  use 'stm32_monitor.py TOOL --help' for the options of a tool")
+        return 0 if argv else 2
+
+    tool, rest = ALIASES.get(argv[0], argv[0]), argv[1:]
+    if tool in VIEWS:
+        if '--headless' in rest:
+            return run_headless(tool, rest)
+        return run_tool(VIEWS[tool][0], f"stm32_monitor.py {tool}", rest)
+    if tool in TOOLS:
+        return run_tool(TOOLS[tool], f"stm32_monitor.py {tool}", rest)
+    print(f"Unknown tool '{argv[0]}' (expected one of {', '.join(tools)})")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
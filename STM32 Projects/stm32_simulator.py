@@ -0,0 +1,366 @@
+# Simulated STM32 board on a pseudo-terminal, for testing without hardware.
+#
+# The simulator opens a pty pair and writes exactly what the firmware of
+# the three projects sends on the UART:
+#
+#   temperature   "23.45°C\r\n"           (ADC_TMP36.py)
+#   angle         "ANGLE:123\r\n"         (PWM_Servo_Python.py)
+#   frequency     "Frequency: 1000 Hz\r\n" (Timer_ICMode_GUI.py)
+#
+# or the binary frames of binary_protocol.py.  Point any script at the
+# printed device with --port.  Output is paced like a real UART: at most
+# baudrate / 10 bytes per second (8N1), so `--rate max` is line rate at the
+# chosen baud.  Recorded session logs (session_log.py) can be replayed at
+# their original timing, sped up, or as fast as the baud rate allows.
+#
+#   python stm32_simulator.py temperature --rate 10
+#   python stm32_simulator.py angle --rate max --baud 115200
+#   python stm32_simulator.py frequency --protocol binary
+#   python stm32_simulator.py --replay logs --session tmp36 --speed 10    # newest run
+#   python stm32_simulator.py --replay logs --session tmp36 --run 20240501-142210-513
+#
+# With --commands the board also listens like the servo firmware: a
+# "SET:NNN\r\n" from the host is applied at the next 20 ms PWM period and
+# answered with "ANGLE:NNN"; later angle samples report the setpoint.
+# --rate 0 sends nothing but those answers (see servo_command.py):
+#
+#   python stm32_simulator.py angle --commands --rate 0
+#
+# Windows has no pty; use a virtual null-modem pair (e.g. com0com) and let
+# the simulator write to one end with --port COM11 while the script reads
+# the other.
+
+import argparse
+import bisect
+import collections
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+from binary_protocol import TAGS, KINDS, INTEGER_KINDS, encode_frame
+
+TEXT_FORMATS = {
+    'temperature': '{:.2f}°C\r\n',
+    'angle': 'ANGLE:{:d}\r\n',
+    'frequency': 'Frequency: {:d} Hz\r\n',
+}
+
+TICK_S = 0.002              # pacing resolution
+SERVO_UPDATE_S = 0.020      # PWM period: a new setpoint takes effect at the next one
+MAX_PENDING = 64 * 1024     # bytes buffered while nobody reads before samples are dropped
+
+
+def format_sample(kind, value, protocol='text', timestamp_ms=0):
+    """Bytes the firmware sends for one sample"""
+    if kind in INTEGER_KINDS:
+        value = int(round(value))
+    if protocol == 'binary':
+        return encode_frame(kind, value, int(timestamp_ms) & 0xFFFFFFFF)
+    return TEXT_FORMATS[kind].format(value).encode('utf-8')
+
+
+# === Simulated signals (t in seconds) ===
+
+def temperature_signal(t, rng):
+    """Slow drift around room temperature with ADC noise"""
+    return 23.0 + 1.5 * math.sin(2 * math.pi * t / 60.0) + rng.gauss(0, 0.05)
+
+
+def angle_signal(t, rng):
+    """Servo stepping between positions every two seconds, then holding"""
+    targets = (0, 45, 90, 180, 135, 90, 30, 150)
+    step = int(t // 2.0)
+    previous, target = targets[(step - 1) % len(targets)], targets[step % len(targets)]
+    progress = min(1.0, (t - step * 2.0) / 0.3)     # ~300 ms travel
+    return previous + (target - previous) * progress
+
+
+def frequency_signal(t, rng):
+    """Input-capture reading of a ~1 kHz source with some jitter"""
+    return 1000.0 + 3.0 * math.sin(2 * math.pi * t / 10.0) + rng.gauss(0, 1.0)
+
+
+SIGNALS = {'temperature': temperature_signal, 'angle': angle_signal, 'frequency': frequency_signal}
+
+
+def live_samples(kind, rate, seed=0):
+    """Endless (due_s, kind, device_ms, value) from the simulated signal, none for rate 0"""
+    if not rate:
+        return
+    rng = random.Random(seed)
+    k = 0
+    while True:
+        t = k / rate
+        yield t, kind, t * 1000.0, SIGNALS[kind](t, rng)
+        k += 1
+
+
+def replay_samples(records, speed=1.0, kind=None):
+    """(due_s, kind, device_ms, value) from session log records
+
+    speed scales the recorded timing; speed=0 sends as fast as the baud
+    rate allows.
+    """
+    if kind is not None:
+        records = records[records['kind'] == TAGS[kind]]
+    if len(records) == 0:
+        return
+    t0 = records['host_time'][0]
+    for host_time, device_time, value, tag in zip(records['host_time'].tolist(), records['device_time'].tolist(),
+                                                  records['value'].tolist(), records['kind'].tolist()):
+        due = (host_time - t0) / speed if speed else 0.0
+        device_ms = device_time if device_time == device_time else (host_time - t0) * 1000.0
+        yield due, KINDS[tag], device_ms, value
+
+
+class SimulatedBoard:
+    def __init__(self, source, protocol='text', baudrate=115200, port=None, record_sends=False,
+                 commands=False):
+        self.source = source            # iterator of (due_s, kind, device_ms, value)
+        self.commands = commands        # answer SET:NNN like the servo firmware
+        self.setpoint = None            # last commanded angle
+        self.commands_received = 0
+        self._received = bytearray()
+        self._answers = collections.deque()     # (due_s, bytes) of commands not answered yet
+        self.protocol = protocol
+        self.baudrate = baudrate
+        self.byte_rate = baudrate / 10.0    # 8N1: ten bits per byte
+        self.samples_sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.finished = False
+        # (time.monotonic(), samples_sent) after every write, for latency measurements
+        self.send_times = [] if record_sends else None
+        self._send_counts = []
+        self._pending = bytearray()
+        self._stop = threading.Event()
+        self.thread = None
+
+        if port is None:
+            import tty
+            self.master, self.slave = os.openpty()
+            tty.setraw(self.slave)      # no echo, no newline translation
+            os.set_blocking(self.master, False)
+            self.port = os.ttyname(self.slave)
+            self.serial = None
+        else:
+            import serial
+            self.serial = serial.Serial(port, baudrate, write_timeout=1)
+            self.port = port
+
+    def _write(self, data):
+        """Write to the port; returns False if the data had to be dropped"""
+        if self.serial is not None:
+            try:
+                self.serial.write(data)
+            except Exception:
+                return False
+            return True
+
+        if len(self._pending) + len(data) > MAX_PENDING:
+            self._flush_pending()
+            if len(self._pending) + len(data) > MAX_PENDING:
+                return False        # nobody is reading - like a UART with no listener
+        self._pending += data
+        self._flush_pending()
+        return True
+
+    def _flush_pending(self):
+        try:
+            while self._pending:
+                written = os.write(self.master, self._pending)
+                del self._pending[:written]
+        except (BlockingIOError, OSError):
+            pass
+
+    def _read_commands(self, elapsed):
+        """Queue an ANGLE answer for every SET:NNN the host sent, due at the next PWM period"""
+        try:
+            if self.serial is not None:
+                data = self.serial.read(self.serial.in_waiting)
+            else:
+                data = os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self._received += data
+        *lines, rest = self._received.split(b'\n')
+        self._received = bytearray(rest)
+        due = (math.floor(elapsed / SERVO_UPDATE_S) + 1) * SERVO_UPDATE_S
+        for line in lines:
+            line = line.strip()
+            if not line.startswith(b'SET:'):
+                continue
+            try:
+                angle = min(max(int(line[4:]), 0), 180)
+            except ValueError:
+                continue
+            self.commands_received += 1
+            self._answers.append((due, angle))
+
+    def run(self, duration=None):
+        """Send samples until the source ends, `duration` passes or stop() is called"""
+        start = time.monotonic()
+        pending_sample = None
+        while not self._stop.is_set():
+            elapsed = time.monotonic() - start
+            if duration is not None and elapsed >= duration:
+                break
+            budget = self.byte_rate * elapsed - self.bytes_sent
+            chunk = bytearray()
+            count = 0
+            if self.commands:
+                self._read_commands(elapsed)
+                while self._answers and self._answers[0][0] <= elapsed:
+                    due, angle = self._answers[0]
+                    data = format_sample('angle', angle, self.protocol, due * 1000.0)
+                    if len(chunk) + len(data) > budget:
+                        break
+                    self._answers.popleft()
+                    self.setpoint = angle
+                    chunk += data
+                    count += 1
+            while not self.finished:
+                if pending_sample is None:
+                    try:
+                        due, kind, device_ms, value = next(self.source)
+                    except StopIteration:
+                        self.finished = True
+                        break
+                    if kind == 'angle' and self.setpoint is not None:
+                        value = self.setpoint
+                    pending_sample = due, format_sample(kind, value, self.protocol, device_ms)
+                due, data = pending_sample
+                if due > elapsed or len(chunk) + len(data) > budget:
+                    break
+                chunk += data
+                count += 1
+                pending_sample = None
+
+            if chunk:
+                self.bytes_sent += len(chunk)
+                if self._write(bytes(chunk)):
+                    self.samples_sent += count
+                    if self.send_times is not None:
+                        self.send_times.append(time.monotonic())
+                        self._send_counts.append(self.samples_sent)
+                else:
+                    self.dropped += count
+            elif self.serial is None:
+                self._flush_pending()
+            if self.finished and not self.commands:
+                break
+            time.sleep(TICK_S)
+
+        # Let a reader collect the tail of a replay
+        if self.serial is None:
+            deadline = time.monotonic() + 1.0
+            while self._pending and time.monotonic() < deadline and not self._stop.is_set():
+                self._flush_pending()
+                time.sleep(TICK_S)
+
+    def sent_at(self, count):
+        """time.monotonic() at which the count-th sample (1-based) was written, needs record_sends"""
+        index = bisect.bisect_left(self._send_counts, count)
+        if index == len(self._send_counts):
+            return None
+        return self.send_times[index]
+
+    def start(self, duration=None):
+        """Run in a background thread"""
+        self.thread = threading.Thread(target=self.run, args=(duration,), name='stm32-sim', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def close(self):
+        """Stop sending and close the port"""
+        self.stop()
+        if self.serial is not None:
+            self.serial.close()
+        else:
+            os.close(self.master)
+            os.close(self.slave)
+
+
+def line_rate(kind, protocol='text', baudrate=115200):
+    """Samples per second that fit through the UART at `baudrate`"""
+    typical = {'temperature': 23.45, 'angle': 123, 'frequency': 1000}[kind]
+    return baudrate / 10.0 / len(format_sample(kind, typical, protocol))
+
+
+def simulate(kind, rate=10.0, protocol='text', baudrate=115200, port=None, seed=0, commands=False):
+    """Start a live simulated board in the background, returns the SimulatedBoard"""
+    if rate in (None, 'max'):
+        rate = line_rate(kind, protocol, baudrate)
+    return SimulatedBoard(live_samples(kind, float(rate), seed), protocol=protocol,
+                          baudrate=baudrate, port=port, commands=commands).start()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Simulated STM32 board on a pseudo-terminal")
+    parser.add_argument('kind', nargs='?', choices=sorted(SIGNALS),
+                        help="signal to simulate (for --replay: only replay this kind)")
+    parser.add_argument('--rate', default='10',
+                        help="samples per second, or 'max' for line rate at --baud (default 10)")
+    parser.add_argument('--commands', action='store_true',
+                        help="answer SET:NNN setpoints like the servo firmware")
+    parser.add_argument('--baud', type=int, default=115200, help="emulated baud rate (default 115200)")
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text')
+    parser.add_argument('--port', help="write to this serial port instead of a new pty")
+    parser.add_argument('--replay', metavar='LOG', help="session log file or directory to replay")
+    parser.add_argument('--session', help="session name inside the --replay directory")
+    parser.add_argument('--run', help="run stamp of the session to replay (default: the newest), "
+                                      "'all' for every run back to back")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed factor, 0 = as fast as the baud rate allows (default 1)")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    if args.replay:
+        from session_log import load_session, open_log
+        if os.path.isdir(args.replay):
+            records = load_session(args.replay, args.session, run=args.run)
+        else:
+            records = open_log(args.replay)
+        source = replay_samples(records, speed=args.speed, kind=args.kind)
+        what = f"replay of {len(records)} samples from {args.replay} at {args.speed:g}x"
+    elif args.kind:
+        rate = line_rate(args.kind, args.protocol, args.baud) if args.rate == 'max' else float(args.rate)
+        source = live_samples(args.kind, rate)
+        what = f"{args.kind} at {rate:.0f} samples/s"
+    else:
+        parser.error("give a kind to simulate or --replay")
+
+    try:
+        board = SimulatedBoard(source, protocol=args.protocol, baudrate=args.baud, port=args.port,
+                               commands=args.commands)
+    except Exception as e:
+        print(f"Error opening port: {e}")
+        sys.exit(1)
+    print(f"Simulated STM32 on {board.port} ({what}, {args.protocol}, {args.baud} baud)")
+    print("Press Ctrl+C to stop")
+    board.start(duration=args.duration)
+    try:
+        while board.thread.is_alive():
+            board.thread.join(timeout=1.0)
+            print(f"\r{board.samples_sent} samples, {board.bytes_sent} bytes, "
+                  f"{board.dropped} dropped", end='', flush=True)
+            if args.commands:
+                print(f", {board.commands_received} commands", end='', flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print()
+        board.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Streaming statistics for input-capture frequency measurements.
+#
+# Every estimator is updated in O(1) per sample and never looks back at
+# old samples, so the statistics cover whole sessions of any length:
+#
+#   RunningStats       mean / standard deviation (Welford), min, max
+#   P2Quantile         streaming percentile with the P-square algorithm
+#                      (Jain & Chlamtac, 1985) - five markers per quantile
+#   AllanDeviation     non-overlapping Allan deviation for an averaging
+#                      window of `tau` samples
+#
+# FrequencyStats bundles them and is usable headless:
+#
+#   stats = FrequencyStats()
+#   for f in frequencies:
+#       stats.update(f)
+#   print(stats.snapshot())
+
+import math
+
+
+class RunningStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    def __init__(self, p):
+        if not 0 < p < 1:
+            raise ValueError("quantile must be between 0 and 1")
+        self.p = p
+        self.reset()
+
+    def reset(self):
+        self._initial = []
+        self._q = None                                  # marker heights
+        self._n = [0, 1, 2, 3, 4]                       # marker positions
+        p = self.p
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._step = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        if self._q is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._q = sorted(self._initial)
+            return
+
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._step[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    @property
+    def value(self):
+        """Current quantile estimate, None before the first sample"""
+        if self._q is not None:
+            return self._q[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        return ordered[min(len(ordered) - 1, int(self.p * len(ordered)))]
+
+
+class AllanDeviation:
+    def __init__(self, tau):
+        self.tau = int(tau)       # averaging window in samples
+        self.reset()
+
+    def reset(self):
+        self._block_sum = 0.0
+        self._block_count = 0
+        self._previous = None
+        self._sum_sq = 0.0
+        self.pairs = 0
+
+    def update(self, x):
+        self._block_sum += x
+        self._block_count += 1
+        if self._block_count < self.tau:
+            return
+
+        average = self._block_sum / self.tau
+        self._block_sum = 0.0
+        self._block_count = 0
+        if self._previous is not None:
+            self._sum_sq += (average - self._previous) ** 2
+            self.pairs += 1
+        self._previous = average
+
+    @property
+    def value(self):
+        """Allan deviation in input units, None until two full windows were seen"""
+        if self.pairs == 0:
+            return None
+        return math.sqrt(self._sum_sq / (2 * self.pairs))
+
+
+class FrequencyStats:
+    def __init__(self, percentiles=(0.5, 0.95, 0.99), allan_taus=(1, 10, 100)):
+        self.running = RunningStats()
+        self.percentiles = {p: P2Quantile(p) for p in percentiles}
+        self.allan = {tau: AllanDeviation(tau) for tau in allan_taus}
+
+    def reset(self):
+        self.running.reset()
+        for estimator in list(self.percentiles.values()) + list(self.allan.values()):
+            estimator.reset()
+
+    def update(self, frequency):
+        """Add one measurement (Hz)"""
+        self.running.update(frequency)
+        for estimator in self.percentiles.values():
+            estimator.update(frequency)
+        for estimator in self.allan.values():
+            estimator.update(frequency)
+
+    def snapshot(self):
+        """Current statistics as a plain dict
+
+        Allan deviations are given in Hz and, under 'allan_fractional',
+        relative to the running mean.
+        """
+        mean = self.running.mean
+        allan = {tau: est.value for tau, est in self.allan.items()}
+        return {
+            'count': self.running.count,
+            'mean': mean,
+            'std': self.running.std,
+            'min': self.running.min,
+            'max': self.running.max,
+            'percentiles': {p: est.value for p, est in self.percentiles.items()},
+            'allan': allan,
+            'allan_fractional': {tau: (v / mean if v is not None and mean else None)
+                                 for tau, v in allan.items()},
+        }
+
+    def summary(self):
+        """One-line human readable summary for status displays"""
+        if self.running.count == 0:
+            return "No data"
+        snap = self.snapshot()
+        parts = [f"Mean: {snap['mean']:.2f} Hz", f"Std: {snap['std']:.2f} Hz",
+                 f"Min/Max: {snap['min']:g}/{snap['max']:g} Hz"]
+        parts += [f"P{p * 100:g}: {v:.1f}" for p, v in snap['percentiles'].items() if v is not None]
+        parts += [f"ADEV({tau}): {v:.3g}" for tau, v in snap['allan'].items() if v is not None]
+        return "   ".join(parts)